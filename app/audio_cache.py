@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Cache de audio sintetizado direccionado por contenido.
+
+La clave es un hash de (motor, voz, modelo, formato, ajustes de voz, texto
+normalizado). Los audios se guardan en disco con un índice SQLite que
+sobrevive a reinicios, expiran según el TTL, se desalojan por LRU al superar
+el tamaño máximo y las entradas más frecuentes se mantienen en memoria.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from tracing import span
+
+
+def normalize_text(text: str) -> str:
+    """Normalizar el texto para que variaciones de espacios compartan entrada"""
+    return " ".join(text.split())
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Hash SHA-256 del contenido de un archivo, leído por bloques"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_cache_key(engine: str, text: str, voice_id: Optional[str] = None,
+                   model_id: Optional[str] = None, output_format: Optional[str] = None,
+                   voice_settings: Optional[Dict[str, Any]] = None) -> str:
+    """Calcular la clave de cache de una síntesis"""
+    with span('text_normalization'):
+        text = normalize_text(text)
+    payload = json.dumps({
+        'engine': engine,
+        'voice_id': voice_id,
+        'model_id': model_id,
+        'output_format': output_format,
+        'voice_settings': voice_settings or {},
+        'text': text,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AudioCache:
+    """Cache de audio en disco con índice persistente y capa caliente en memoria"""
+
+    # Una entrada pasa a memoria a partir de este número de aciertos
+    HOT_MIN_HITS = 2
+    # Tamaño máximo de una entrada para mantenerla en memoria
+    HOT_MAX_ITEM_SIZE = 1024 * 1024
+    # Cada cuánto se vuelcan al índice los accesos acumulados
+    ACCESS_FLUSH_INTERVAL = 30
+
+    def __init__(self, cache_dir: str, ttl: int = 3600, max_size: int = 512 * 1024 * 1024,
+                 memory_items: int = 32, enabled: bool = True):
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.memory_items = memory_items
+        self.enabled = enabled
+
+        self._lock = threading.RLock()
+        self._hot: "OrderedDict[str, tuple]" = OrderedDict()
+        self._pending_access: Dict[str, list] = {}
+        self._last_access_flush = time.time()
+        self._counters = {
+            'hits': 0,
+            'hot_hits': 0,
+            'misses': 0,
+            'writes': 0,
+            'evictions': 0,
+            'expirations': 0,
+        }
+
+        if self.enabled:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.cache_dir / "index.db"), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " filename TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_access REAL NOT NULL,"
+                " hits INTEGER NOT NULL DEFAULT 0)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON entries(last_access)")
+            self._db.commit()
+
+    def _entry_path(self, filename: str) -> Path:
+        return self.cache_dir / filename[:2] / filename
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Obtener el audio de una clave, o None si no está o expiró"""
+        with span('cache_lookup') as current:
+            data = self._lookup(key)
+            if current is not None:
+                current.attrs['hit'] = data is not None
+            return data
+
+    def _lookup(self, key: str) -> Optional[bytes]:
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            hot = self._hot.get(key)
+            if hot is not None:
+                data, expires_at = hot
+                if expires_at > now:
+                    self._hot.move_to_end(key)
+                    self._counters['hits'] += 1
+                    self._counters['hot_hits'] += 1
+                    self._record_access(key, now)
+                    return data
+                del self._hot[key]
+
+            row = self._db.execute(
+                "SELECT filename, created_at, hits FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._counters['misses'] += 1
+                return None
+
+            filename, created_at, hits = row
+            if self.ttl and now - created_at > self.ttl:
+                self._delete_entry(key, filename)
+                self._db.commit()
+                self._counters['expirations'] += 1
+                self._counters['misses'] += 1
+                return None
+
+            try:
+                data = self._entry_path(filename).read_bytes()
+            except OSError:
+                self._delete_entry(key, filename)
+                self._db.commit()
+                self._counters['misses'] += 1
+                return None
+
+            self._counters['hits'] += 1
+            pending = self._record_access(key, now)
+            if hits + pending >= self.HOT_MIN_HITS and len(data) <= self.HOT_MAX_ITEM_SIZE:
+                self._promote(key, data, created_at + self.ttl if self.ttl else float('inf'))
+            return data
+
+    def get_to_file(self, key: str, output_path: str) -> bool:
+        """Copiar el audio cacheado a output_path; True si hubo acierto"""
+        data = self.get(key)
+        if data is None:
+            return False
+        with span('file_write'):
+            _atomic_write(Path(output_path), data)
+        return True
+
+    def put(self, key: str, data: bytes, extension: str = "wav") -> Optional[str]:
+        """Guardar audio en el cache y devolver la ruta del archivo"""
+        if not self.enabled or not data:
+            return None
+
+        filename = f"{key}.{extension.lstrip('.')}"
+        path = self._entry_path(filename)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _atomic_write(path, data)
+
+        now = time.time()
+        with self._lock:
+            self._hot.pop(key, None)
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, filename, size, created_at, last_access, hits)"
+                " VALUES (?, ?, ?, ?, ?, 0)",
+                (key, filename, len(data), now, now)
+            )
+            self._counters['writes'] += 1
+            self._flush_access()
+            self._enforce_size()
+            self._db.commit()
+        return str(path)
+
+    def put_file(self, key: str, source_path: str) -> Optional[str]:
+        """Guardar en el cache un audio ya escrito en disco"""
+        extension = os.path.splitext(source_path)[1] or ".wav"
+        with open(source_path, "rb") as f:
+            return self.put(key, f.read(), extension)
+
+    def _record_access(self, key: str, now: float) -> int:
+        """Acumular un acceso para volcarlo al índice más tarde"""
+        pending = self._pending_access.setdefault(key, [now, 0])
+        pending[0] = now
+        pending[1] += 1
+        if now - self._last_access_flush > self.ACCESS_FLUSH_INTERVAL:
+            self._flush_access()
+            self._db.commit()
+        return pending[1]
+
+    def _flush_access(self) -> None:
+        if self._pending_access:
+            self._db.executemany(
+                "UPDATE entries SET last_access = ?, hits = hits + ? WHERE key = ?",
+                [(ts, count, key) for key, (ts, count) in self._pending_access.items()]
+            )
+            self._pending_access.clear()
+        self._last_access_flush = time.time()
+
+    def _promote(self, key: str, data: bytes, expires_at: float) -> None:
+        if self.memory_items <= 0:
+            return
+        self._hot[key] = (data, expires_at)
+        self._hot.move_to_end(key)
+        while len(self._hot) > self.memory_items:
+            self._hot.popitem(last=False)
+
+    def _delete_entry(self, key: str, filename: str) -> None:
+        self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        self._hot.pop(key, None)
+        self._pending_access.pop(key, None)
+        try:
+            self._entry_path(filename).unlink()
+        except OSError:
+            pass
+
+    def _enforce_size(self) -> None:
+        """Desalojar las entradas menos usadas hasta respetar max_size"""
+        if not self.max_size:
+            return
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_size:
+            return
+        for key, filename, size in self._db.execute(
+            "SELECT key, filename, size FROM entries ORDER BY last_access ASC"
+        ).fetchall():
+            self._delete_entry(key, filename)
+            self._counters['evictions'] += 1
+            total -= size
+            if total <= self.max_size:
+                break
+
+    def purge_expired(self) -> int:
+        """Eliminar todas las entradas expiradas"""
+        if not self.enabled or not self.ttl:
+            return 0
+        with self._lock:
+            expired = self._db.execute(
+                "SELECT key, filename FROM entries WHERE created_at < ?", (time.time() - self.ttl,)
+            ).fetchall()
+            for key, filename in expired:
+                self._delete_entry(key, filename)
+            self._counters['expirations'] += len(expired)
+            self._db.commit()
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de aciertos/fallos y ocupación del cache"""
+        stats = {'enabled': self.enabled, **self._counters}
+        lookups = self._counters['hits'] + self._counters['misses']
+        stats['hit_ratio'] = self._counters['hits'] / lookups if lookups else 0.0
+        if self.enabled:
+            with self._lock:
+                entries, size = self._db.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+                ).fetchone()
+                stats.update({
+                    'entries': entries,
+                    'size_bytes': size,
+                    'max_size_bytes': self.max_size,
+                    'memory_entries': len(self._hot),
+                })
+        return stats
+
+    def close(self) -> None:
+        """Volcar accesos pendientes y cerrar el índice"""
+        if self.enabled:
+            with self._lock:
+                self._flush_access()
+                self._db.commit()
+                self._db.close()
+                self.enabled = False
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    """Escribir un archivo de forma atómica (temporal + rename)"""
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent or Path('.')), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+_cache: Optional[AudioCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_audio_cache() -> AudioCache:
+    """Obtener el cache global configurado desde PerformanceConfig"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            from config import get_config
+
+            performance = get_config().performance
+            _cache = AudioCache(
+                cache_dir=performance.cache_dir,
+                ttl=performance.cache_ttl,
+                max_size=performance.cache_max_size,
+                memory_items=performance.cache_memory_items,
+                enabled=performance.cache_enabled,
+            )
+        return _cache
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Identificación barata de audios subidos a partir de su cabecera.
+
+Reconoce WAV, MP3, FLAC y M4A leyendo sólo los primeros bytes (chunks
+RIFF, cabecera de trama MPEG y Xing/VBRI, STREAMINFO, cajas ftyp/moov) y
+obtiene la duración sin decodificar el audio. UploadValidator aplica los
+límites de tamaño, formato y duración mientras el archivo se copia por
+bloques, de modo que un archivo inválido se rechaza en el primer bloque.
+
+Sólo depende de la biblioteca estándar.
+"""
+
+import io
+import os
+import struct
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Iterable, Optional
+
+
+# Bytes de cabecera suficientes para identificar el formato
+HEADER_SIZE = 64 * 1024
+
+
+@dataclass
+class AudioInfo:
+    """Formato y duración deducidos de la cabecera"""
+    format: str
+    duration: Optional[float] = None
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+    # Bytes por segundo (para estimar la duración por tamaño si no se conoce)
+    byte_rate: Optional[float] = None
+
+    def estimate_duration(self, size: int) -> Optional[float]:
+        if self.duration is not None:
+            return self.duration
+        if self.byte_rate:
+            return size / self.byte_rate
+        return None
+
+
+class UploadRejected(Exception):
+    """Audio subido que no cumple los límites (código y estado HTTP para la API)"""
+
+    def __init__(self, code: str, message: str, status: int = 400, **details):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
+        self.details = details
+
+
+def _skip_id3(data: bytes) -> int:
+    """Longitud de una etiqueta ID3v2 al principio (0 si no hay)"""
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    size = (data[6] & 0x7f) << 21 | (data[7] & 0x7f) << 14 | (data[8] & 0x7f) << 7 | (data[9] & 0x7f)
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def probe_wav(data: bytes) -> Optional[AudioInfo]:
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        return None
+    info = AudioInfo("wav")
+    position = 12
+    while position + 8 <= len(data):
+        chunk_id = data[position:position + 4]
+        chunk_size = struct.unpack("<I", data[position + 4:position + 8])[0]
+        if chunk_id == b"fmt " and position + 24 <= len(data):
+            _, channels, sample_rate, byte_rate = struct.unpack("<HHII", data[position + 8:position + 20])
+            info.channels, info.sample_rate, info.byte_rate = channels, sample_rate, float(byte_rate or 0) or None
+        elif chunk_id == b"data":
+            # Tamaño sin rellenar (WAV en streaming): se estima por bytes recibidos
+            if info.byte_rate and chunk_size not in (0, 0xFFFFFFFF):
+                info.duration = chunk_size / info.byte_rate
+            break
+        position += 8 + chunk_size + (chunk_size & 1)
+    return info
+
+
+def probe_flac(data: bytes) -> Optional[AudioInfo]:
+    start = _skip_id3(data)
+    if data[start:start + 4] != b"fLaC" or len(data) < start + 42:
+        return None
+    block_type = data[start + 4] & 0x7f
+    if block_type != 0:  # STREAMINFO debe ser el primer bloque
+        return None
+    fields = int.from_bytes(data[start + 18:start + 26], "big")
+    sample_rate = fields >> 44
+    channels = ((fields >> 41) & 0x7) + 1
+    total_samples = fields & ((1 << 36) - 1)
+    duration = total_samples / sample_rate if sample_rate and total_samples else None
+    return AudioInfo("flac", duration, sample_rate, channels)
+
+
+# Tablas de la cabecera de trama MPEG audio (kbps)
+_BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_BITRATES[(2, 3)] = _BITRATES[(2, 2)]
+_SAMPLE_RATES = {1: (44100, 48000, 32000), 2: (22050, 24000, 16000), 25: (11025, 12000, 8000)}
+
+
+def _mpeg_frame(data: bytes, position: int) -> Optional[Dict[str, int]]:
+    """Decodificar la cabecera de trama en position (None si no es válida)"""
+    if position + 4 > len(data):
+        return None
+    b1, b2, b3 = data[position + 1], data[position + 2], data[position + 3]
+    if data[position] != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version = {0: 25, 2: 2, 3: 1}.get((b1 >> 3) & 0x3)
+    layer = {1: 3, 2: 2, 3: 1}.get((b1 >> 1) & 0x3)
+    bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 0x3
+    if version is None or layer is None or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = _BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 0x1
+    if layer == 1:
+        samples, length = 384, (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 576 if layer == 3 and version != 1 else 1152
+        length = samples // 8 * bitrate // sample_rate + padding
+    return {'version': version, 'layer': layer, 'bitrate': bitrate, 'sample_rate': sample_rate,
+            'channels': 1 if (b3 >> 6) == 3 else 2, 'samples': samples, 'length': length}
+
+
+def probe_mp3(data: bytes) -> Optional[AudioInfo]:
+    start = _skip_id3(data)
+    if start and start >= len(data):
+        # Etiqueta ID3 más grande que la cabecera leída
+        return AudioInfo("mp3")
+    # Primera trama válida seguida de otra trama válida (evita falsos positivos)
+    for position in range(start, min(len(data) - 4, start + 4096)):
+        frame = _mpeg_frame(data, position)
+        if frame is None or frame['length'] <= 0:
+            continue
+        following = position + frame['length']
+        if following + 4 <= len(data) and _mpeg_frame(data, following) is None:
+            continue
+        break
+    else:
+        return None
+
+    info = AudioInfo("mp3", sample_rate=frame['sample_rate'], channels=frame['channels'],
+                     byte_rate=frame['bitrate'] / 8)
+    # VBR: número total de tramas en la cabecera Xing/Info o VBRI
+    if frame['version'] == 1:
+        side_info = 17 if frame['channels'] == 1 else 32
+    else:
+        side_info = 9 if frame['channels'] == 1 else 17
+    xing = position + 4 + side_info
+    frames = None
+    if data[xing:xing + 4] in (b"Xing", b"Info") and len(data) >= xing + 12:
+        flags = struct.unpack(">I", data[xing + 4:xing + 8])[0]
+        if flags & 0x1:
+            frames = struct.unpack(">I", data[xing + 8:xing + 12])[0]
+    elif data[position + 36:position + 40] == b"VBRI" and len(data) >= position + 54:
+        frames = struct.unpack(">I", data[position + 50:position + 54])[0]
+    if frames:
+        info.duration = frames * frame['samples'] / frame['sample_rate']
+    return info
+
+
+def _mp4_boxes(f: BinaryIO, end: int) -> Iterable:
+    """Recorrer las cajas ISO BMFF hasta end: (tipo, inicio del contenido, fin)"""
+    position = f.tell()
+    while position + 8 <= end:
+        f.seek(position)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack(">I4s", header)
+        content = position + 8
+        if size == 1:
+            large = f.read(8)
+            if len(large) < 8:
+                return
+            size = struct.unpack(">Q", large)[0]
+            content += 8
+        elif size == 0:
+            size = end - position
+        if size < content - position:
+            return
+        yield box_type, content, position + size
+        position += size
+
+
+def _mp4_duration(f: BinaryIO, end: int) -> Optional[float]:
+    """Duración de la caja moov/mvhd (None si no está en el rango leído)"""
+    for box_type, content, box_end in _mp4_boxes(f, end):
+        if box_type != b"moov":
+            continue
+        f.seek(content)
+        for child, child_content, _ in _mp4_boxes(f, min(box_end, end)):
+            if child != b"mvhd":
+                continue
+            f.seek(child_content)
+            version = f.read(1)
+            if not version:
+                return None
+            f.read(3)
+            if version[0] == 1:
+                raw = f.read(28)
+                if len(raw) < 28:
+                    return None
+                timescale, duration = struct.unpack(">IQ", raw[16:28])
+            else:
+                raw = f.read(16)
+                if len(raw) < 16:
+                    return None
+                timescale, duration = struct.unpack(">II", raw[8:16])
+            return duration / timescale if timescale else None
+    return None
+
+
+def probe_m4a(data: bytes) -> Optional[AudioInfo]:
+    if len(data) < 12 or data[4:8] != b"ftyp":
+        return None
+    return AudioInfo("m4a", _mp4_duration(io.BytesIO(data), len(data)))
+
+
+def probe(data: bytes) -> Optional[AudioInfo]:
+    """Identificar el audio a partir de sus primeros bytes (None si no se reconoce)"""
+    for prober in (probe_wav, probe_flac, probe_m4a, probe_mp3):
+        info = prober(data)
+        if info is not None:
+            return info
+    return None
+
+
+def probe_file(path: str) -> Optional[AudioInfo]:
+    """Identificar un archivo leyendo sólo su cabecera (y las cajas de M4A)"""
+    with open(path, "rb") as f:
+        info = probe(f.read(HEADER_SIZE))
+        if info is not None and info.format == "m4a" and info.duration is None:
+            # moov al final del archivo: saltar de caja en caja sin leer el audio
+            f.seek(0)
+            info.duration = _mp4_duration(f, os.fstat(f.fileno()).st_size)
+    if info is not None and info.duration is None and info.byte_rate:
+        info.duration = os.path.getsize(path) / info.byte_rate
+    return info
+
+
+class UploadValidator:
+    """
+    Valida un audio mientras se copia por bloques (ver OutputStore.put_stream):
+    el primer bloque fija el formato y la duración, y cada bloque se comprueba
+    contra el tamaño máximo y la duración estimada.
+    """
+
+    def __init__(self, allowed_formats: Iterable[str], max_size: Optional[int] = None,
+                 max_duration: Optional[float] = None):
+        self.allowed_formats = {fmt.lower().lstrip('.') for fmt in allowed_formats}
+        self.max_size = max_size
+        self.max_duration = max_duration
+        self.size = 0
+        self.info: Optional[AudioInfo] = None
+
+    def check_extension(self, filename: str) -> None:
+        """Rechazo inmediato por extensión, antes de leer el cuerpo"""
+        extension = os.path.splitext(filename)[1].lower().lstrip('.')
+        if extension and extension not in self.allowed_formats:
+            raise UploadRejected('UNSUPPORTED_FORMAT', f"Formato no permitido: .{extension}", 415,
+                                 allowed=sorted(self.allowed_formats))
+
+    def __call__(self, block: bytes) -> None:
+        if self.info is None:
+            self.info = probe(block[:HEADER_SIZE])
+            if self.info is None or self.info.format not in self.allowed_formats:
+                raise UploadRejected('UNSUPPORTED_FORMAT', 'El archivo no es un audio WAV, MP3, FLAC o M4A válido',
+                                     415, allowed=sorted(self.allowed_formats))
+        self.size += len(block)
+        if self.max_size and self.size > self.max_size:
+            raise UploadRejected('FILE_TOO_LARGE', 'Archivo demasiado grande', 413, max_size=self.max_size)
+        self._check_duration(self.info.estimate_duration(self.size))
+
+    def finish(self, path: str) -> AudioInfo:
+        """Comprobación final con el archivo completo en disco"""
+        if self.info is None:
+            raise UploadRejected('INVALID_AUDIO', 'Archivo de audio vacío')
+        if self.info.duration is None:
+            final = probe_file(path)
+            if final is not None and final.duration is not None:
+                self.info.duration = final.duration
+        self._check_duration(self.info.duration)
+        return self.info
+
+    def _check_duration(self, duration: Optional[float]) -> None:
+        if self.max_duration and duration is not None and duration > self.max_duration:
+            raise UploadRejected('AUDIO_TOO_LONG',
+                                 f"Audio demasiado largo (máximo {self.max_duration:g} segundos)", 422,
+                                 duration=round(duration, 2), max_duration=self.max_duration)
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Utilidades de audio con NumPy: lectura/escritura de WAV, conversión PCM,
+remuestreo (también por bloques) y cabeceras para WAV en streaming.
+"""
+
+import io
+import struct
+import wave
+from typing import BinaryIO, Iterator, Tuple, Union
+
+import numpy as np
+
+
+def pcm16_to_float(data: bytes) -> np.ndarray:
+    """PCM 16 bits little-endian -> float32 en [-1, 1]"""
+    return np.frombuffer(data, dtype='<i2').astype(np.float32) / 32768.0
+
+
+def float_to_pcm16(samples: np.ndarray) -> bytes:
+    """float en [-1, 1] -> PCM 16 bits little-endian"""
+    return (np.clip(samples, -1.0, 1.0) * 32767.0).astype('<i2').tobytes()
+
+
+def _frames_to_float(frames: bytes, sample_width: int) -> np.ndarray:
+    if sample_width == 1:
+        return (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    if sample_width == 2:
+        return pcm16_to_float(frames)
+    if sample_width == 3:
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3)
+        values = (raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8)
+                  | (raw[:, 2].astype(np.int32) << 16))
+        values = np.where(values >= 1 << 23, values - (1 << 24), values)
+        return values.astype(np.float32) / float(1 << 23)
+    if sample_width == 4:
+        return np.frombuffer(frames, dtype='<i4').astype(np.float32) / float(1 << 31)
+    raise ValueError(f"Ancho de muestra no soportado: {sample_width}")
+
+
+def read_wav(source: Union[str, BinaryIO], mono: bool = True) -> Tuple[np.ndarray, int]:
+    """
+    Leer un WAV PCM como float32. Con mono=True los canales se promedian;
+    si no, devuelve un array (muestras, canales).
+    """
+    with wave.open(source, 'rb') as wf:
+        channels = wf.getnchannels()
+        sample_width = wf.getsampwidth()
+        sample_rate = wf.getframerate()
+        frames = wf.readframes(wf.getnframes())
+
+    samples = _frames_to_float(frames, sample_width)
+    if channels > 1:
+        samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels)
+        if mono:
+            samples = samples.mean(axis=1)
+    return samples, sample_rate
+
+
+def iter_wav_blocks(source: Union[str, BinaryIO], block_seconds: float) -> Tuple[int, Iterator[np.ndarray]]:
+    """
+    Leer un WAV PCM por bloques de block_seconds, mezclado a mono. Devuelve
+    (frecuencia, iterador de bloques float32): la memoria no depende de la
+    longitud del archivo. Lanza wave.Error si no es PCM.
+    """
+    wf = wave.open(source, 'rb')
+    channels = wf.getnchannels()
+    sample_width = wf.getsampwidth()
+    block_frames = max(1, int(block_seconds * wf.getframerate()))
+
+    def blocks() -> Iterator[np.ndarray]:
+        try:
+            while True:
+                frames = wf.readframes(block_frames)
+                if not frames:
+                    break
+                samples = _frames_to_float(frames, sample_width)
+                if channels > 1:
+                    samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+                yield samples
+        finally:
+            wf.close()
+
+    return wf.getframerate(), blocks()
+
+
+def encode_wav(samples: np.ndarray, sample_rate: int) -> bytes:
+    """Codificar float32 mono como WAV PCM 16 bits en memoria"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(float_to_pcm16(samples))
+    return buffer.getvalue()
+
+
+def write_wav(path: str, samples: np.ndarray, sample_rate: int) -> None:
+    """Escribir float32 mono como WAV PCM 16 bits"""
+    with open(path, 'wb') as f:
+        f.write(encode_wav(samples, sample_rate))
+
+
+def wav_stream_header(sample_rate: int, channels: int = 1) -> bytes:
+    """
+    Cabecera WAV PCM 16 bits para streaming: los tamaños se dejan al máximo
+    porque la duración total no se conoce al empezar a enviar
+    """
+    byte_rate = sample_rate * channels * 2
+    return (b'RIFF' + struct.pack('<I', 0xFFFFFFFF) + b'WAVE'
+            + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, channels, sample_rate, byte_rate, channels * 2, 16)
+            + b'data' + struct.pack('<I', 0xFFFFFFFF))
+
+
+def resample(samples: np.ndarray, from_rate: int, to_rate: int) -> np.ndarray:
+    """Remuestreo por interpolación lineal (vectorizado)"""
+    if from_rate == to_rate or len(samples) == 0:
+        return samples.astype(np.float32, copy=False)
+    duration = len(samples) / from_rate
+    target_length = max(1, int(round(duration * to_rate)))
+    positions = np.arange(target_length, dtype=np.float64) * (from_rate / to_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def frame_rms(samples: np.ndarray, frame: int) -> np.ndarray:
+    """RMS de cada ventana completa de frame muestras"""
+    count = len(samples) // frame
+    if count == 0:
+        return np.zeros(0, dtype=np.float64)
+    frames = samples[:count * frame].reshape(count, frame)
+    return np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+
+
+def lowpass_taps(cutoff: float, taps: int = 63) -> np.ndarray:
+    """FIR paso bajo (sinc con ventana de Hann); cutoff relativo a Nyquist"""
+    n = np.arange(taps) - (taps - 1) / 2
+    kernel = cutoff * np.sinc(cutoff * n) * np.hanning(taps)
+    return (kernel / kernel.sum()).astype(np.float32)
+
+
+class StreamResampler:
+    """
+    Remuestreo por bloques con continuidad entre ellos: filtro anti-aliasing
+    al bajar de frecuencia e interpolación lineal sobre posiciones globales.
+    """
+
+    def __init__(self, from_rate: int, to_rate: int):
+        self.from_rate = from_rate
+        self.to_rate = to_rate
+        self.step = from_rate / to_rate
+        self.taps = lowpass_taps(0.9 * to_rate / from_rate) if to_rate < from_rate else None
+        self._history = np.zeros(len(self.taps) - 1 if self.taps is not None else 0, dtype=np.float32)
+        self._previous = np.zeros(0, dtype=np.float32)
+        self._base = 0.0   # índice global de la primera muestra del buffer
+        self._next = 0.0   # índice global de la próxima muestra de salida
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        block = block.astype(np.float32, copy=False)
+        if self.from_rate == self.to_rate or len(block) == 0:
+            return block
+        if self.taps is not None:
+            padded = np.concatenate((self._history, block))
+            self._history = padded[len(padded) - len(self._history):]
+            block = np.convolve(padded, self.taps, mode='valid').astype(np.float32)
+
+        buffer = np.concatenate((self._previous, block))
+        last = self._base + len(buffer) - 1
+        count = int((last - self._next) // self.step) + 1 if self._next <= last else 0
+        positions = self._next + np.arange(count, dtype=np.float64) * self.step
+        output = np.interp(positions - self._base, np.arange(len(buffer)), buffer).astype(np.float32)
+        self._next += count * self.step
+        # La última muestra se conserva para interpolar con el bloque siguiente
+        self._base = last
+        self._previous = buffer[-1:]
+        return output
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Síntesis masiva por lotes a partir de un manifiesto JSONL o CSV.
+
+Cada entrada del manifiesto tiene los campos id, text, engine
+(elevenlabs | coqui) y voice (opcional: voice_id de ElevenLabs, o audio de
+referencia para clonar con Coqui). Los trabajos de Coqui se reparten entre
+procesos worker persistentes (coqui_pool) y los de ElevenLabs entre hilos.
+
+Cada resultado se añade al manifiesto de resultados (JSONL) en cuanto
+termina, con sus tiempos; ese mismo archivo sirve de checkpoint: al
+relanzar el lote se saltan los ids que ya terminaron bien.
+
+Uso:
+    python app/batch_tts.py prompts.jsonl --output-dir renders/
+    python app/batch_tts.py prompts.csv --output-dir renders/ --processes 4 --threads 8
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set
+
+from coqui_pool import DEFAULT_PYTHON, create_coqui_pool
+
+
+ENGINES = ("elevenlabs", "coqui")
+RESULTS_FILENAME = "results.jsonl"
+
+
+@dataclass
+class BatchItem:
+    """Una entrada del manifiesto"""
+    id: str
+    text: str
+    engine: str = "elevenlabs"
+    voice: Optional[str] = None
+
+
+def load_manifest(path: str) -> List[BatchItem]:
+    """Leer un manifiesto .csv (con cabecera) o JSONL; valida ids y motores"""
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            rows = [(index + 2, row) for index, row in enumerate(csv.DictReader(f))]
+        else:
+            rows = [(index + 1, json.loads(line)) for index, line in enumerate(f) if line.strip()]
+
+    items = []
+    seen = set()
+    for line, row in rows:
+        if not isinstance(row, dict):
+            raise ValueError(f"{path}:{line}: cada línea debe ser un objeto JSON")
+        raw_id = row.get("id")
+        # Un id numérico (incluido 0) es válido en JSONL
+        item_id = "" if raw_id is None else str(raw_id).strip()
+        text = _string_field(row, "text", path, line)
+        engine = (_string_field(row, "engine", path, line) or "elevenlabs").lower()
+        if not item_id or not text:
+            raise ValueError(f"{path}:{line}: 'id' y 'text' son obligatorios")
+        if item_id in seen:
+            raise ValueError(f"{path}:{line}: id duplicado '{item_id}'")
+        if engine not in ENGINES:
+            raise ValueError(f"{path}:{line}: motor no soportado '{engine}'")
+        seen.add(item_id)
+        items.append(BatchItem(item_id, text, engine, _string_field(row, "voice", path, line) or None))
+    return items
+
+
+def _string_field(row: Dict[str, Any], name: str, path: str, line: int) -> str:
+    """Campo de texto opcional ('' si falta); ValueError si no es una cadena"""
+    value = row.get(name)
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        raise ValueError(f"{path}:{line}: '{name}' debe ser una cadena")
+    return value.strip()
+
+
+class ResultsLog:
+    """Manifiesto de resultados append-only (y checkpoint del lote)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def completed_ids(self) -> Set[str]:
+        """Ids terminados con éxito en ejecuciones anteriores"""
+        completed = set()
+        if not os.path.exists(self.path):
+            return completed
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Última línea truncada por un corte: se repite ese item
+                    continue
+                # Los silencios de reserva de versiones anteriores no cuentan
+                if record.get("status") == "ok" and record.get("backend") != "placeholder":
+                    completed.add(record["id"])
+        return completed
+
+    def write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+
+def output_path_for(output_dir: str, item: BatchItem) -> str:
+    """Ruta de salida estable derivada del id"""
+    safe_id = re.sub(r"[^\w.-]", "_", item.id).lstrip(".") or "item"
+    extension = "wav" if item.engine == "coqui" else "mp3"
+    return os.path.join(output_dir, f"{safe_id}.{extension}")
+
+
+def synthesize_elevenlabs(item: BatchItem, output_path: str) -> Dict[str, Any]:
+    """TTS con ElevenLabs (con cache) escribiendo de forma atómica"""
+    from audio_cache import get_audio_cache, make_cache_key
+    from elevenlabs_client import get_client
+
+    client = get_client()
+    cache = get_audio_cache()
+    voice_id = item.voice or client.default_voice_id
+    cache_key = make_cache_key("elevenlabs", item.text, voice_id, client.model_id, client.output_format)
+
+    data = cache.get(cache_key)
+    cached = data is not None
+    if data is None:
+        response = client.text_to_speech(item.text, voice_id=voice_id)
+        if response.status_code != 200:
+            raise RuntimeError(f"Error de ElevenLabs ({response.status_code}): {response.text[:200]}")
+        data = response.content
+        cache.put(cache_key, data, "mp3")
+
+    partial_path = output_path + ".part"
+    with open(partial_path, "wb") as f:
+        f.write(data)
+    os.replace(partial_path, output_path)
+    return {"cached": cached}
+
+
+def synthesize_coqui(pool, item: BatchItem, output_path: str) -> Dict[str, Any]:
+    """
+    TTS (o clonación si el item trae audio de referencia) en un worker Coqui.
+    El worker escribe en un .part que sólo se renombra si el audio es bueno.
+    """
+    partial_path = output_path + ".part"
+    try:
+        if item.voice:
+            response = pool.submit("clone", audio_path=os.path.abspath(item.voice),
+                                   text=item.text, output_path=partial_path)
+        else:
+            response = pool.submit("tts", text=item.text, output_path=partial_path)
+        if not response.get("ok"):
+            raise RuntimeError(response.get("message") or "Error en Coqui")
+        if response.get("backend") == "placeholder":
+            # Un segundo de silencio: no cuenta como hecho y se repite al reanudar
+            raise RuntimeError("Ningún motor local disponible (sólo silencio de reserva)")
+        os.replace(partial_path, output_path)
+    finally:
+        if os.path.exists(partial_path):
+            os.unlink(partial_path)
+    return {"worker_pid": response.get("pid"), "worker_duration": response.get("duration"),
+            "backend": response.get("backend")}
+
+
+def run_batch(items: List[BatchItem], output_dir: str, results_path: str,
+              processes: int = 2, threads: int = 8, resume: bool = True,
+              coqui_python: str = DEFAULT_PYTHON) -> Dict[str, Any]:
+    """Procesar el lote y devolver un resumen"""
+    os.makedirs(output_dir, exist_ok=True)
+    log = ResultsLog(results_path)
+    done = log.completed_ids() if resume else set()
+    pending = [item for item in items if item.id not in done]
+
+    summary = {"total": len(items), "skipped": len(items) - len(pending), "ok": 0, "failed": 0}
+    if not pending:
+        return summary
+
+    pool = None
+    if any(item.engine == "coqui" for item in pending):
+        pool = create_coqui_pool(size=processes, python=coqui_python)
+        pool.start()
+
+    def process(item: BatchItem, queued_at: float) -> Dict[str, Any]:
+        output_path = os.path.abspath(output_path_for(output_dir, item))
+        started = time.time()
+        record: Dict[str, Any] = {
+            "id": item.id, "engine": item.engine, "voice": item.voice,
+            "chars": len(item.text), "output": output_path,
+            "started_at": started, "wait": round(started - queued_at, 4),
+        }
+        try:
+            if item.engine == "coqui":
+                record.update(synthesize_coqui(pool, item, output_path))
+            else:
+                record.update(synthesize_elevenlabs(item, output_path))
+            record["status"] = "ok"
+            record["bytes"] = os.path.getsize(output_path)
+        except Exception as e:
+            record["status"] = "error"
+            record["error"] = str(e)
+        record["duration"] = round(time.time() - started, 4)
+        return record
+
+    batch_started = time.time()
+    coqui_executor = ThreadPoolExecutor(max_workers=processes, thread_name_prefix="batch-coqui")
+    elevenlabs_executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="batch-elevenlabs")
+    try:
+        futures = [
+            (coqui_executor if item.engine == "coqui" else elevenlabs_executor).submit(
+                process, item, time.time())
+            for item in pending
+        ]
+        for index, future in enumerate(as_completed(futures), start=1):
+            record = future.result()
+            log.write(record)
+            summary["ok" if record["status"] == "ok" else "failed"] += 1
+            mark = "✅" if record["status"] == "ok" else "❌"
+            print(f"{mark} [{index}/{len(pending)}] {record['id']} "
+                  f"({record['engine']}, {record['duration']:.2f}s)"
+                  + (f": {record['error']}" if record["status"] != "ok" else ""))
+    except KeyboardInterrupt:
+        print("\n⏹️ Interrumpido: los items terminados quedan en el checkpoint")
+        coqui_executor.shutdown(wait=False, cancel_futures=True)
+        elevenlabs_executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        coqui_executor.shutdown()
+        elevenlabs_executor.shutdown()
+        if pool is not None:
+            pool.shutdown()
+
+    elapsed = time.time() - batch_started
+    summary["elapsed"] = round(elapsed, 2)
+    summary["items_per_second"] = round(len(pending) / elapsed, 3) if elapsed > 0 else None
+    return summary
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Síntesis por lotes a partir de un manifiesto JSONL/CSV")
+    parser.add_argument('manifest', help='Manifiesto .jsonl o .csv con id, text, engine, voice')
+    parser.add_argument('--output-dir', default='static/batch', help='Directorio de salida del audio')
+    parser.add_argument('--results', help=f'Manifiesto de resultados (por defecto <output-dir>/{RESULTS_FILENAME})')
+    parser.add_argument('--processes', type=int, default=2, help='Procesos worker de Coqui')
+    parser.add_argument('--threads', type=int, default=8, help='Hilos para ElevenLabs')
+    parser.add_argument('--no-resume', action='store_true', help='Ignorar el checkpoint y procesar todo')
+    parser.add_argument('--coqui-python', default=DEFAULT_PYTHON, help='Intérprete de los workers Coqui')
+    args = parser.parse_args()
+
+    try:
+        items = load_manifest(args.manifest)
+    except (OSError, ValueError) as e:
+        print(f"❌ Manifiesto inválido: {e}")
+        return 1
+
+    results_path = args.results or os.path.join(args.output_dir, RESULTS_FILENAME)
+    print(f"📋 {len(items)} items en {args.manifest} -> {args.output_dir}")
+    try:
+        summary = run_batch(items, args.output_dir, results_path, args.processes,
+                            args.threads, not args.no_resume, args.coqui_python)
+    except KeyboardInterrupt:
+        return 130
+
+    print(f"📊 Resumen: {json.dumps(summary)}")
+    print(f"📄 Resultados: {results_path}")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Síntesis por fragmentos para textos largos.
+
+El texto se segmenta por oraciones (text_segmentation), cada fragmento se
+sintetiza en paralelo con un número acotado de workers del motor y los
+resultados se unen en orden con un crossfade corto a una frecuencia de
+muestreo común. El primer fragmento se entrega en cuanto está listo, sin
+esperar al resto.
+"""
+
+import io
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from audio_utils import encode_wav, float_to_pcm16, pcm16_to_float, read_wav, resample, wav_stream_header
+from text_segmentation import segment_text
+from tracing import bind, span
+
+
+# Un sintetizador de fragmento devuelve (muestras float32 mono, sample_rate)
+ChunkSynthesizer = Callable[[str], Tuple[np.ndarray, int]]
+
+
+def iter_crossfaded(chunks: Iterable[np.ndarray], crossfade_samples: int) -> Iterator[np.ndarray]:
+    """
+    Unir fragmentos con un crossfade lineal de forma incremental: sólo se
+    retiene la cola del fragmento anterior, el resto se entrega de inmediato
+    """
+    if crossfade_samples <= 0:
+        yield from chunks
+        return
+
+    tail = None
+    for chunk in chunks:
+        if tail is not None:
+            overlap = min(len(tail), len(chunk))
+            if overlap:
+                ramp = np.linspace(0.0, 1.0, overlap, dtype=np.float32)
+                yield tail[:len(tail) - overlap]
+                yield tail[len(tail) - overlap:] * (1.0 - ramp) + chunk[:overlap] * ramp
+                chunk = chunk[overlap:]
+            else:
+                yield tail
+        if len(chunk) > crossfade_samples:
+            yield chunk[:-crossfade_samples]
+            tail = chunk[-crossfade_samples:]
+        else:
+            tail = chunk
+    if tail is not None and len(tail):
+        yield tail
+
+
+class ChunkedSynthesizer:
+    """Síntesis paralela de fragmentos con unión ordenada"""
+
+    def __init__(self, synthesize_chunk: ChunkSynthesizer, max_workers: int = 4,
+                 sample_rate: int = 22050, crossfade_ms: int = 30, max_chars: int = 250):
+        self.synthesize_chunk = synthesize_chunk
+        self.max_workers = max(1, max_workers)
+        self.sample_rate = sample_rate
+        self.crossfade_samples = int(sample_rate * crossfade_ms / 1000)
+        self.max_chars = max_chars
+
+    def segment(self, text: str) -> List[str]:
+        return segment_text(text, self.max_chars)
+
+    def _render(self, text: str) -> np.ndarray:
+        with span('chunk', chars=len(text)):
+            samples, rate = self.synthesize_chunk(text)
+            return resample(samples, rate, self.sample_rate)
+
+    def _ordered_results(self, chunks: List[str]) -> Iterator[np.ndarray]:
+        """Lanzar todos los fragmentos y entregarlos en orden según terminan"""
+        if not chunks:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks)),
+                                thread_name_prefix="tts-chunk") as executor:
+            # Cada fragmento hereda el contexto de traza de la petición
+            futures = [executor.submit(bind(self._render), chunk) for chunk in chunks]
+            try:
+                for future in futures:
+                    yield future.result()
+            finally:
+                # Cliente desconectado o error: no sintetizar lo pendiente
+                for future in futures:
+                    future.cancel()
+
+    def iter_audio(self, text: str) -> Iterator[np.ndarray]:
+        """Bloques float32 a self.sample_rate, en orden y con crossfade"""
+        return iter_crossfaded(self._ordered_results(self.segment(text)), self.crossfade_samples)
+
+    def iter_wav_stream(self, text: str) -> Iterator[bytes]:
+        """WAV PCM 16 bits en streaming: cabecera y después bloques PCM"""
+        yield wav_stream_header(self.sample_rate)
+        for block in self.iter_audio(text):
+            if len(block):
+                yield float_to_pcm16(block)
+
+    def synthesize(self, text: str) -> Tuple[bytes, int]:
+        """Sintetizar el texto completo; devuelve (WAV en memoria, nº de fragmentos)"""
+        chunks = self.segment(text)
+        blocks = list(iter_crossfaded(self._ordered_results(chunks), self.crossfade_samples))
+        with span('encoding', format='wav'):
+            samples = np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.float32)
+            return encode_wav(samples, self.sample_rate), len(chunks)
+
+    def synthesize_to_file(self, text: str, output_path: str) -> int:
+        """Sintetizar el texto completo en un WAV; devuelve el nº de fragmentos"""
+        data, chunks = self.synthesize(text)
+        with open(output_path, 'wb') as f:
+            f.write(data)
+        return chunks
+
+
+# Content-Type con el que puede llegar el PCM crudo de ElevenLabs
+PCM_CONTENT_TYPES = ("audio/pcm", "audio/l16", "audio/x-pcm", "application/octet-stream")
+
+
+def elevenlabs_chunk_synthesizer(sample_rate: int = 22050) -> ChunkSynthesizer:
+    """Fragmentos con ElevenLabs en PCM crudo (sin decodificar MP3)"""
+    from audio_cache import get_audio_cache, make_cache_key
+    from audio_probe import HEADER_SIZE, probe
+    from elevenlabs_client import get_client
+
+    client = get_client()
+    cache = get_audio_cache()
+    output_format = f"pcm_{sample_rate}"
+
+    def synthesize_chunk(text: str) -> Tuple[np.ndarray, int]:
+        key = make_cache_key("elevenlabs", text, voice_id=client.default_voice_id,
+                             model_id=client.model_id, output_format=output_format)
+        data = cache.get(key)
+        if data is not None and probe(data[:HEADER_SIZE]) is not None:
+            # Entrada con audio comprimido (guardada cuando el formato no llegaba a la API)
+            data = None
+        if data is None:
+            response = client.text_to_speech(text, output_format=output_format)
+            if response.status_code != 200:
+                raise RuntimeError(f"Error de ElevenLabs ({response.status_code}): {response.text}")
+            content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            if content_type not in PCM_CONTENT_TYPES:
+                # Decodificar MP3 como PCM produciría ruido
+                raise RuntimeError(f"ElevenLabs no devolvió {output_format} (Content-Type: {content_type or 'ninguno'})")
+            data = response.content
+            cache.put(key, data, "pcm")
+        return pcm16_to_float(data), sample_rate
+
+    return synthesize_chunk
+
+
+def coqui_chunk_synthesizer(pool) -> ChunkSynthesizer:
+    """Fragmentos con el pool de workers de Coqui"""
+    from audio_cache import get_audio_cache, make_cache_key
+
+    cache = get_audio_cache()
+
+    def synthesize_chunk(text: str) -> Tuple[np.ndarray, int]:
+        key = make_cache_key("coqui", text, model_id="fallback", output_format="wav")
+        data = cache.get(key)
+        if data is None:
+            response = pool.submit("tts", text=text)
+            if not response.get("ok") or not response.get("audio"):
+                raise RuntimeError(response.get("message") or "Error en Coqui TTS")
+            data = response["audio"]
+            if response.get("backend") != "placeholder":
+                cache.put(key, data, "wav")
+        return read_wav(io.BytesIO(data))
+
+    return synthesize_chunk
@@ -7,21 +7,35 @@ import os
 from pathlib import Path
 from typing import Dict, Any, Optional
 import json
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 from dotenv import load_dotenv
 
 
+# Raíz del proyecto: las rutas relativas de la configuración cuelgan de aquí,
+# no del directorio desde el que se arranca la app
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def project_path(path: str) -> str:
+    """Ruta absoluta; las relativas se resuelven contra PROJECT_ROOT"""
+    return path if os.path.isabs(path) else os.path.join(PROJECT_ROOT, path)
+
+
 @dataclass
 class ElevenLabsConfig:
     """Configuración para ElevenLabs"""
     api_key: str = ""
+    base_url: str = "https://api.elevenlabs.io"
     default_voice_id: str = "EXAVITQu4vr4xnSDxMaL"  # Sarah
     model_id: str = "eleven_multilingual_v2"
     output_format: str = "mp3_44100_128"
     stability: float = 0.5
     similarity_boost: float = 0.75
     timeout: int = 30
+    connect_timeout: int = 5
     max_retries: int = 3
+    voice_registry_path: str = "cache/voice_registry.json"
+    max_cloned_voices: int = 10
 
 
 @dataclass
@@ -33,6 +47,14 @@ class CoquiConfig:
     cache_dir: str = "models_cache"
     use_gpu: bool = False
     models_preload: bool = True
+    worker_pool_size: int = 2
+    worker_timeout: int = 120
+    health_check_interval: int = 30
+    speaker_cache_dir: str = "cache/speakers"
+    speaker_cache_items: int = 16
+    worker_startup_timeout: int = 300
+    warmup_text: str = "Hola, esta es una prueba de calentamiento."
+    model_catalog_path: str = "cache/model_catalog.json"
 
 
 @dataclass
@@ -46,6 +68,12 @@ class WebConfig:
     upload_folder: str = "static/uploads"
     allowed_extensions: tuple = ("wav", "mp3", "m4a", "flac")
     session_timeout: int = 3600  # 1 hora
+    output_max_size: int = 1024 * 1024 * 1024  # 1GB
+    output_max_age: int = 86400  # 24 horas
+    janitor_interval: int = 300  # 5 minutos
+    audio_max_age: int = 31536000  # los audios publicados son inmutables (1 año)
+    sendfile_header: str = ""  # "", "X-Accel-Redirect" (nginx) o "X-Sendfile" (Apache, lighttpd)
+    sendfile_prefix: str = "/protected-audio/"  # location interna de nginx para X-Accel-Redirect
 
 
 @dataclass
@@ -57,6 +85,7 @@ class SecurityConfig:
     allowed_origins: list = None
     enable_cors: bool = True
     csrf_protection: bool = True
+    admin_token: str = ""  # vacío = endpoints /admin desactivados
 
 
 @dataclass
@@ -69,6 +98,8 @@ class LoggingConfig:
     log_format: str = "%(asctime)s | %(name)s | %(levelname)s | %(module)s:%(lineno)d | %(message)s"
     enable_metrics: bool = True
     metrics_retention_days: int = 30
+    metrics_dir: str = "cache/metrics"  # instantáneas por proceso para /metrics
+    metrics_flush_interval: float = 5.0
 
 
 @dataclass
@@ -79,7 +110,34 @@ class PerformanceConfig:
     request_timeout: int = 120
     cache_enabled: bool = True
     cache_ttl: int = 3600  # 1 hora
+    cache_dir: str = "cache/audio"
+    cache_max_size: int = 512 * 1024 * 1024  # 512MB
+    cache_memory_items: int = 32
     preload_models: bool = False
+    job_store: str = "memory"  # memory | sqlite
+    job_db_path: str = "cache/jobs.db"
+    job_retention: int = 3600  # 1 hora
+    chunk_max_chars: int = 250  # textos más largos se sintetizan por fragmentos
+    chunk_crossfade_ms: int = 30
+    profile_dir: str = "logs/profiles"
+    profile_requests: bool = False  # perfilar con cProfile todas las peticiones
+    sampling_interval: float = 0.05  # muestreo de pilas (0 = desactivado)
+
+
+@dataclass
+class AudioProcessingConfig:
+    """Preprocesado del audio de referencia para clonación"""
+    enabled: bool = True
+    sample_rate: int = 16000  # 0 = usar CoquiConfig.sample_rate
+    max_duration: float = 30.0  # segundos de voz que se conservan
+    silence_threshold_db: float = -45.0  # dBFS por debajo de los cuales es silencio
+    target_level_db: float = -20.0  # nivel RMS de la voz tras normalizar (dBFS)
+    block_seconds: float = 5.0  # tamaño de bloque al decodificar
+    reference_dir: str = "cache/references"
+    reference_max_size: int = 256 * 1024 * 1024  # 256MB
+    quality_gate: bool = True  # rechazar referencias inservibles antes de clonar
+    min_quality_score: float = 0.5  # puntuación mínima (0-1)
+    min_duration: float = 3.0  # segundos de voz mínimos
 
 
 @dataclass
@@ -92,6 +150,7 @@ class AppConfig:
     security: SecurityConfig
     logging: LoggingConfig
     performance: PerformanceConfig
+    audio: AudioProcessingConfig = field(default_factory=AudioProcessingConfig)
     
     # Metadatos
     app_name: str = "Voice Synthesis Demo"
@@ -104,28 +163,40 @@ class AppConfig:
         """Crear configuración desde variables de entorno"""
         
         # Cargar archivo .env si existe
-        env_path = Path(env_file)
+        env_path = Path(project_path(env_file))
         if env_path.exists():
             load_dotenv(env_path)
         
         return cls(
             elevenlabs=ElevenLabsConfig(
                 api_key=os.getenv("ELEVENLABS_API_KEY", ""),
+                base_url=os.getenv("ELEVENLABS_BASE_URL", "https://api.elevenlabs.io"),
                 default_voice_id=os.getenv("ELEVENLABS_VOICE_ID", "EXAVITQu4vr4xnSDxMaL"),
                 model_id=os.getenv("ELEVENLABS_MODEL_ID", "eleven_multilingual_v2"),
                 output_format=os.getenv("ELEVENLABS_OUTPUT_FORMAT", "mp3_44100_128"),
                 stability=float(os.getenv("ELEVENLABS_STABILITY", "0.5")),
                 similarity_boost=float(os.getenv("ELEVENLABS_SIMILARITY_BOOST", "0.75")),
                 timeout=int(os.getenv("ELEVENLABS_TIMEOUT", "30")),
-                max_retries=int(os.getenv("ELEVENLABS_MAX_RETRIES", "3"))
+                connect_timeout=int(os.getenv("ELEVENLABS_CONNECT_TIMEOUT", "5")),
+                max_retries=int(os.getenv("ELEVENLABS_MAX_RETRIES", "3")),
+                voice_registry_path=project_path(os.getenv("ELEVENLABS_VOICE_REGISTRY", "cache/voice_registry.json")),
+                max_cloned_voices=int(os.getenv("ELEVENLABS_MAX_CLONED_VOICES", "10"))
             ),
             coqui=CoquiConfig(
                 default_model=os.getenv("COQUI_DEFAULT_MODEL", "tts_models/es/mai/tacotron2-DDC"),
                 voice_cloning_model=os.getenv("COQUI_VOICE_CLONING_MODEL", "tts_models/multilingual/multi-dataset/your_tts"),
                 sample_rate=int(os.getenv("COQUI_SAMPLE_RATE", "22050")),
-                cache_dir=os.getenv("COQUI_CACHE_DIR", "models_cache"),
+                cache_dir=project_path(os.getenv("COQUI_CACHE_DIR", "models_cache")),
                 use_gpu=os.getenv("COQUI_USE_GPU", "False").lower() == "true",
-                models_preload=os.getenv("COQUI_MODELS_PRELOAD", "True").lower() == "true"
+                models_preload=os.getenv("COQUI_MODELS_PRELOAD", "True").lower() == "true",
+                worker_pool_size=int(os.getenv("COQUI_WORKER_POOL_SIZE", "2")),
+                worker_timeout=int(os.getenv("COQUI_WORKER_TIMEOUT", "120")),
+                health_check_interval=int(os.getenv("COQUI_HEALTH_CHECK_INTERVAL", "30")),
+                speaker_cache_dir=project_path(os.getenv("COQUI_SPEAKER_CACHE_DIR", "cache/speakers")),
+                speaker_cache_items=int(os.getenv("COQUI_SPEAKER_CACHE_ITEMS", "16")),
+                worker_startup_timeout=int(os.getenv("COQUI_WORKER_STARTUP_TIMEOUT", "300")),
+                warmup_text=os.getenv("COQUI_WARMUP_TEXT", "Hola, esta es una prueba de calentamiento."),
+                model_catalog_path=project_path(os.getenv("COQUI_MODEL_CATALOG", "cache/model_catalog.json"))
             ),
             web=WebConfig(
                 host=os.getenv("FLASK_HOST", "0.0.0.0"),
@@ -133,8 +204,14 @@ class AppConfig:
                 debug=os.getenv("FLASK_DEBUG", "False").lower() == "true",
                 secret_key=os.getenv("FLASK_SECRET_KEY", "demo_secret_key_change_in_production"),
                 max_content_length=int(os.getenv("MAX_CONTENT_LENGTH", str(16 * 1024 * 1024))),
-                upload_folder=os.getenv("UPLOAD_FOLDER", "static/uploads"),
-                session_timeout=int(os.getenv("SESSION_TIMEOUT", "3600"))
+                upload_folder=project_path(os.getenv("UPLOAD_FOLDER", "static/uploads")),
+                session_timeout=int(os.getenv("SESSION_TIMEOUT", "3600")),
+                output_max_size=int(os.getenv("OUTPUT_MAX_SIZE", str(1024 * 1024 * 1024))),
+                output_max_age=int(os.getenv("OUTPUT_MAX_AGE", "86400")),
+                janitor_interval=int(os.getenv("JANITOR_INTERVAL", "300")),
+                audio_max_age=int(os.getenv("AUDIO_MAX_AGE", "31536000")),
+                sendfile_header=os.getenv("AUDIO_SENDFILE_HEADER", ""),
+                sendfile_prefix=os.getenv("AUDIO_SENDFILE_PREFIX", "/protected-audio/")
             ),
             security=SecurityConfig(
                 rate_limit_per_minute=int(os.getenv("RATE_LIMIT_PER_MINUTE", "60")),
@@ -142,15 +219,18 @@ class AppConfig:
                 max_audio_duration=int(os.getenv("MAX_AUDIO_DURATION", "300")),
                 allowed_origins=os.getenv("ALLOWED_ORIGINS", "").split(",") if os.getenv("ALLOWED_ORIGINS") else None,
                 enable_cors=os.getenv("ENABLE_CORS", "True").lower() == "true",
-                csrf_protection=os.getenv("CSRF_PROTECTION", "True").lower() == "true"
+                csrf_protection=os.getenv("CSRF_PROTECTION", "True").lower() == "true",
+                admin_token=os.getenv("ADMIN_TOKEN", "")
             ),
             logging=LoggingConfig(
                 level=os.getenv("LOG_LEVEL", "INFO"),
-                log_dir=os.getenv("LOG_DIR", "logs"),
+                log_dir=project_path(os.getenv("LOG_DIR", "logs")),
                 max_log_size=int(os.getenv("MAX_LOG_SIZE", str(10 * 1024 * 1024))),
                 backup_count=int(os.getenv("LOG_BACKUP_COUNT", "5")),
                 enable_metrics=os.getenv("ENABLE_METRICS", "True").lower() == "true",
-                metrics_retention_days=int(os.getenv("METRICS_RETENTION_DAYS", "30"))
+                metrics_retention_days=int(os.getenv("METRICS_RETENTION_DAYS", "30")),
+                metrics_dir=project_path(os.getenv("METRICS_DIR", "cache/metrics")),
+                metrics_flush_interval=float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
             ),
             performance=PerformanceConfig(
                 async_processing=os.getenv("ASYNC_PROCESSING", "True").lower() == "true",
@@ -158,7 +238,31 @@ class AppConfig:
                 request_timeout=int(os.getenv("REQUEST_TIMEOUT", "120")),
                 cache_enabled=os.getenv("CACHE_ENABLED", "True").lower() == "true",
                 cache_ttl=int(os.getenv("CACHE_TTL", "3600")),
-                preload_models=os.getenv("PRELOAD_MODELS", "False").lower() == "true"
+                cache_dir=project_path(os.getenv("CACHE_DIR", "cache/audio")),
+                cache_max_size=int(os.getenv("CACHE_MAX_SIZE", str(512 * 1024 * 1024))),
+                cache_memory_items=int(os.getenv("CACHE_MEMORY_ITEMS", "32")),
+                preload_models=os.getenv("PRELOAD_MODELS", "False").lower() == "true",
+                job_store=os.getenv("JOB_STORE", "memory"),
+                job_db_path=project_path(os.getenv("JOB_DB_PATH", "cache/jobs.db")),
+                job_retention=int(os.getenv("JOB_RETENTION", "3600")),
+                chunk_max_chars=int(os.getenv("CHUNK_MAX_CHARS", "250")),
+                chunk_crossfade_ms=int(os.getenv("CHUNK_CROSSFADE_MS", "30")),
+                profile_dir=project_path(os.getenv("PROFILE_DIR", "logs/profiles")),
+                profile_requests=os.getenv("PROFILE_REQUESTS", "False").lower() == "true",
+                sampling_interval=float(os.getenv("PROFILER_SAMPLING_INTERVAL", "0.05"))
+            ),
+            audio=AudioProcessingConfig(
+                enabled=os.getenv("REFERENCE_PREPROCESS", "True").lower() == "true",
+                sample_rate=int(os.getenv("REFERENCE_SAMPLE_RATE", "16000")),
+                max_duration=float(os.getenv("REFERENCE_MAX_DURATION", "30")),
+                silence_threshold_db=float(os.getenv("REFERENCE_SILENCE_DB", "-45")),
+                target_level_db=float(os.getenv("REFERENCE_TARGET_DB", "-20")),
+                block_seconds=float(os.getenv("REFERENCE_BLOCK_SECONDS", "5")),
+                reference_dir=project_path(os.getenv("REFERENCE_DIR", "cache/references")),
+                reference_max_size=int(os.getenv("REFERENCE_MAX_SIZE", str(256 * 1024 * 1024))),
+                quality_gate=os.getenv("REFERENCE_QUALITY_GATE", "True").lower() == "true",
+                min_quality_score=float(os.getenv("REFERENCE_MIN_SCORE", "0.5")),
+                min_duration=float(os.getenv("REFERENCE_MIN_DURATION", "3"))
             ),
             app_name=os.getenv("APP_NAME", "Voice Synthesis Demo"),
             version=os.getenv("APP_VERSION", "1.0.0"),
@@ -192,6 +296,7 @@ class AppConfig:
             security=SecurityConfig(**data['security']),
             logging=LoggingConfig(**data['logging']),
             performance=PerformanceConfig(**data['performance']),
+            audio=AudioProcessingConfig(**data.get('audio', {})),
             app_name=data.get('app_name', 'Voice Synthesis Demo'),
             version=data.get('version', '1.0.0'),
             environment=data.get('environment', 'development'),
@@ -213,6 +318,9 @@ class AppConfig:
         if len(self.web.secret_key) < 16:
             errors.append("Secret key should be at least 16 characters")
         
+        if self.web.sendfile_header not in ("", "X-Accel-Redirect", "X-Sendfile"):
+            errors.append(f"Invalid sendfile header: {self.web.sendfile_header}")
+        
         # Validar Security
         if self.security.max_text_length <= 0:
             errors.append("Max text length must be positive")
@@ -220,10 +328,37 @@ class AppConfig:
         if self.security.max_audio_duration <= 0:
             errors.append("Max audio duration must be positive")
         
+        # Validar Coqui
+        if self.coqui.worker_pool_size <= 0:
+            errors.append("Coqui worker pool size must be positive")
+        
         # Validar Performance
         if self.performance.max_concurrent_requests <= 0:
             errors.append("Max concurrent requests must be positive")
         
+        if self.performance.job_store not in ("memory", "sqlite"):
+            errors.append(f"Invalid job store: {self.performance.job_store}")
+        
+        if self.performance.chunk_max_chars <= 0:
+            errors.append("Chunk max chars must be positive")
+        
+        if self.performance.sampling_interval < 0:
+            errors.append("Sampling interval must not be negative")
+        
+        # Validar preprocesado de referencias
+        if self.audio.sample_rate < 0:
+            errors.append("Reference sample rate must not be negative")
+        
+        if self.audio.max_duration <= 0 or self.audio.block_seconds <= 0:
+            errors.append("Reference max duration and block size must be positive")
+        
+        if not (0 <= self.audio.min_quality_score <= 1):
+            errors.append("Reference min quality score must be between 0 and 1")
+        
+        # Validar Logging
+        if self.logging.metrics_flush_interval <= 0:
+            errors.append("Metrics flush interval must be positive")
+        
         return len(errors) == 0, errors
     
     def is_production(self) -> bool:
@@ -255,13 +390,15 @@ class AppConfig:
             self.web.upload_folder,
             self.logging.log_dir,
             self.coqui.cache_dir,
+            self.performance.cache_dir,
+            self.audio.reference_dir,
             "static/audio",
             "static/css",
             "static/js"
         ]
         
         for directory in directories:
-            Path(directory).mkdir(parents=True, exist_ok=True)
+            Path(project_path(directory)).mkdir(parents=True, exist_ok=True)
 
 
 class ConfigManager:
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Pool de workers persistentes de Coqui TTS.
+
+Mantiene procesos de larga vida dentro del intérprete de venv-coqui
+(ver coqui_worker.py) y les envía trabajos por pipes, de forma que el
+arranque del intérprete y la carga de modelos se paguen una sola vez. Las
+respuestas llegan enmarcadas (cabecera JSON con payload_size y el audio
+crudo a continuación) y el audio queda en memoria en response['audio'].
+Cada mensaje se lee con un plazo total; un worker que no lo cumple se mata
+y se reemplaza.
+"""
+
+import atexit
+import itertools
+import json
+import os
+import queue
+import select
+import subprocess
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from profiling import profile_dir, profile_path
+from tracing import attach_remote, current_request_id, span
+
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_PYTHON = os.path.join(PROJECT_ROOT, 'venv-coqui', 'bin', 'python')
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'coqui_worker.py')
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class CoquiWorkerError(Exception):
+    """Error de comunicación con un worker de Coqui"""
+
+
+class CoquiWorkerProcess:
+    """Un proceso worker y su canal de comunicación"""
+
+    def __init__(self, index: int, python: str = DEFAULT_PYTHON,
+                 script: str = WORKER_SCRIPT, env: Optional[Dict[str, str]] = None):
+        self.index = index
+        self.python = python
+        self.script = script
+        self.env = env
+        self.process: Optional[subprocess.Popen] = None
+        self.jobs_done = 0
+        self.busy = False
+        self.started_at: Optional[float] = None
+        self.preload: Optional[Dict[str, Any]] = None
+        # Bytes leídos de stdout que aún no forman un mensaje completo
+        self._buffer = b''
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid if self.process else None
+
+    def start(self, timeout: float) -> None:
+        """Lanzar el proceso y esperar el mensaje 'ready'"""
+        env = dict(os.environ)
+        env['PYTHONUNBUFFERED'] = '1'
+        if self.env:
+            env.update(self.env)
+
+        self.process = subprocess.Popen(
+            [self.python, self.script],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            cwd=PROJECT_ROOT,
+            env=env,
+        )
+        self.started_at = time.time()
+        self.jobs_done = 0
+        self._buffer = b''
+
+        message = self._read_message(timeout)
+        if message.get('event') != 'ready':
+            self.kill()
+            raise CoquiWorkerError(f"Respuesta inesperada al iniciar worker: {message}")
+        self.preload = message.get('preload')
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def request(self, job: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        """Enviar un trabajo y esperar su respuesta"""
+        if not self.is_alive():
+            raise CoquiWorkerError(f"Worker {self.index} no está activo")
+
+        try:
+            self.process.stdin.write(json.dumps(job).encode('utf-8') + b'\n')
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise CoquiWorkerError(f"No se pudo enviar el trabajo al worker {self.index}: {e}")
+
+        response = self._read_message(timeout)
+        if response.get('id') != job.get('id'):
+            self.kill()
+            raise CoquiWorkerError(f"Respuesta desincronizada del worker {self.index}")
+
+        self.jobs_done += 1
+        return response
+
+    def _read_message(self, timeout: float) -> Dict[str, Any]:
+        """
+        Leer un mensaje del worker (cabecera JSON y payload) con un plazo total:
+        si el worker se queda a medias, se mata en lugar de bloquear el hilo
+        """
+        deadline = time.monotonic() + timeout
+        line = self._read_until(lambda: self._buffer.find(b'\n') + 1, deadline, timeout)
+        header, self._buffer = self._buffer[:line], self._buffer[line:]
+
+        try:
+            message = json.loads(header)
+        except ValueError:
+            self.kill()
+            raise CoquiWorkerError(f"Mensaje inválido del worker {self.index}: {header[:200]!r}")
+
+        size = message.pop('payload_size', 0)
+        if size:
+            self._read_until(lambda: size if len(self._buffer) >= size else 0, deadline, timeout)
+            message['audio'], self._buffer = self._buffer[:size], self._buffer[size:]
+        return message
+
+    def _read_until(self, complete, deadline: float, timeout: float) -> int:
+        """Leer de stdout hasta que complete() devuelva un tamaño o venza el plazo"""
+        fd = self.process.stdout.fileno()
+        while True:
+            end = complete()
+            if end:
+                return end
+            remaining = deadline - time.monotonic()
+            ready, _, _ = select.select([fd], [], [], max(remaining, 0))
+            if not ready:
+                self.kill()
+                raise CoquiWorkerError(f"Timeout esperando al worker {self.index} ({timeout}s)")
+            chunk = os.read(fd, READ_CHUNK_SIZE)
+            if not chunk:
+                self.kill()
+                raise CoquiWorkerError(f"El worker {self.index} terminó inesperadamente")
+            self._buffer += chunk
+
+    def kill(self) -> None:
+        """Matar el proceso sin esperar (worker colgado o desincronizado)"""
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.stop()
+
+    def stop(self, grace: float = 5.0) -> None:
+        """Detener el proceso (primero de forma ordenada)"""
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            try:
+                self.process.stdin.write(b'{"type": "shutdown"}\n')
+                self.process.stdin.flush()
+                self.process.wait(timeout=grace)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+        for stream in (self.process.stdin, self.process.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+
+class CoquiWorkerPool:
+    """Pool de workers Coqui con health checks y respawn automático"""
+
+    def __init__(self, size: int = 2, timeout: float = 120,
+                 health_check_interval: float = 30, python: str = DEFAULT_PYTHON,
+                 script: str = WORKER_SCRIPT, env: Optional[Dict[str, str]] = None,
+                 startup_timeout: float = 300, preload: bool = False):
+        self.size = size
+        self.preload = preload
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.startup_timeout = startup_timeout
+        self.python = python
+        self.script = script
+        self.env = env
+
+        self._workers: List[CoquiWorkerProcess] = [
+            CoquiWorkerProcess(i, python, script, env) for i in range(size)
+        ]
+        self._idle: "queue.Queue[CoquiWorkerProcess]" = queue.Queue()
+        self._job_ids = itertools.count(1)
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._started = False
+        self._ready_workers = set()
+        self.respawns = 0
+        self.failed_jobs = 0
+
+    def start(self) -> None:
+        """Arrancar los workers en segundo plano y el hilo de health checks"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+
+        for worker in self._workers:
+            threading.Thread(target=self._spawn, args=(worker,), daemon=True,
+                             name=f"coqui-spawn-{worker.index}").start()
+
+        if self.health_check_interval > 0:
+            threading.Thread(target=self._health_loop, daemon=True,
+                             name="coqui-health").start()
+
+        atexit.register(self.shutdown)
+
+    def _spawn(self, worker: CoquiWorkerProcess) -> None:
+        """(Re)iniciar un worker y devolverlo al pool cuando esté listo"""
+        while not self._stop_event.is_set():
+            try:
+                worker.stop()
+                worker.start(self.startup_timeout)
+                print(f"✅ Worker Coqui {worker.index} listo (pid={worker.pid})")
+                with self._lock:
+                    self._ready_workers.add(worker.index)
+                self._idle.put(worker)
+                return
+            except (CoquiWorkerError, OSError) as e:
+                print(f"❌ No se pudo iniciar el worker Coqui {worker.index}: {e}")
+                self._stop_event.wait(5)
+
+    def _respawn(self, worker: CoquiWorkerProcess) -> None:
+        with self._lock:
+            self.respawns += 1
+        threading.Thread(target=self._spawn, args=(worker,), daemon=True,
+                         name=f"coqui-respawn-{worker.index}").start()
+
+    def submit(self, job_type: str, timeout: Optional[float] = None, **payload) -> Dict[str, Any]:
+        """
+        Ejecutar un trabajo en el primer worker libre.
+
+        Lanza CoquiWorkerError si no hay workers disponibles a tiempo o si el
+        worker falla; en ese caso el worker se reinicia automáticamente.
+        """
+        if not self._started:
+            self.start()
+
+        timeout = timeout or self.timeout
+        try:
+            with span('worker_wait'):
+                worker = self._idle.get(timeout=self.startup_timeout)
+        except queue.Empty:
+            raise CoquiWorkerError("No hay workers de Coqui disponibles")
+
+        job = {'id': next(self._job_ids), 'type': job_type, **payload}
+        # El worker registra el mismo request ID y devuelve sus spans
+        request_id = current_request_id()
+        if request_id:
+            job.setdefault('request_id', request_id)
+        # Petición perfilada: el worker perfila también su parte
+        directory = profile_dir()
+        if directory:
+            job.setdefault('profile_path', profile_path(
+                directory, f"{request_id or job['id']}.worker-{worker.index}-{job_type}"))
+        worker.busy = True
+        try:
+            with span('engine_call', engine='coqui', job=job_type, worker=worker.index) as call:
+                response = worker.request(job, timeout)
+                attach_remote(response.get('trace'), call)
+        except CoquiWorkerError:
+            with self._lock:
+                self.failed_jobs += 1
+            worker.busy = False
+            self._respawn(worker)
+            raise
+
+        worker.busy = False
+        self._idle.put(worker)
+        return response
+
+    def is_ready(self) -> bool:
+        """Todos los workers arrancaron (y terminaron su precarga) al menos una vez"""
+        with self._lock:
+            return len(self._ready_workers) == self.size
+
+    def health_check(self) -> None:
+        """Hacer ping a los workers libres y reiniciar los que no respondan"""
+        checked = []
+        while True:
+            try:
+                checked.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+        for worker in checked:
+            try:
+                worker.request({'id': 0, 'type': 'ping'}, timeout=10)
+                self._idle.put(worker)
+            except CoquiWorkerError as e:
+                print(f"⚠️ Worker Coqui {worker.index} no responde, reiniciando: {e}")
+                self._respawn(worker)
+
+    def _health_loop(self) -> None:
+        while not self._stop_event.wait(self.health_check_interval):
+            self.health_check()
+
+    def stats(self) -> Dict[str, Any]:
+        """Estado del pool"""
+        with self._lock:
+            respawns, failed_jobs = self.respawns, self.failed_jobs
+        return {
+            'size': self.size,
+            'ready': self.is_ready(),
+            'preload': self.preload,
+            'idle': self._idle.qsize(),
+            'busy': sum(1 for w in self._workers if w.busy),
+            'alive': sum(1 for w in self._workers if w.is_alive()),
+            'respawns': respawns,
+            'failed_jobs': failed_jobs,
+            'workers': [
+                {'index': w.index, 'pid': w.pid, 'alive': w.is_alive(),
+                 'busy': w.busy, 'jobs_done': w.jobs_done, 'preload': w.preload}
+                for w in self._workers
+            ],
+        }
+
+    def shutdown(self) -> None:
+        """Detener todos los workers"""
+        self._stop_event.set()
+        for worker in self._workers:
+            worker.stop()
+
+
+_pool: Optional[CoquiWorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def create_coqui_pool(size: Optional[int] = None,
+                      python: str = DEFAULT_PYTHON) -> CoquiWorkerPool:
+    """Crear (sin arrancar) un pool a partir de la configuración"""
+    from config import get_config
+
+    config = get_config()
+    coqui_config = config.coqui
+    # PRELOAD_MODELS activa la precarga; COQUI_MODELS_PRELOAD la de los modelos Coqui
+    preload = config.performance.preload_models and coqui_config.models_preload
+    models = [coqui_config.default_model, coqui_config.voice_cloning_model] if preload else []
+    return CoquiWorkerPool(
+        size=size or coqui_config.worker_pool_size,
+        timeout=coqui_config.worker_timeout,
+        health_check_interval=coqui_config.health_check_interval,
+        python=python,
+        env={
+            'COQUI_SPEAKER_CACHE_DIR': coqui_config.speaker_cache_dir,
+            'COQUI_SPEAKER_CACHE_ITEMS': str(coqui_config.speaker_cache_items),
+            # Los modelos de Coqui TTS se descargan y cargan desde cache_dir
+            'TTS_HOME': coqui_config.cache_dir,
+            'COQUI_PRELOAD_MODELS': ','.join(models),
+            'COQUI_WARMUP_TEXT': coqui_config.warmup_text,
+            'COQUI_VOICE_CLONING_MODEL': coqui_config.voice_cloning_model,
+            'COQUI_MODEL_CATALOG': coqui_config.model_catalog_path,
+            # Los workers vuelcan sus pilas muestreadas junto a las de la web app
+            'COQUI_PROFILE_DIR': config.performance.profile_dir,
+            'PROFILER_SAMPLING_INTERVAL': str(config.performance.sampling_interval),
+        },
+        startup_timeout=coqui_config.worker_startup_timeout,
+        preload=preload,
+    )
+
+
+def get_coqui_pool() -> Optional[CoquiWorkerPool]:
+    """
+    Obtener el pool global (creado a partir de la configuración).
+    Devuelve None si el entorno virtual de Coqui no existe.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if not os.path.exists(DEFAULT_PYTHON):
+                return None
+
+            _pool = create_coqui_pool()
+            _pool.start()
+        return _pool
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Worker persistente de Coqui TTS.
+
+Se ejecuta con el intérprete de venv-coqui y atiende trabajos que llegan por
+stdin (una línea JSON por trabajo). Cada respuesta es un mensaje enmarcado
+por stdout: una línea JSON con payload_size seguida de ese número de bytes
+crudos (el audio generado, sin pasar por disco). Los modelos se cargan una
+sola vez y se reutilizan durante toda la vida del proceso, evitando el
+arranque en frío por cada request.
+"""
+
+import json
+import os
+import sys
+import time
+import traceback
+from contextlib import nullcontext
+
+# Permitir importar los módulos hermanos (tts_coqui, voice_cloning_coqui)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from profiling import get_sampling_profiler, profiled
+from tracing import trace
+
+
+def open_protocol_channel():
+    """
+    Reserva el stdout original para el protocolo y redirige el resto de la
+    salida (prints de los motores, librerías nativas) a stderr
+    """
+    channel = os.fdopen(os.dup(sys.stdout.fileno()), "wb", buffering=0)
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+    return channel
+
+
+class CoquiWorker:
+    """Atiende trabajos de síntesis reutilizando el estado cargado"""
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.started_at = time.time()
+        self.jobs_done = 0
+        self.extra = {}
+        self.handlers = {
+            'ping': self.handle_ping,
+            'engine_info': self.handle_engine_info,
+            'tts': self.handle_tts,
+            'clone': self.handle_clone,
+            'register_speaker': self.handle_register_speaker,
+        }
+
+    def send(self, message, payload=b""):
+        """Enviar un mensaje al proceso padre (cabecera JSON y payload binario)"""
+        header = dict(message, payload_size=len(payload))
+        self.channel.write(json.dumps(header).encode("utf-8") + b"\n" + payload)
+
+    def handle_ping(self, job):
+        return True, "pong", None
+
+    def handle_engine_info(self, job):
+        from tts_coqui import get_local_engine
+
+        return True, get_local_engine().info(), None
+
+    def handle_tts(self, job):
+        from tts_coqui import tts_coqui_render
+
+        audio, backend = tts_coqui_render(job['text'], job.get('model', 'fallback'))
+        # El motor viaja en la respuesta: el silencio de reserva no se cachea
+        self.extra['backend'] = backend
+        return bool(audio), "TTS generado" if audio else "No se pudo generar el audio", audio
+
+    def handle_clone(self, job):
+        from voice_cloning_coqui import voice_cloning_coqui_audio
+
+        audio = voice_cloning_coqui_audio(job.get('audio_path'), job['text'], job.get('speaker_id'))
+        return audio is not None, "Voz clonada" if audio is not None else "La clonación falló", audio
+
+    def handle_register_speaker(self, job):
+        from voice_cloning_coqui import register_speaker
+
+        # Sin modelo explícito, el mismo que elige la clonación
+        return True, register_speaker(job['audio_path'], job.get('model')), None
+
+    def process(self, job):
+        """Ejecutar un trabajo; devuelve (respuesta, audio)"""
+        start_time = time.monotonic()
+        handler = self.handlers.get(job.get('type'))
+        request_id = job.get('request_id')
+
+        # Los spans del trabajo vuelven al proceso padre con la respuesta;
+        # con profile_path, el trabajo se perfila con cProfile
+        profiling = profiled(job['profile_path']) if job.get('profile_path') else nullcontext()
+        audio = None
+        # Campos adicionales de la respuesta que pueden fijar los handlers
+        self.extra = {}
+        with profiling, trace(f"worker:{job.get('type')}", request_id, emit=False) as root:
+            if handler is None:
+                ok, message = False, f"Tipo de trabajo desconocido: {job.get('type')}"
+            else:
+                try:
+                    ok, message, audio = handler(job)
+                except Exception as e:
+                    print(f"❌ Trabajo {job.get('id')} (request_id={request_id}) falló", file=sys.stderr)
+                    traceback.print_exc()
+                    ok, message = False, f"Error inesperado: {str(e)}"
+
+        # Compatibilidad: con output_path el audio se escribe en disco y no se envía
+        if ok and audio and job.get('output_path'):
+            with open(job['output_path'], 'wb') as f:
+                f.write(audio)
+            audio = None
+
+        self.jobs_done += 1
+        response = {
+            'id': job.get('id'),
+            'ok': bool(ok),
+            'message': message,
+            'duration': time.monotonic() - start_time,
+            'pid': os.getpid(),
+            'jobs_done': self.jobs_done,
+            'uptime': time.time() - self.started_at,
+            **self.extra,
+        }
+        if request_id:
+            response['request_id'] = request_id
+            response['trace'] = root.to_dict()
+        return response, audio or b""
+
+    def serve(self, stdin, preload_report=None):
+        """Bucle principal: un trabajo por línea hasta EOF o 'shutdown'"""
+        self.send({'event': 'ready', 'pid': os.getpid(), 'preload': preload_report})
+
+        for raw_line in stdin:
+            if not raw_line.strip():
+                continue
+            try:
+                job = json.loads(raw_line)
+            except ValueError as e:
+                self.send({'id': None, 'ok': False, 'message': f"JSON inválido: {e}"})
+                continue
+
+            if job.get('type') == 'shutdown':
+                break
+            self.send(*self.process(job))
+
+
+def preload(models, warmup_text):
+    """
+    Cargar los modelos indicados y calentarlos (junto con los motores
+    locales) antes de aceptar trabajos. Devuelve los tiempos por modelo.
+    """
+    start_time = time.monotonic()
+    report = {'models': [], 'local_engine': None}
+
+    for model_name in models:
+        entry = {'name': model_name}
+        try:
+            from voice_cloning_coqui import load_tts_model, warmup_tts_model
+
+            load_start = time.monotonic()
+            tts = load_tts_model(model_name)
+            entry['load_time'] = time.monotonic() - load_start
+            if warmup_text:
+                warmup_start = time.monotonic()
+                warmup_tts_model(tts, warmup_text)
+                entry['warmup_time'] = time.monotonic() - warmup_start
+            print(f"📦 Modelo {model_name} listo: carga {entry['load_time']:.2f}s"
+                  + (f", calentamiento {entry['warmup_time']:.2f}s" if 'warmup_time' in entry else ""))
+        except Exception as e:
+            entry['error'] = str(e)
+            print(f"⚠️ No se pudo precargar {model_name}: {e}")
+        report['models'].append(entry)
+
+    from tts_coqui import get_local_engine
+    engine = get_local_engine()
+    engine.initialize()
+    if warmup_text:
+        warmup_start = time.monotonic()
+        engine.render(warmup_text)
+        report['local_engine'] = {'warmup_time': time.monotonic() - warmup_start}
+
+    report['total_time'] = time.monotonic() - start_time
+    return report
+
+
+def main():
+    channel = open_protocol_channel()
+    worker = CoquiWorker(channel)
+    print(f"🚀 Worker Coqui iniciado (pid={os.getpid()})", file=sys.stderr)
+    # Muestreo de pilas siempre activo, agregado por /admin/profile/stacks
+    get_sampling_profiler(directory=os.getenv('COQUI_PROFILE_DIR') or None, label='coqui-worker')
+
+    # Precargar y calentar antes de anunciarse como listo
+    models = [name for name in os.getenv('COQUI_PRELOAD_MODELS', '').split(',') if name]
+    if models:
+        report = preload(models, os.getenv('COQUI_WARMUP_TEXT', ''))
+    else:
+        from tts_coqui import get_local_engine
+        get_local_engine().initialize()
+        report = None
+
+    worker.serve(sys.stdin.buffer, report)
+
+
+if __name__ == "__main__":
+    main()
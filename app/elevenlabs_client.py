@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Cliente HTTP compartido para la API de ElevenLabs.
+
+Reutiliza conexiones keep-alive con un pool dimensionado según la
+concurrencia de la aplicación, aplica timeouts de conexión y lectura desde
+la configuración y reintenta con backoff exponencial (con jitter) ante
+respuestas 429/5xx, respetando la cabecera Retry-After. Las peticiones que
+crean recursos (voices/add) sólo se reintentan si no llegaron a procesarse.
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from tracing import REQUEST_ID_HEADER, current_request_id, span
+
+
+API_BASE_URL = "https://api.elevenlabs.io"
+
+
+class ElevenLabsClient:
+    """Cliente con sesión persistente y reintentos para ElevenLabs"""
+
+    RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+    def __init__(self, api_key: str, base_url: str = API_BASE_URL, timeout: float = 30,
+                 connect_timeout: float = 5, max_retries: int = 3, pool_size: int = 10,
+                 backoff_base: float = 0.5, backoff_max: float = 30,
+                 default_voice_id: str = "EXAVITQu4vr4xnSDxMaL",
+                 model_id: str = "eleven_multilingual_v2",
+                 output_format: str = "mp3_44100_128"):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.default_voice_id = default_voice_id
+        self.model_id = model_id
+        self.output_format = output_format
+        self.retries = 0
+
+        self.session = requests.Session()
+        self.session.headers.update({"xi-api-key": api_key or ""})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _backoff(self, attempt: int) -> float:
+        """Backoff exponencial con jitter (mitad fija, mitad aleatoria)"""
+        cap = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return cap / 2 + random.uniform(0, cap / 2)
+
+    def _retry_after(self, response: requests.Response) -> Optional[float]:
+        """Interpretar Retry-After (segundos o fecha HTTP)"""
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _not_sent(error: Exception) -> bool:
+        """La petición no llegó al servidor (fallo al conectar)"""
+        if isinstance(error, requests.ConnectTimeout):
+            return True
+        reason = error.args[0] if error.args else None
+        return isinstance(getattr(reason, "reason", reason), NewConnectionError)
+
+    def request(self, method: str, path: str, retry_unsafe: bool = True, **kwargs) -> requests.Response:
+        """
+        Ejecutar una petición con reintentos. Devuelve la última respuesta
+        (el llamador revisa status_code) o lanza la excepción de red final.
+        Con retry_unsafe=False (POST que crean recursos) sólo se reintenta si
+        la petición no llegó a procesarse: fallo al conectar o 429; un timeout
+        de lectura o un 5xx pueden haber creado ya el recurso.
+        """
+        url = f"{self.base_url}{path}"
+        kwargs.setdefault("timeout", self.timeout)
+        # Correlación con la petición web que originó la llamada
+        request_id = current_request_id()
+        if request_id:
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), REQUEST_ID_HEADER: request_id}
+
+        with span('engine_call', engine='elevenlabs', method=method, path=path) as call:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = self.session.request(method, url, **kwargs)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    if attempt >= self.max_retries or not (retry_unsafe or self._not_sent(e)):
+                        raise
+                    self.retries += 1
+                    time.sleep(self._backoff(attempt))
+                    continue
+
+                retryable = response.status_code in self.RETRY_STATUS_CODES
+                if not retry_unsafe:
+                    retryable = response.status_code == 429
+                if retryable and attempt < self.max_retries:
+                    delay = self._retry_after(response)
+                    if delay is None:
+                        delay = self._backoff(attempt)
+                    response.close()
+                    self.retries += 1
+                    time.sleep(min(delay, self.backoff_max))
+                    continue
+
+                if call is not None:
+                    call.attrs.update(status=response.status_code, attempts=attempt + 1)
+                return response
+
+    def text_to_speech(self, text: str, voice_id: Optional[str] = None,
+                       model_id: Optional[str] = None, output_format: Optional[str] = None,
+                       voice_settings: Optional[Dict[str, Any]] = None,
+                       stream: bool = False) -> requests.Response:
+        """POST /v1/text-to-speech/{voice_id}[/stream]"""
+        path = f"/v1/text-to-speech/{voice_id or self.default_voice_id}"
+        if stream:
+            path += "/stream"
+        data: Dict[str, Any] = {
+            "text": text,
+            "model_id": model_id or self.model_id,
+        }
+        if voice_settings:
+            data["voice_settings"] = voice_settings
+        # La API sólo lee output_format de la query string (en el cuerpo se ignora)
+        params = {"output_format": output_format or self.output_format}
+        return self.request("POST", path, json=data, params=params, stream=stream)
+
+    def add_voice(self, name: str, audio_path: str) -> requests.Response:
+        """POST /v1/voices/add (clonación instantánea)"""
+        # Se lee en memoria para poder reenviar el archivo en cada reintento
+        with open(audio_path, "rb") as f:
+            audio_bytes = f.read()
+        # Un reintento tras un timeout de lectura o un 5xx podría duplicar la voz
+        return self.request(
+            "POST", "/v1/voices/add", retry_unsafe=False,
+            data={"name": name},
+            files={"files": (audio_path.rsplit("/", 1)[-1], audio_bytes)},
+        )
+
+    def delete_voice(self, voice_id: str) -> requests.Response:
+        """DELETE /v1/voices/{voice_id}"""
+        return self.request("DELETE", f"/v1/voices/{voice_id}")
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_client: Optional[ElevenLabsClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> ElevenLabsClient:
+    """Cliente global compartido por la web app y los CLIs"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            from config import get_config
+
+            config = get_config()
+            elevenlabs = config.elevenlabs
+            _client = ElevenLabsClient(
+                api_key=elevenlabs.api_key,
+                base_url=elevenlabs.base_url,
+                timeout=elevenlabs.timeout,
+                connect_timeout=elevenlabs.connect_timeout,
+                max_retries=elevenlabs.max_retries,
+                pool_size=config.performance.max_concurrent_requests,
+                default_voice_id=elevenlabs.default_voice_id,
+                model_id=elevenlabs.model_id,
+                output_format=elevenlabs.output_format,
+            )
+        return _client
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Servidor local que simula la API de ElevenLabs.
+
+Implementa POST /v1/text-to-speech/{voice_id} (y /stream), POST
+/v1/voices/add, GET /v1/voices y DELETE /v1/voices/{voice_id}, con
+latencias aleatorias configurables, una tasa de errores 5xx y
+limitación por concurrencia con respuestas 429 y Retry-After. Devuelve
+audio de silencio con una duración proporcional al texto (MP3 válido o
+PCM según el parámetro output_format de la query string, que es el único
+que lee la API real), para probar la web app, los reintentos y el
+cache sin consumir créditos.
+
+Uso:
+    python app/elevenlabs_mock.py --port 8787 --latency lognormal:400:0.5 --error-rate 0.02
+    ELEVENLABS_BASE_URL=http://127.0.0.1:8787 python app/webapp_working.py
+"""
+
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Set
+from urllib.parse import parse_qs, urlsplit
+
+
+# Trama MP3 silenciosa: MPEG-1 Layer III, 128 kbps, 44.1 kHz, mono (417 bytes, 1152 muestras)
+MP3_SILENT_FRAME = b"\xff\xfb\x90\xc0" + b"\0" * 413
+MP3_FRAME_SECONDS = 1152 / 44100
+# Duración simulada del audio por carácter de texto
+SECONDS_PER_CHAR = 0.06
+STREAM_CHUNK_SIZE = 4096
+
+
+def parse_latency(spec: str):
+    """
+    Distribución de latencia en milisegundos:
+    fixed:200 | uniform:100:400 | normal:300:50 | lognormal:mediana:sigma
+    Devuelve una función sin argumentos que da segundos.
+    """
+    kind, *params = spec.split(":")
+    try:
+        values = [float(value) for value in params]
+        if kind == "fixed":
+            (value,) = values
+            return lambda: value / 1000.0
+        if kind == "uniform":
+            low, high = values
+            return lambda: random.uniform(low, high) / 1000.0
+        if kind == "normal":
+            mean, stddev = values
+            return lambda: max(0.0, random.gauss(mean, stddev)) / 1000.0
+        if kind == "lognormal":
+            median, sigma = values
+            return lambda: random.lognormvariate(math.log(median), sigma) / 1000.0
+    except ValueError:
+        pass
+    raise ValueError(f"Distribución de latencia inválida: {spec}")
+
+
+@dataclass
+class MockConfig:
+    """Comportamiento del servidor simulado"""
+    latency: str = "lognormal:300:0.4"
+    latency_per_char_ms: float = 1.0
+    error_rate: float = 0.0
+    max_concurrency: int = 0  # 0 = sin límite
+    throttle_rate: float = 0.0  # probabilidad de 429 aunque haya capacidad
+    retry_after: float = 1.0
+    preset_voices: Set[str] = field(default_factory=lambda: {"EXAVITQu4vr4xnSDxMaL"})
+
+
+class MockState:
+    """Voces y contadores compartidos entre hilos"""
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.sample_latency = parse_latency(config.latency)
+        self.voices: Dict[str, str] = {voice_id: "preset" for voice_id in config.preset_voices}
+        self.deleted: Set[str] = set()
+        self.active = 0
+        self.counters = {'requests': 0, 'throttled': 0, 'errors': 0, 'tts': 0, 'voices_added': 0}
+        self._lock = threading.Lock()
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def acquire(self) -> bool:
+        """Reservar un hueco de concurrencia (False si hay que responder 429)"""
+        with self._lock:
+            self.counters['requests'] += 1
+            over_limit = self.config.max_concurrency and self.active >= self.config.max_concurrency
+            if over_limit or random.random() < self.config.throttle_rate:
+                self.counters['throttled'] += 1
+                return False
+            self.active += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.counters, 'active': self.active, 'voices': len(self.voices)}
+
+
+def make_audio(text: str, output_format: str) -> bytes:
+    """Silencio con la duración simulada del texto"""
+    seconds = max(0.2, len(text) * SECONDS_PER_CHAR)
+    if output_format.startswith("pcm_"):
+        sample_rate = int(output_format.split("_")[1])
+        return b"\0\0" * int(seconds * sample_rate)
+    return MP3_SILENT_FRAME * max(1, int(seconds / MP3_FRAME_SECONDS))
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Rutas de la API simulada"""
+
+    protocol_version = "HTTP/1.1"
+    state: MockState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, code: str, message: str, headers: Optional[Dict[str, str]] = None) -> None:
+        self._send_json(status, {"detail": {"status": code, "message": message}}, headers)
+
+    def _guarded(self, handler, *args) -> None:
+        """Aplicar throttling, latencia y errores simulados alrededor de un handler"""
+        state = self.state
+        body = self._read_body()
+        if not state.acquire():
+            self._send_error(429, "too_many_concurrent_requests", "Demasiadas peticiones simultáneas",
+                             {"Retry-After": f"{state.config.retry_after:g}"})
+            return
+        try:
+            if random.random() < state.config.error_rate:
+                time.sleep(state.sample_latency())
+                state.count('errors')
+                self._send_error(500, "internal_error", "Error simulado")
+                return
+            handler(body, *args)
+        finally:
+            state.release()
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/v1/voices":
+            voices = [{"voice_id": voice_id, "name": name} for voice_id, name in self.state.voices.items()]
+            self._send_json(200, {"voices": voices})
+        elif self.path == "/mock/stats":
+            self._send_json(200, self.state.stats())
+        else:
+            self._send_error(404, "not_found", "Ruta no encontrada")
+
+    def do_POST(self):
+        match = re.fullmatch(r"/v1/text-to-speech/([^/?]+)(/stream)?(\?.*)?", self.path)
+        if match:
+            self._guarded(self._text_to_speech, match.group(1), bool(match.group(2)))
+        elif self.path.rstrip("/") == "/v1/voices/add":
+            self._guarded(self._add_voice)
+        else:
+            self._read_body()
+            self._send_error(404, "not_found", "Ruta no encontrada")
+
+    def do_DELETE(self):
+        match = re.fullmatch(r"/v1/voices/([^/?]+)", self.path)
+        if not match:
+            self._send_error(404, "not_found", "Ruta no encontrada")
+            return
+        self._guarded(self._delete_voice, match.group(1))
+
+    def _text_to_speech(self, body: bytes, voice_id: str, stream: bool) -> None:
+        state = self.state
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            self._send_error(400, "invalid_json", "JSON inválido")
+            return
+        text = payload.get("text") or ""
+        if not text:
+            self._send_error(400, "invalid_text", "Texto requerido")
+            return
+        if voice_id in state.deleted:
+            self._send_error(404, "voice_not_found", f"Voz {voice_id} no encontrada")
+            return
+
+        state.count('tts')
+        latency = state.sample_latency() + len(text) * state.config.latency_per_char_ms / 1000.0
+        # Como la API real: output_format sólo en la query string, el cuerpo se ignora
+        query = parse_qs(urlsplit(self.path).query)
+        output_format = (query.get("output_format") or ["mp3_44100_128"])[0]
+        if not re.fullmatch(r"mp3_\d+_\d+|pcm_\d+", output_format):
+            self._send_error(400, "invalid_output_format", f"Formato de salida no soportado: {output_format}")
+            return
+        audio = make_audio(text, output_format)
+        content_type = "audio/mpeg" if output_format.startswith("mp3") else "application/octet-stream"
+
+        if not stream:
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(audio)))
+            self.end_headers()
+            self.wfile.write(audio)
+            return
+
+        # Streaming: primer chunk tras ~30% de la latencia, el resto repartido
+        chunks = [audio[i:i + STREAM_CHUNK_SIZE] for i in range(0, len(audio), STREAM_CHUNK_SIZE)]
+        time.sleep(latency * 0.3)
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        delay = latency * 0.7 / max(1, len(chunks))
+        for index, chunk in enumerate(chunks):
+            if index:
+                time.sleep(delay)
+            self.wfile.write(f"{len(chunk):x}\r\n".encode("ascii") + chunk + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _add_voice(self, body: bytes) -> None:
+        if b'name="files"' not in body:
+            self._send_error(400, "missing_files", "Se requiere al menos un archivo de audio")
+            return
+        match = re.search(rb'name="name"\r\n\r\n(.*?)\r\n', body, re.S)
+        name = match.group(1).decode("utf-8", "replace") if match else "voz"
+        time.sleep(self.state.sample_latency())
+        voice_id = uuid.uuid4().hex[:20]
+        self.state.voices[voice_id] = name
+        self.state.count('voices_added')
+        self._send_json(200, {"voice_id": voice_id, "requires_verification": False})
+
+    def _delete_voice(self, body: bytes, voice_id: str) -> None:
+        if self.state.voices.pop(voice_id, None) is None:
+            self._send_error(404, "voice_not_found", f"Voz {voice_id} no encontrada")
+            return
+        self.state.deleted.add(voice_id)
+        self._send_json(200, {"status": "ok"})
+
+
+class MockElevenLabsServer:
+    """Servidor simulado arrancable en segundo plano (tests, benchmarks)"""
+
+    def __init__(self, config: Optional[MockConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.state = MockState(config or MockConfig())
+        handler = type("BoundMockHandler", (MockHandler,), {"state": self.state})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True,
+                                        name="elevenlabs-mock")
+        self._thread.start()
+        return self.base_url
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def stats(self) -> Dict[str, Any]:
+        return self.state.stats()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Servidor simulado de la API de ElevenLabs")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8787)
+    parser.add_argument('--latency', default='lognormal:300:0.4',
+                        help='fixed:MS | uniform:MIN:MAX | normal:MEDIA:DESV | lognormal:MEDIANA:SIGMA')
+    parser.add_argument('--latency-per-char', type=float, default=1.0, help='Latencia extra por carácter (ms)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Probabilidad de responder 500')
+    parser.add_argument('--max-concurrency', type=int, default=0, help='Peticiones simultáneas antes de 429 (0 = sin límite)')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Probabilidad de responder 429')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Valor de Retry-After en los 429 (s)')
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency=args.latency,
+        latency_per_char_ms=args.latency_per_char,
+        error_rate=args.error_rate,
+        max_concurrency=args.max_concurrency,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+    )
+    server = MockElevenLabsServer(config, args.host, args.port)
+    print(f"🧪 ElevenLabs simulado en {server.base_url} (estadísticas en /mock/stats)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n📊 {json.dumps(server.stats())}")
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Backend de espeak sin fork/exec por petición.
+
+Usa libespeak-ng (o libespeak) mediante ctypes y devuelve PCM de 16 bits
+en memoria. Como la librería tiene estado global, cada proceso tiene una
+sola instancia; para sintetizar en paralelo EspeakPool mantiene varios
+procesos servidor de larga vida que se comunican por pipes con mensajes
+enmarcados (cabecera JSON con payload_size seguida del PCM crudo). Todas
+las síntesis pasan por el pool compartido (get_espeak_pool).
+
+Si la librería no está instalada se recurre al ejecutable espeak/espeak-ng
+con --stdout, sin archivos temporales. El ejecutable no delimita las
+frases en un proceso persistente, así que en ese caso sigue habiendo un
+proceso por llamada; el pool sólo limita cuántos corren a la vez.
+
+Sólo depende de la biblioteca estándar (se usa también en venv-coqui).
+"""
+
+import atexit
+import ctypes
+import ctypes.util
+import io
+import itertools
+import json
+import os
+import queue
+import select
+import shutil
+import subprocess
+import sys
+import threading
+import wave
+from typing import Dict, List, Optional, Tuple
+
+
+# Constantes de speak_lib.h
+AUDIO_OUTPUT_SYNCHRONOUS = 2
+ESPEAK_INITIALIZE_DONT_EXIT = 0x8000
+ESPEAK_RATE = 1
+ESPEAK_PITCH = 3
+POS_CHARACTER = 1
+ESPEAK_CHARS_UTF8 = 1
+EE_OK = 0
+
+SYNTH_CALLBACK = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.POINTER(ctypes.c_short),
+                                  ctypes.c_int, ctypes.c_void_p)
+
+
+class EspeakError(Exception):
+    """Error de síntesis con espeak"""
+
+
+def find_library() -> Optional[str]:
+    """Ruta de libespeak-ng o libespeak (ESPEAK_LIBRARY tiene prioridad)"""
+    return (os.getenv("ESPEAK_LIBRARY")
+            or ctypes.util.find_library("espeak-ng")
+            or ctypes.util.find_library("espeak"))
+
+
+def find_executable() -> Optional[str]:
+    return shutil.which("espeak-ng") or shutil.which("espeak")
+
+
+class LibEspeak:
+    """Binding en proceso a libespeak-ng con salida síncrona a memoria"""
+
+    def __init__(self, voice: str = "es", rate: int = 150, pitch: int = 50,
+                 library: Optional[str] = None):
+        path = library or find_library()
+        if not path:
+            raise EspeakError("libespeak-ng no encontrada")
+
+        lib = ctypes.CDLL(path)
+        lib.espeak_Initialize.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_char_p, ctypes.c_int]
+        lib.espeak_Initialize.restype = ctypes.c_int
+        lib.espeak_SetSynthCallback.argtypes = [SYNTH_CALLBACK]
+        lib.espeak_SetSynthCallback.restype = None
+        lib.espeak_SetVoiceByName.argtypes = [ctypes.c_char_p]
+        lib.espeak_SetVoiceByName.restype = ctypes.c_int
+        lib.espeak_SetParameter.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int]
+        lib.espeak_SetParameter.restype = ctypes.c_int
+        lib.espeak_Synth.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_uint, ctypes.c_int,
+                                     ctypes.c_uint, ctypes.c_uint, ctypes.c_void_p, ctypes.c_void_p]
+        lib.espeak_Synth.restype = ctypes.c_int
+        lib.espeak_Synchronize.argtypes = []
+        lib.espeak_Synchronize.restype = ctypes.c_int
+
+        sample_rate = lib.espeak_Initialize(AUDIO_OUTPUT_SYNCHRONOUS, 0, None, ESPEAK_INITIALIZE_DONT_EXIT)
+        if sample_rate <= 0:
+            raise EspeakError(f"No se pudo inicializar {path}")
+
+        self._lib = lib
+        self.library = path
+        self.sample_rate = sample_rate
+        self.voice = None
+        self._params: Tuple[int, int] = (0, 0)
+        self._chunks: List[bytes] = []
+        self._lock = threading.Lock()
+        # Mantener la referencia: si el callback se libera, la librería salta a memoria inválida
+        self._callback = SYNTH_CALLBACK(self._on_audio)
+        lib.espeak_SetSynthCallback(self._callback)
+        self.configure(voice, rate, pitch)
+
+    def _on_audio(self, wav, num_samples, events) -> int:
+        if wav and num_samples > 0:
+            self._chunks.append(ctypes.string_at(wav, num_samples * 2))
+        return 0
+
+    def configure(self, voice: str, rate: int, pitch: int) -> None:
+        """Cambiar voz y parámetros (sólo si difieren de los actuales)"""
+        if voice != self.voice:
+            if self._lib.espeak_SetVoiceByName(voice.encode("utf-8")) != EE_OK:
+                raise EspeakError(f"Voz de espeak no disponible: {voice}")
+            self.voice = voice
+        if (rate, pitch) != self._params:
+            self._lib.espeak_SetParameter(ESPEAK_RATE, rate, 0)
+            self._lib.espeak_SetParameter(ESPEAK_PITCH, pitch, 0)
+            self._params = (rate, pitch)
+
+    def synthesize(self, text: str, voice: Optional[str] = None,
+                   rate: Optional[int] = None, pitch: Optional[int] = None) -> bytes:
+        """Sintetizar texto y devolver PCM 16 bits mono a self.sample_rate"""
+        data = text.encode("utf-8") + b"\0"
+        with self._lock:
+            if voice is not None or rate is not None or pitch is not None:
+                self.configure(voice or self.voice, rate or self._params[0], pitch or self._params[1])
+            self._chunks = []
+            error = self._lib.espeak_Synth(data, len(data), 0, POS_CHARACTER, 0,
+                                           ESPEAK_CHARS_UTF8, None, None)
+            if error != EE_OK:
+                raise EspeakError(f"espeak_Synth devolvió {error}")
+            self._lib.espeak_Synchronize()
+            pcm, self._chunks = b"".join(self._chunks), []
+        return pcm
+
+
+def parse_wav_bytes(data: bytes) -> Tuple[bytes, int]:
+    """Extraer (PCM, sample_rate) de un WAV; tolera tamaños sin rellenar (--stdout)"""
+    if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise EspeakError("Salida de espeak no es WAV")
+    sample_rate = 22050
+    position = 12
+    while position + 8 <= len(data):
+        chunk_id = data[position:position + 4]
+        chunk_size = int.from_bytes(data[position + 4:position + 8], "little")
+        if chunk_id == b"fmt ":
+            sample_rate = int.from_bytes(data[position + 12:position + 16], "little")
+        elif chunk_id == b"data":
+            return data[position + 8:], sample_rate
+        position += 8 + chunk_size + (chunk_size & 1)
+    raise EspeakError("WAV de espeak sin datos")
+
+
+def synthesize_cli(text: str, voice: str = "es", rate: int = 150, pitch: int = 50,
+                   executable: Optional[str] = None) -> Tuple[bytes, int]:
+    """Síntesis con el ejecutable (un proceso por llamada, sin archivos)"""
+    executable = executable or find_executable()
+    if not executable:
+        raise EspeakError("espeak no está instalado")
+    try:
+        result = subprocess.run(
+            [executable, "-v", voice, "-s", str(rate), "-p", str(pitch), "--stdout"],
+            input=text.encode("utf-8"), capture_output=True, check=True,
+        )
+    except (subprocess.CalledProcessError, OSError) as e:
+        raise EspeakError(f"Error ejecutando espeak: {e}")
+    return parse_wav_bytes(result.stdout)
+
+
+def synthesize(text: str, voice: str = "es", rate: int = 150, pitch: int = 50) -> Tuple[bytes, int]:
+    """PCM en memoria a través del pool compartido para esa voz"""
+    return get_espeak_pool(voice, rate, pitch).synthesize(text)
+
+
+def encode_wav(pcm: bytes, sample_rate: int) -> bytes:
+    """PCM 16 bits mono -> WAV en memoria"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def write_wav(path: str, pcm: bytes, sample_rate: int) -> None:
+    """Guardar PCM 16 bits mono como WAV"""
+    with open(path, "wb") as f:
+        f.write(encode_wav(pcm, sample_rate))
+
+
+def is_available() -> bool:
+    return find_library() is not None or find_executable() is not None
+
+
+class EspeakServerProcess:
+    """Proceso servidor de larga vida con su propia instancia de libespeak"""
+
+    def __init__(self, index: int, voice: str, rate: int, pitch: int):
+        self.index = index
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--serve",
+             "--voice", voice, "--rate", str(rate), "--pitch", str(pitch)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        )
+        self.sample_rate = self._read_header(30)["sample_rate"]
+
+    def _read_header(self, timeout: float) -> Dict:
+        ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+        line = self.process.stdout.readline() if ready else b""
+        if not line:
+            self.stop()
+            raise EspeakError(f"El servidor espeak {self.index} no responde")
+        header = json.loads(line)
+        if not header.get("ok"):
+            # El pool lo sustituye: no dejar el proceso vivo
+            self.stop()
+            raise EspeakError(header.get("error") or "Error en el servidor espeak")
+        return header
+
+    def request(self, text: str, timeout: float) -> bytes:
+        try:
+            self.process.stdin.write(json.dumps({"text": text}).encode("utf-8") + b"\n")
+            self.process.stdin.flush()
+        except OSError as e:
+            raise EspeakError(f"Servidor espeak {self.index} caído: {e}")
+        header = self._read_header(timeout)
+        payload = self.process.stdout.read(header["payload_size"])
+        if len(payload) != header["payload_size"]:
+            self.stop()
+            raise EspeakError(f"Respuesta incompleta del servidor espeak {self.index}")
+        return payload
+
+    def stop(self) -> None:
+        if self.process.poll() is None:
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=2)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+
+
+class EspeakPool:
+    """
+    Pool pequeño para sintetizar en paralelo. Con libespeak usa procesos
+    servidor persistentes; sin ella, limita la concurrencia del ejecutable.
+    """
+
+    def __init__(self, size: int = 2, voice: str = "es", rate: int = 150, pitch: int = 50,
+                 timeout: float = 30):
+        self.size = size
+        self.voice = voice
+        self.rate = rate
+        self.pitch = pitch
+        self.timeout = timeout
+        self.use_library = find_library() is not None
+        self._servers: List[EspeakServerProcess] = []
+        self._idle: "queue.Queue[EspeakServerProcess]" = queue.Queue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._counter = itertools.count(size)
+        if self.use_library:
+            try:
+                for index in range(size):
+                    server = EspeakServerProcess(index, voice, rate, pitch)
+                    self._servers.append(server)
+                    self._idle.put(server)
+            except (EspeakError, OSError, ValueError) as e:
+                print(f"⚠️ Servidores espeak no disponibles ({e}), usando el ejecutable", file=sys.stderr)
+                self.shutdown()
+                self._servers = []
+                self.use_library = False
+
+    def synthesize(self, text: str) -> Tuple[bytes, int]:
+        """Devolver (PCM, sample_rate) usando el primer servidor libre"""
+        if not self.use_library:
+            with self._slots:
+                return synthesize_cli(text, self.voice, self.rate, self.pitch)
+
+        try:
+            server = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise EspeakError("No hay servidores espeak libres")
+        try:
+            pcm = server.request(text, self.timeout)
+        except EspeakError:
+            # Sustituir el servidor averiado y propagar el error
+            server.stop()
+            self._servers.remove(server)
+            try:
+                replacement = EspeakServerProcess(next(self._counter), self.voice, self.rate, self.pitch)
+            except (EspeakError, OSError, ValueError) as e:
+                print(f"⚠️ No se pudo reiniciar un servidor espeak: {e}", file=sys.stderr)
+            else:
+                self._servers.append(replacement)
+                self._idle.put(replacement)
+            raise
+        self._idle.put(server)
+        return pcm, server.sample_rate
+
+    def shutdown(self) -> None:
+        for server in list(self._servers):
+            server.stop()
+
+
+_pools: Dict[Tuple[str, int, int], EspeakPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_espeak_pool(voice: str = "es", rate: int = 150, pitch: int = 50) -> EspeakPool:
+    """
+    Pool compartido por el proceso para una voz y parámetros (ESPEAK_POOL_SIZE
+    servidores). Se configura por entorno porque se usa dentro de venv-coqui.
+    """
+    key = (voice, rate, pitch)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = EspeakPool(int(os.getenv("ESPEAK_POOL_SIZE", "2")), voice, rate, pitch)
+            _pools[key] = pool
+            atexit.register(pool.shutdown)
+        return pool
+
+
+def serve(voice: str, rate: int, pitch: int) -> None:
+    """Bucle del proceso servidor: una petición JSON por línea en stdin"""
+    out = sys.stdout.buffer
+    try:
+        lib = LibEspeak(voice, rate, pitch)
+    except (EspeakError, OSError) as e:
+        out.write(json.dumps({"ok": False, "error": str(e)}).encode("utf-8") + b"\n")
+        out.flush()
+        return
+    out.write(json.dumps({"ok": True, "sample_rate": lib.sample_rate}).encode("utf-8") + b"\n")
+    out.flush()
+
+    for line in sys.stdin.buffer:
+        if not line.strip():
+            continue
+        try:
+            pcm = lib.synthesize(json.loads(line)["text"])
+            header = {"ok": True, "sample_rate": lib.sample_rate, "payload_size": len(pcm)}
+        except (EspeakError, ValueError, KeyError) as e:
+            pcm = b""
+            header = {"ok": False, "error": str(e), "payload_size": 0}
+        out.write(json.dumps(header).encode("utf-8") + b"\n")
+        out.write(pcm)
+        out.flush()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Backend de espeak en memoria")
+    parser.add_argument('--serve', action='store_true', help='Modo servidor (uso interno de EspeakPool)')
+    parser.add_argument('--text', type=str, help='Texto a convertir en voz')
+    parser.add_argument('--output', type=str, default="espeak_output.wav", help='Ruta de salida WAV')
+    parser.add_argument('--voice', type=str, default="es")
+    parser.add_argument('--rate', type=int, default=150)
+    parser.add_argument('--pitch', type=int, default=50)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.voice, args.rate, args.pitch)
+    elif args.text:
+        pcm, sample_rate = synthesize(args.text, args.voice, args.rate, args.pitch)
+        write_wav(args.output, pcm, sample_rate)
+        print(f"Audio guardado en {args.output} ({len(pcm)} bytes PCM a {sample_rate} Hz)")
+    else:
+        parser.error("--text es obligatorio")
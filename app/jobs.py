@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Cola de trabajos en proceso para TTS y clonación de voz.
+
+Los trabajos se encolan y los atiende un número acotado de hilos
+(PerformanceConfig.max_concurrent_requests). El estado de cada trabajo se
+guarda en un almacén intercambiable: en memoria o SQLite en modo WAL, este
+último para que los trabajos pendientes sobrevivan a un reinicio.
+
+Con SQLite varios procesos pueden compartir el almacén: un trabajo se
+reclama de forma atómica (queued -> running) y quien lo ejecuta renueva un
+lease; sólo se repiten los trabajos 'running' cuyo lease ha caducado (el
+proceso que los ejecutaba murió).
+"""
+
+import json
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from contextlib import nullcontext
+
+from profiling import profile_dir, profile_path, profiled
+from tracing import current_request_id, trace
+
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# Duración del lease de un trabajo en ejecución; se renueva cada tercio
+LEASE_SECONDS = 60.0
+
+
+@dataclass
+class Job:
+    """Registro compacto de un trabajo"""
+    id: str
+    kind: str
+    params: Dict[str, Any]
+    status: str = JOB_QUEUED
+    result: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    # Proceso que lo ejecuta y hasta cuándo se le reserva
+    owner: Optional[str] = None
+    lease_until: Optional[float] = None
+
+    def is_finished(self) -> bool:
+        return self.status in (JOB_DONE, JOB_FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class JobStore:
+    """Interfaz de persistencia de trabajos"""
+
+    def save(self, job: Job) -> None:
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Job]:
+        raise NotImplementedError
+
+    def pending(self) -> List[Job]:
+        """Trabajos sin terminar (encolados o en ejecución)"""
+        raise NotImplementedError
+
+    def claim(self, job_id: str, owner: str, lease_until: float) -> Optional[Job]:
+        """Pasar un trabajo de queued a running de forma atómica; None si otro lo reclamó"""
+        raise NotImplementedError
+
+    def renew(self, owner: str, lease_until: float) -> None:
+        """Prolongar el lease de los trabajos que ejecuta owner"""
+        raise NotImplementedError
+
+    def requeue_expired(self, now: float) -> List[str]:
+        """Devolver a la cola los trabajos 'running' con el lease caducado"""
+        raise NotImplementedError
+
+    def purge(self, older_than: float) -> int:
+        """Eliminar trabajos terminados antes de older_than"""
+        raise NotImplementedError
+
+
+class MemoryJobStore(JobStore):
+    """Almacén en memoria (se pierde al reiniciar)"""
+
+    def __init__(self):
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def save(self, job: Job) -> None:
+        with self._lock:
+            self._jobs[job.id] = job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pending(self) -> List[Job]:
+        with self._lock:
+            return [job for job in self._jobs.values() if not job.is_finished()]
+
+    def claim(self, job_id: str, owner: str, lease_until: float) -> Optional[Job]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != JOB_QUEUED:
+                return None
+            job.status = JOB_RUNNING
+            job.started_at = time.time()
+            job.owner = owner
+            job.lease_until = lease_until
+            return job
+
+    def renew(self, owner: str, lease_until: float) -> None:
+        with self._lock:
+            for job in self._jobs.values():
+                if job.status == JOB_RUNNING and job.owner == owner:
+                    job.lease_until = lease_until
+
+    def requeue_expired(self, now: float) -> List[str]:
+        with self._lock:
+            expired = [job for job in self._jobs.values() if job.status == JOB_RUNNING
+                       and (job.lease_until is None or job.lease_until < now)]
+            for job in expired:
+                job.status, job.started_at, job.owner, job.lease_until = JOB_QUEUED, None, None, None
+            return [job.id for job in expired]
+
+    def purge(self, older_than: float) -> int:
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.is_finished() and job.finished_at < older_than]
+            for job_id in expired:
+                del self._jobs[job_id]
+            return len(expired)
+
+
+class SQLiteJobStore(JobStore):
+    """Almacén SQLite en modo WAL: los trabajos sobreviven a reinicios"""
+
+    COLUMNS = ("id", "kind", "params", "status", "result", "error",
+               "created_at", "started_at", "finished_at", "owner", "lease_until")
+
+    def __init__(self, db_path: str):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, kind TEXT NOT NULL, params TEXT NOT NULL,"
+            " status TEXT NOT NULL, result TEXT, error TEXT,"
+            " created_at REAL NOT NULL, started_at REAL, finished_at REAL,"
+            " owner TEXT, lease_until REAL)"
+        )
+        # Bases creadas antes de los leases
+        existing = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("owner", "TEXT"), ("lease_until", "REAL")):
+            if column not in existing:
+                self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)")
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def _to_job(self, row) -> Job:
+        data = dict(zip(self.COLUMNS, row))
+        data['params'] = json.loads(data['params'])
+        return Job(**data)
+
+    def save(self, job: Job) -> None:
+        values = job.to_dict()
+        values['params'] = json.dumps(job.params, separators=(',', ':'))
+        with self._lock:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO jobs ({', '.join(self.COLUMNS)})"
+                f" VALUES ({', '.join('?' for _ in self.COLUMNS)})",
+                [values[column] for column in self.COLUMNS]
+            )
+            self._db.commit()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._to_job(row) if row else None
+
+    def pending(self) -> List[Job]:
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE status IN (?, ?)"
+                " ORDER BY created_at", (JOB_QUEUED, JOB_RUNNING)
+            ).fetchall()
+        return [self._to_job(row) for row in rows]
+
+    def claim(self, job_id: str, owner: str, lease_until: float) -> Optional[Job]:
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, owner = ?, lease_until = ?"
+                " WHERE id = ? AND status = ?",
+                (JOB_RUNNING, time.time(), owner, lease_until, job_id, JOB_QUEUED)
+            )
+            self._db.commit()
+            if cursor.rowcount != 1:
+                return None
+        return self.get(job_id)
+
+    def renew(self, owner: str, lease_until: float) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET lease_until = ? WHERE status = ? AND owner = ?",
+                (lease_until, JOB_RUNNING, owner)
+            )
+            self._db.commit()
+
+    def requeue_expired(self, now: float) -> List[str]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id FROM jobs WHERE status = ? AND (lease_until IS NULL OR lease_until < ?)",
+                (JOB_RUNNING, now)
+            ).fetchall()
+            requeued = []
+            for (job_id,) in rows:
+                # La condición se repite: otro proceso puede haberlo renovado o reencolado
+                cursor = self._db.execute(
+                    "UPDATE jobs SET status = ?, started_at = NULL, owner = NULL, lease_until = NULL"
+                    " WHERE id = ? AND status = ? AND (lease_until IS NULL OR lease_until < ?)",
+                    (JOB_QUEUED, job_id, JOB_RUNNING, now)
+                )
+                if cursor.rowcount == 1:
+                    requeued.append(job_id)
+            self._db.commit()
+            return requeued
+
+    def purge(self, older_than: float) -> int:
+        with self._lock:
+            cursor = self._db.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (JOB_DONE, JOB_FAILED, older_than)
+            )
+            self._db.commit()
+            return cursor.rowcount
+
+
+class JobQueue:
+    """
+    Cola de trabajos con concurrencia acotada.
+
+    Cada tipo de trabajo tiene un handler handler(job) -> resultado (str);
+    si el handler lanza una excepción el trabajo queda como fallido.
+    Con async_processing=False los trabajos se ejecutan en el hilo que los
+    envía (útil en desarrollo y en tests).
+    """
+
+    def __init__(self, store: JobStore, handlers: Dict[str, Callable[[Job], str]],
+                 workers: int = 4, async_processing: bool = True, retention: int = 3600):
+        self.store = store
+        self.handlers = handlers
+        self.workers = workers
+        self.async_processing = async_processing
+        self.retention = retention
+        # Identidad de este proceso en los leases del almacén
+        self.owner = uuid.uuid4().hex
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._active = 0
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self) -> None:
+        """Arrancar los hilos y recoger los trabajos pendientes"""
+        if self._started or not self.async_processing:
+            return
+        self._started = True
+
+        # Los 'running' de un proceso que murió vuelven a la cola; los de
+        # procesos vivos conservan su lease y no se tocan
+        self.store.requeue_expired(time.time())
+        for job in self.store.pending():
+            if job.status == JOB_QUEUED:
+                # Si otro proceso también lo tiene en su cola, sólo uno lo reclama
+                self._queue.put(job.id)
+
+        for index in range(self.workers):
+            threading.Thread(target=self._worker_loop, daemon=True,
+                             name=f"job-worker-{index}").start()
+        threading.Thread(target=self._maintenance_loop, daemon=True, name="job-maintenance").start()
+
+    def _maintenance_loop(self) -> None:
+        """Renovar leases, recoger trabajos huérfanos y purgar los antiguos"""
+        while True:
+            time.sleep(LEASE_SECONDS / 3)
+            try:
+                now = time.time()
+                self.store.renew(self.owner, now + LEASE_SECONDS)
+                for job_id in self.store.requeue_expired(now):
+                    self._queue.put(job_id)
+                self.store.purge(now - self.retention)
+            except Exception as e:
+                print(f"⚠️ Error en el mantenimiento de la cola de trabajos: {e}")
+
+    def submit(self, kind: str, params: Dict[str, Any]) -> Job:
+        """Crear un trabajo y encolarlo (o ejecutarlo si no hay modo asíncrono)"""
+        if kind not in self.handlers:
+            raise ValueError(f"Tipo de trabajo desconocido: {kind}")
+
+        # El trabajo conserva el request ID de la petición que lo creó
+        request_id = current_request_id()
+        if request_id and 'request_id' not in params:
+            params = {**params, 'request_id': request_id}
+        # Si la petición se está perfilando, el trabajo también
+        directory = profile_dir()
+        if directory and 'profile_dir' not in params:
+            params = {**params, 'profile_dir': directory}
+        job = Job(id=uuid.uuid4().hex, kind=kind, params=params)
+        self.store.save(job)
+
+        if self.async_processing:
+            self.start()
+            self._queue.put(job.id)
+        else:
+            job = self.store.claim(job.id, self.owner, time.time() + LEASE_SECONDS) or job
+            self._run(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.store.get(job_id)
+
+    def _worker_loop(self) -> None:
+        while True:
+            job_id = self._queue.get()
+            job = self.store.claim(job_id, self.owner, time.time() + LEASE_SECONDS)
+            if job is not None:
+                with self._lock:
+                    self._active += 1
+                try:
+                    self._run(job)
+                finally:
+                    with self._lock:
+                        self._active -= 1
+            self._queue.task_done()
+
+    def _run(self, job: Job) -> None:
+        """Ejecutar un trabajo ya reclamado (status 'running')"""
+        directory = job.params.get('profile_dir')
+        profiling = (profiled(profile_path(directory, f"{job.params.get('request_id', job.id)}.job-{job.kind}"))
+                     if directory else nullcontext())
+        try:
+            with profiling, trace(f"job:{job.kind}", job.params.get('request_id')) as root:
+                try:
+                    job.result = self.handlers[job.kind](job)
+                    job.status = JOB_DONE
+                except Exception as e:
+                    job.error = str(e)
+                    job.status = JOB_FAILED
+                if root is not None:
+                    root.attrs.update(job_id=job.id, status=job.status)
+        except Exception as e:
+            # Un fallo del perfilado o del trazado no puede dejar el trabajo en
+            # ejecución ni matar el hilo del worker
+            print(f"⚠️ Error instrumentando el trabajo {job.id}: {e}")
+            if job.status == JOB_RUNNING:
+                job.error = str(e)
+                job.status = JOB_FAILED
+        job.finished_at = time.time()
+        job.lease_until = None
+        self.store.save(job)
+
+    def stats(self) -> Dict[str, Any]:
+        """Profundidad de la cola y trabajos en ejecución"""
+        return {
+            'async_processing': self.async_processing,
+            'workers': self.workers,
+            'queued': self._queue.qsize(),
+            'running': self._active,
+        }
+
+
+def create_job_store(backend: str, db_path: str) -> JobStore:
+    """Crear el almacén de trabajos configurado ('memory' o 'sqlite')"""
+    if backend == "sqlite":
+        return SQLiteJobStore(db_path)
+    if backend == "memory":
+        return MemoryJobStore()
+    raise ValueError(f"Almacén de trabajos desconocido: {backend}")
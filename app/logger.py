@@ -1,29 +1,134 @@
 #!/usr/bin/env python3
 """
 Sistema de logging centralizado para la aplicación de síntesis de voz
+
+Los hilos de las peticiones sólo encolan registros: un hilo por logger
+(QueueListener) formatea y escribe en consola y archivos, y las métricas
+se vuelcan a disco por lotes.
 """
 
+import atexit
 import logging
 import logging.handlers
 import os
+import queue
 import sys
 from datetime import datetime
 from pathlib import Path
 import json
+import time
 import traceback
 
+from config import project_path
+from metrics import get_metrics
+from tracing import (REQUEST_ID_HEADER, Span, add_sink, end_trace, new_request_id,
+                     sanitize_request_id, start_trace)
+
+
+def _request_metrics():
+    """Métricas de síntesis y de HTTP en el registro global"""
+    registry = get_metrics()
+    return {
+        'tts_requests': registry.counter('tts_requests_total', 'Solicitudes de TTS por motor y resultado'),
+        'tts_duration': registry.histogram('tts_request_duration_seconds', 'Latencia de TTS por motor'),
+        'tts_chars': registry.counter('tts_text_chars_total', 'Caracteres sintetizados por motor'),
+        'clone_requests': registry.counter('voice_cloning_requests_total', 'Clonaciones de voz por motor y resultado'),
+        'clone_duration': registry.histogram('voice_cloning_duration_seconds', 'Latencia de clonación por motor'),
+        'clone_bytes': registry.counter('voice_cloning_audio_bytes_total', 'Bytes de audio de referencia recibidos'),
+        'http_requests': registry.counter('http_requests_total', 'Peticiones HTTP por ruta, método y estado'),
+        'http_duration': registry.histogram('http_request_duration_seconds', 'Latencia de las peticiones HTTP'),
+        'http_bytes': registry.counter('http_response_bytes_total', 'Bytes servidos por ruta'),
+        'http_in_progress': registry.gauge('http_requests_in_progress', 'Peticiones HTTP en curso'),
+        'span_duration': registry.histogram('trace_span_duration_seconds', 'Duración de cada etapa de las trazas'),
+    }
+
+
+_metrics = None
+
+
+def request_metrics():
+    """Métricas compartidas (se crean en el primer uso)"""
+    global _metrics
+    if _metrics is None:
+        _metrics = _request_metrics()
+    return _metrics
+
+
+class _JsonMessage:
+    """Mensaje que se serializa a JSON al escribirse (en el hilo del listener)"""
+    
+    __slots__ = ('data',)
+    
+    def __init__(self, data):
+        self.data = data
+    
+    def __str__(self):
+        return json.dumps(self.data)
+
+
+class _EnqueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que no formatea en el hilo que registra"""
+    
+    def prepare(self, record):
+        # El registro no sale del proceso: se formatea después, en el listener
+        return record
+
+
+class BatchedTimedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """Acumula escrituras en el buffer del archivo; el listener vacía una vez por lote"""
+    
+    def flush(self):
+        pass
+    
+    def flush_batch(self):
+        super().flush()
+
+
+class BatchQueueListener(logging.handlers.QueueListener):
+    """QueueListener que procesa los registros pendientes por lotes"""
+    
+    def __init__(self, log_queue, *handlers, batch_size=256):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.batch_size = batch_size
+    
+    def _monitor(self):
+        log_queue = self.queue
+        while True:
+            batch = [log_queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(log_queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = False
+            for record in batch:
+                if record is self._sentinel:
+                    stop = True
+                    continue
+                self.handle(record)
+            for handler in self.handlers:
+                if isinstance(handler, BatchedTimedRotatingFileHandler):
+                    handler.flush_batch()
+            if stop:
+                return
+
 
 class VoiceSynthesisLogger:
     """Logger personalizado para la aplicación de síntesis de voz"""
     
-    def __init__(self, name="voice_synthesis", log_dir="logs"):
+    def __init__(self, name="voice_synthesis", log_dir=None, level=None, queued=True):
         self.name = name
-        self.log_dir = Path(log_dir)
-        self.log_dir.mkdir(exist_ok=True)
+        # LOG_DIR, relativo a la raíz del proyecto y no al directorio actual
+        self.log_dir = Path(project_path(log_dir or os.getenv("LOG_DIR", "logs")))
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        # queued=False escribe de forma síncrona en el hilo que registra (benchmark, depuración)
+        self.queued = queued
+        self._listeners = []
         
-        # Configurar logger principal
+        # Configurar logger principal (LOG_LEVEL; por defecto DEBUG)
         self.logger = logging.getLogger(name)
-        self.logger.setLevel(logging.DEBUG)
+        self.logger.setLevel(level or os.getenv("LOG_LEVEL", "DEBUG").upper())
+        self.metrics_logger = logging.getLogger(f"{self.name}.metrics")
         
         # Evitar duplicar handlers
         if not self.logger.handlers:
@@ -63,7 +168,9 @@ class VoiceSynthesisLogger:
         
         # Handler para métricas y analytics
         metrics_formatter = logging.Formatter('%(asctime)s | %(message)s')
-        metrics_handler = logging.handlers.TimedRotatingFileHandler(
+        metrics_handler_class = (BatchedTimedRotatingFileHandler if self.queued
+                                 else logging.handlers.TimedRotatingFileHandler)
+        metrics_handler = metrics_handler_class(
             self.log_dir / "metrics.log",
             when='midnight',
             backupCount=30
@@ -71,61 +178,95 @@ class VoiceSynthesisLogger:
         metrics_handler.setLevel(logging.INFO)
         metrics_handler.setFormatter(metrics_formatter)
         
-        # Agregar handlers al logger
-        self.logger.addHandler(console_handler)
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(error_handler)
-        
         # Logger separado para métricas
-        self.metrics_logger = logging.getLogger(f"{self.name}.metrics")
         self.metrics_logger.setLevel(logging.INFO)
-        self.metrics_logger.addHandler(metrics_handler)
         self.metrics_logger.propagate = False
+        
+        if not self.queued:
+            self.logger.addHandler(console_handler)
+            self.logger.addHandler(file_handler)
+            self.logger.addHandler(error_handler)
+            self.metrics_logger.addHandler(metrics_handler)
+            return
+        
+        # Los hilos de las peticiones sólo encolan; la E/S la hace el listener
+        for target, handlers in ((self.logger, (console_handler, file_handler, error_handler)),
+                                 (self.metrics_logger, (metrics_handler,))):
+            log_queue = queue.SimpleQueue()
+            target.addHandler(_EnqueueHandler(log_queue))
+            listener = BatchQueueListener(log_queue, *handlers)
+            listener.start()
+            self._listeners.append(listener)
+        atexit.register(self.close)
+    
+    def close(self):
+        """Vaciar las colas y detener los listeners"""
+        listeners, self._listeners = self._listeners, []
+        for listener in listeners:
+            listener.stop()
     
     def info(self, message, **kwargs):
         """Log mensaje informativo"""
-        self.logger.info(self._format_message(message, **kwargs))
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(self._format_message(message, **kwargs))
     
     def debug(self, message, **kwargs):
         """Log mensaje de debug"""
-        self.logger.debug(self._format_message(message, **kwargs))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(self._format_message(message, **kwargs))
     
     def warning(self, message, **kwargs):
         """Log mensaje de advertencia"""
-        self.logger.warning(self._format_message(message, **kwargs))
+        if self.logger.isEnabledFor(logging.WARNING):
+            self.logger.warning(self._format_message(message, **kwargs))
     
     def error(self, message, exception=None, **kwargs):
         """Log mensaje de error"""
+        if not self.logger.isEnabledFor(logging.ERROR):
+            return
         if exception:
             self.logger.error(
                 f"{self._format_message(message, **kwargs)} | Exception: {str(exception)}"
             )
-            self.logger.debug(traceback.format_exc())
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug(traceback.format_exc())
         else:
             self.logger.error(self._format_message(message, **kwargs))
     
     def critical(self, message, exception=None, **kwargs):
         """Log mensaje crítico"""
+        if not self.logger.isEnabledFor(logging.CRITICAL):
+            return
         if exception:
             self.logger.critical(
                 f"{self._format_message(message, **kwargs)} | Exception: {str(exception)}"
             )
-            self.logger.debug(traceback.format_exc())
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug(traceback.format_exc())
         else:
             self.logger.critical(self._format_message(message, **kwargs))
     
     def metric(self, event, data=None, **kwargs):
         """Log métrica o evento de analytics"""
+        if not self.metrics_logger.isEnabledFor(logging.INFO):
+            return
         metric_data = {
             'timestamp': datetime.now().isoformat(),
             'event': event,
             'data': data or {},
             **kwargs
         }
-        self.metrics_logger.info(json.dumps(metric_data))
+        # Se serializa en el hilo del listener, no en el de la petición
+        self.metrics_logger.info(_JsonMessage(metric_data))
     
     def tts_request(self, engine, text_length, success=True, duration=None, **kwargs):
         """Log específico para solicitudes TTS"""
+        metrics = request_metrics()
+        status = 'ok' if success else 'error'
+        metrics['tts_requests'].inc(engine=engine, status=status)
+        metrics['tts_chars'].inc(text_length, engine=engine)
+        if duration is not None:
+            metrics['tts_duration'].observe(duration, engine=engine, status=status)
         self.metric('tts_request', {
             'engine': engine,
             'text_length': text_length,
@@ -136,6 +277,12 @@ class VoiceSynthesisLogger:
     
     def voice_cloning_request(self, engine, audio_file_size, text_length, success=True, duration=None, **kwargs):
         """Log específico para clonación de voz"""
+        metrics = request_metrics()
+        status = 'ok' if success else 'error'
+        metrics['clone_requests'].inc(engine=engine, status=status)
+        metrics['clone_bytes'].inc(audio_file_size or 0, engine=engine)
+        if duration is not None:
+            metrics['clone_duration'].observe(duration, engine=engine, status=status)
         self.metric('voice_cloning_request', {
             'engine': engine,
             'audio_file_size': audio_file_size,
@@ -177,6 +324,17 @@ class VoiceSynthesisLogger:
 # Instancia global del logger
 logger = VoiceSynthesisLogger()
 
+
+def record_trace(trace):
+    """Sink de trazas: histograma por etapa y el árbol completo en metrics.log"""
+    durations = request_metrics()['span_duration']
+    for span in trace.root.walk():
+        durations.observe(span.duration, span=span.name)
+    logger.metric('trace', trace.to_dict())
+
+
+add_sink(record_trace)
+
 # Funciones de conveniencia
 def log_info(message, **kwargs):
     logger.info(message, **kwargs)
@@ -212,8 +370,62 @@ def log_system_health(**kwargs):
     logger.system_health(**kwargs)
 
 
+class _ResponseBody:
+    """
+    Iterable WSGI que cuenta los bytes servidos y, al cerrarse, registra las
+    métricas de la petición y cierra su traza (con el span 'response')
+    """
+    
+    def __init__(self, body, finish):
+        self.body = body
+        self.finish = finish
+        self.sent = 0
+        self.response_span = None
+        self._closed = False
+    
+    def __iter__(self):
+        self.response_span = Span('response')
+        for chunk in self.body:
+            self.sent += len(chunk)
+            yield chunk
+    
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if hasattr(self.body, 'close'):
+                self.body.close()
+        finally:
+            self.finish(self.sent, self.response_span)
+
+
+def _hook_file_close(body, finish, sent):
+    """
+    Respuesta de archivo del servidor (wsgi.file_wrapper): se devuelve tal
+    cual para que el servidor pueda usar sendfile, y las métricas y la
+    traza se cierran cuando el servidor la cierra
+    """
+    response_span = Span('response')
+    original_close = getattr(body, 'close', None)
+    closed = []
+
+    def close():
+        if closed:
+            return
+        closed.append(True)
+        try:
+            if original_close is not None:
+                original_close()
+        finally:
+            finish(sent(), response_span)
+
+    body.close = close
+    return body
+
+
 class LoggingMiddleware:
-    """Middleware para logging automático de requests"""
+    """Middleware para logging automático de requests (con request ID y traza)"""
     
     def __init__(self, app):
         self.app = app
@@ -226,19 +438,34 @@ class LoggingMiddleware:
         user_agent = environ.get('HTTP_USER_AGENT', 'Unknown')
         remote_addr = environ.get('REMOTE_ADDR', 'Unknown')
         
-        start_time = datetime.now()
+        # Request ID: el del cliente (si es válido) o uno nuevo
+        request_id = sanitize_request_id(environ.get('HTTP_X_REQUEST_ID')) or new_request_id()
+        environ['voice_synthesis.request_id'] = request_id
+        trace, tokens = start_trace('request', request_id)
+        started = trace.root.start
+        metrics = request_metrics()
+        metrics['http_in_progress'].inc()
         
         self.logger.info(f"Request started: {method} {path}", **{
+            'request_id': request_id,
             'user_agent': user_agent,
             'remote_addr': remote_addr
         })
         
+        state = {'status_code': None, 'route': None, 'content_length': 0}
+        
         def new_start_response(status, response_headers, exc_info=None):
             # Log response
-            duration = (datetime.now() - start_time).total_seconds()
+            duration = time.perf_counter() - started
             status_code = int(status.split(' ')[0])
+            state['status_code'] = status_code
+            state['route'] = self._route(environ)
+            for name, value in response_headers:
+                if name.lower() == 'content-length' and value.isdigit():
+                    state['content_length'] = int(value)
             
             self.logger.info(f"Request completed: {method} {path}", **{
+                'request_id': request_id,
                 'status_code': status_code,
                 'duration_seconds': duration,
                 'remote_addr': remote_addr
@@ -246,6 +473,7 @@ class LoggingMiddleware:
             
             # Log métrica
             self.logger.metric('http_request', {
+                'request_id': request_id,
                 'method': method,
                 'path': path,
                 'status_code': status_code,
@@ -254,9 +482,38 @@ class LoggingMiddleware:
                 'remote_addr': remote_addr
             })
             
+            response_headers = list(response_headers) + [(REQUEST_ID_HEADER, request_id)]
             return start_response(status, response_headers, exc_info)
         
-        return self.app(environ, new_start_response)
+        def finish(sent=0, response_span=None):
+            route = state['route'] or 'unmatched'
+            if response_span is not None:
+                response_span.finish()
+                trace.root.children.append(response_span)
+            trace.root.attrs.update(method=method, route=route, status=state['status_code'], bytes=sent)
+            metrics['http_in_progress'].dec()
+            metrics['http_requests'].inc(method=method, route=route, status=state['status_code'])
+            metrics['http_duration'].observe(time.perf_counter() - started, method=method, route=route)
+            metrics['http_bytes'].inc(sent, route=route)
+            end_trace(trace, tokens)
+        
+        try:
+            body = self.app(environ, new_start_response)
+        except Exception:
+            finish()
+            raise
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if isinstance(file_wrapper, type) and isinstance(body, file_wrapper):
+            # Los bytes enviados son los de Content-Length (también con Range)
+            return _hook_file_close(body, finish, lambda: state['content_length'])
+        return _ResponseBody(body, finish)
+    
+    @staticmethod
+    def _route(environ):
+        """Regla de Flask de la petición (evita una serie por cada job_id o archivo)"""
+        request = environ.get('werkzeug.request')
+        rule = getattr(request, 'url_rule', None)
+        return rule.rule if rule is not None else 'unmatched'
 
 
 def setup_error_handling(app):
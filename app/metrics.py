@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Registro de métricas en memoria con exposición en formato Prometheus.
+
+Contadores, gauges e histogramas de buckets fijos, con etiquetas. Para
+funcionar con varios procesos (varios workers de la web app, trabajos por
+lotes), cada proceso vuelca periódicamente una instantánea a
+<directorio>/metrics_<pid>.json y el proceso que atiende /metrics agrega
+las de todos. Las instantáneas de procesos terminados (o que llevan
+STALE_FLUSHES intervalos sin renovarse, p. ej. por reutilización de pid)
+se eliminan al agregar: Prometheus ve la bajada como un reinicio del
+contador.
+
+Sólo depende de la biblioteca estándar.
+"""
+
+import atexit
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+# Buckets de latencia (segundos): de respuestas servidas desde cache a síntesis largas
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Intervalos de volcado sin renovar tras los que una instantánea se da por muerta
+STALE_FLUSHES = 12
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(key: Iterable[Tuple[str, str]]) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in key]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    """Base común: nombre, ayuda y valores por combinación de etiquetas"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, registry: "MetricsRegistry"):
+        self.name = name
+        self.help = help
+        self._registry = registry
+        self._values: Dict[LabelKey, Any] = {}
+        self._lock = registry._lock
+
+    def snapshot(self) -> List[Tuple[LabelKey, Any]]:
+        with self._lock:
+            return [(key, value.copy() if isinstance(value, dict) else value)
+                    for key, value in self._values.items()]
+
+
+class Counter(Metric):
+    """Valor acumulado que sólo crece"""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+            self._registry._dirty = True
+
+    def set_total(self, value: float, **labels) -> None:
+        """Reflejar un contador que ya se lleva en otro sitio (p. ej. stats() del cache)"""
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = value
+            self._registry._dirty = True
+
+
+class Gauge(Metric):
+    """
+    Valor instantáneo. multiprocess_mode indica cómo se combinan los
+    procesos: 'sum', 'max' o 'all' (una serie por pid).
+    """
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, registry: "MetricsRegistry", multiprocess_mode: str = "sum"):
+        super().__init__(name, help, registry)
+        if multiprocess_mode not in ("sum", "max", "all"):
+            raise ValueError(f"Modo multiproceso inválido: {multiprocess_mode}")
+        self.multiprocess_mode = multiprocess_mode
+
+    def set(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = value
+            self._registry._dirty = True
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+            self._registry._dirty = True
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """Distribución en buckets fijos (más suma y número de observaciones)"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, registry: "MetricsRegistry", buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {'buckets': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            entry['buckets'][index] += 1
+            entry['sum'] += value
+            entry['count'] += 1
+            self._registry._dirty = True
+
+    def snapshot(self) -> List[Tuple[LabelKey, Any]]:
+        with self._lock:
+            return [(key, {'buckets': list(entry['buckets']), 'sum': entry['sum'], 'count': entry['count']})
+                    for key, entry in self._values.items()]
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MetricsRegistry:
+    """Métricas del proceso con volcado periódico para la agregación multiproceso"""
+
+    def __init__(self, directory: Optional[str] = None, flush_interval: float = 5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._written_at = 0.0
+        self._flusher: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _register(self, metric: Metric) -> Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if existing.type != metric.type:
+                    raise ValueError(f"La métrica {metric.name} ya existe con tipo {existing.type}")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._register(Counter(name, help, self))
+
+    def gauge(self, name: str, help: str, multiprocess_mode: str = "sum") -> Gauge:
+        return self._register(Gauge(name, help, self, multiprocess_mode))
+
+    def histogram(self, name: str, help: str, buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, self, buckets))
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Función que actualiza métricas justo antes de volcarlas o exponerlas"""
+        self._collectors.append(collector)
+
+    def collect(self) -> None:
+        for collector in list(self._collectors):
+            try:
+                collector()
+            except Exception as e:
+                print(f"⚠️ Error en colector de métricas: {e}")
+
+    # --- Multiproceso ---
+
+    @property
+    def snapshot_path(self) -> Optional[str]:
+        if not self.directory:
+            return None
+        return os.path.join(self.directory, f"metrics_{os.getpid()}.json")
+
+    def _local_snapshot(self) -> Dict[str, Any]:
+        return {
+            name: {
+                'type': metric.type,
+                'help': metric.help,
+                'mode': getattr(metric, 'multiprocess_mode', None),
+                'buckets': list(getattr(metric, 'buckets', ())),
+                'samples': [[list(key), value] for key, value in metric.snapshot()],
+            }
+            for name, metric in list(self._metrics.items())
+        }
+
+    @property
+    def stale_after(self) -> float:
+        return self.flush_interval * STALE_FLUSHES
+
+    def flush(self) -> None:
+        """
+        Escribir la instantánea de este proceso (escritura atómica). Sin
+        cambios sólo se reescribe a mitad del plazo de caducidad, para que
+        los demás procesos no la tomen por muerta.
+        """
+        path = self.snapshot_path
+        if path is None:
+            return
+        self.collect()
+        now = time.time()
+        with self._lock:
+            fresh = now - self._written_at < self.stale_after / 2
+            if not self._dirty and fresh and os.path.exists(path):
+                return
+            self._dirty = False
+            self._written_at = now
+            data = {'pid': os.getpid(), 'written_at': now, 'metrics': self._local_snapshot()}
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"⚠️ No se pudieron volcar las métricas: {e}")
+
+    def start(self) -> None:
+        """Arrancar el volcado periódico (sólo con directorio multiproceso)"""
+        if not self.directory or self._flusher is not None:
+            return
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True, name="metrics-flusher")
+        self._flusher.start()
+        atexit.register(self.flush)
+
+    def _flush_loop(self) -> None:
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.flush()
+
+    def _other_snapshots(self) -> List[Dict[str, Any]]:
+        """Instantáneas de los demás procesos vivos (las muertas se eliminan)"""
+        if not self.directory:
+            return []
+        snapshots = []
+        own = os.getpid()
+        oldest = time.time() - self.stale_after
+        for path in glob.glob(os.path.join(self.directory, "metrics_*.json")):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            pid = data.get('pid', 0)
+            if pid == own:
+                continue
+            if not _pid_alive(pid) or data.get('written_at', 0) < oldest:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            snapshots.append(data)
+        return snapshots
+
+    def aggregate(self) -> Dict[str, Dict[str, Any]]:
+        """Métricas de todos los procesos combinadas"""
+        self.collect()
+        with self._lock:
+            local = self._local_snapshot()
+        sources = [(os.getpid(), local)]
+        sources += [(data['pid'], data.get('metrics', {})) for data in self._other_snapshots()]
+
+        merged: Dict[str, Dict[str, Any]] = {}
+        for pid, metrics in sources:
+            for name, family in metrics.items():
+                target = merged.setdefault(name, {'type': family['type'], 'help': family['help'],
+                                                  'buckets': family.get('buckets') or [], 'values': {}})
+                if target['type'] != family['type']:
+                    continue
+                for key, value in family['samples']:
+                    key = tuple(tuple(pair) for pair in key)
+                    self._merge_sample(target, family, key, value, pid)
+        return merged
+
+    @staticmethod
+    def _merge_sample(target: Dict[str, Any], family: Dict[str, Any], key: LabelKey, value: Any,
+                      pid: int) -> None:
+        values = target['values']
+        kind = family['type']
+        if kind == 'counter':
+            values[key] = values.get(key, 0) + value
+        elif kind == 'gauge':
+            mode = family.get('mode') or 'sum'
+            if mode == 'all':
+                values[key + (('pid', str(pid)),)] = value
+            elif mode == 'max':
+                values[key] = max(values.get(key, value), value)
+            else:
+                values[key] = values.get(key, 0) + value
+        elif kind == 'histogram':
+            if list(family.get('buckets') or []) != list(target['buckets']):
+                return
+            entry = values.get(key)
+            if entry is None:
+                values[key] = {'buckets': list(value['buckets']), 'sum': value['sum'], 'count': value['count']}
+            else:
+                entry['buckets'] = [a + b for a, b in zip(entry['buckets'], value['buckets'])]
+                entry['sum'] += value['sum']
+                entry['count'] += value['count']
+
+    def render(self) -> str:
+        """Exposición en formato de texto de Prometheus (0.0.4)"""
+        lines = []
+        for name, family in sorted(self.aggregate().items()):
+            lines.append(f"# HELP {name} {family['help']}")
+            lines.append(f"# TYPE {name} {family['type']}")
+            for key, value in sorted(family['values'].items()):
+                if family['type'] != 'histogram':
+                    lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+                    continue
+                cumulative = 0
+                bounds = list(family['buckets']) + [float("inf")]
+                for bound, count in zip(bounds, value['buckets']):
+                    cumulative += count
+                    le = _format_value(bound) if bound == float("inf") else repr(float(bound))
+                    lines.append(f"{name}_bucket{_format_labels(key + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(key)} {_format_value(value['sum'])}")
+                lines.append(f"{name}_count{_format_labels(key)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+
+_registry: Optional[MetricsRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_metrics(directory: Optional[str] = None, flush_interval: Optional[float] = None,
+                start: bool = True) -> MetricsRegistry:
+    """
+    Registro global (METRICS_DIR y METRICS_FLUSH_INTERVAL como valores por
+    defecto). Con start=False no se arranca el volcado periódico, p. ej. en
+    el proceso padre del reloader, que no sirve peticiones.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = MetricsRegistry(
+                directory=directory or os.getenv("METRICS_DIR") or None,
+                flush_interval=flush_interval or float(os.getenv("METRICS_FLUSH_INTERVAL", "5")),
+            )
+        if start:
+            _registry.start()
+        return _registry
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Catálogo indexado de modelos de Coqui TTS.
+
+Se construye a partir del .models.json que trae el paquete TTS (sin
+importar TTS ni torch) y del directorio local de modelos descargados. El
+índice se guarda en disco junto con una huella (mtime/tamaño del
+.models.json y del directorio de modelos) y sólo se reconstruye cuando
+ésta cambia. Las búsquedas por nombre son O(1).
+
+Sólo depende de la biblioteca estándar: lo usan tanto la web app como los
+workers de venv-coqui.
+"""
+
+import glob
+import importlib.util
+import json
+import os
+import tempfile
+import threading
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional
+
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_INDEX_PATH = os.path.join(PROJECT_ROOT, 'cache', 'model_catalog.json')
+INDEX_VERSION = 1
+
+# Modelos capaces de clonar voz a partir de un audio de referencia
+CLONING_KEYWORDS = ("your_tts", "yourtts", "xtts", "voice_cloning")
+# Conjuntos de datos con varios hablantes
+MULTI_SPEAKER_DATASETS = ("vctk", "multi-dataset", "libri-tts", "libritts", "css10")
+
+
+@dataclass
+class ModelInfo:
+    """Entrada del catálogo"""
+    name: str
+    type: str
+    language: str
+    dataset: str
+    model: str
+    description: str
+    multi_speaker: bool
+    cloning: bool
+    local_path: Optional[str]
+    size_bytes: Optional[int]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def find_models_file() -> Optional[str]:
+    """Ubicar TTS/.models.json sin importar el paquete"""
+    try:
+        spec = importlib.util.find_spec("TTS")
+    except (ImportError, ValueError):
+        spec = None
+    if spec is not None and spec.submodule_search_locations:
+        for location in spec.submodule_search_locations:
+            path = os.path.join(location, ".models.json")
+            if os.path.exists(path):
+                return path
+
+    # Desde la web app: buscar en el entorno virtual de Coqui
+    pattern = os.path.join(PROJECT_ROOT, "venv-coqui", "lib*", "python*", "site-packages", "TTS", ".models.json")
+    matches = sorted(glob.glob(pattern))
+    return matches[-1] if matches else None
+
+
+def default_models_dir() -> str:
+    """Directorio donde Coqui TTS descarga los modelos (TTS_HOME o XDG)"""
+    base = os.getenv("TTS_HOME") or os.getenv("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    return os.path.join(base, "tts")
+
+
+def _directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _stat_key(path: Optional[str]) -> Optional[List[int]]:
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+class ModelCatalog:
+    """Índice de modelos persistido en disco"""
+
+    def __init__(self, models_file: Optional[str] = None, models_dir: Optional[str] = None,
+                 index_path: str = DEFAULT_INDEX_PATH):
+        self.models_file = models_file or find_models_file()
+        self.models_dir = os.path.abspath(models_dir or default_models_dir())
+        self.index_path = index_path
+        self._models: Dict[str, ModelInfo] = {}
+        self._by_language: Dict[str, List[str]] = {}
+        self._fingerprint: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+
+    def fingerprint(self) -> Dict[str, Any]:
+        """Huella de las fuentes: si cambia, el índice se reconstruye"""
+        return {
+            'version': INDEX_VERSION,
+            'models_file': self.models_file,
+            'models_file_stat': _stat_key(self.models_file),
+            'models_dir': self.models_dir,
+            'models_dir_stat': _stat_key(self.models_dir),
+        }
+
+    def _ensure_loaded(self) -> None:
+        fingerprint = self.fingerprint()
+        if self._fingerprint == fingerprint:
+            return
+        with self._lock:
+            if self._fingerprint == fingerprint:
+                return
+            if not self._load_index(fingerprint):
+                self._build(fingerprint)
+                self._save_index()
+
+    def _load_index(self, fingerprint: Dict[str, Any]) -> bool:
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get('fingerprint') != fingerprint:
+            return False
+        self._set_models([ModelInfo(**entry) for entry in data.get('models', [])], fingerprint)
+        return True
+
+    def _build(self, fingerprint: Dict[str, Any]) -> None:
+        models = []
+        catalog = {}
+        if self.models_file:
+            try:
+                with open(self.models_file, encoding="utf-8") as f:
+                    catalog = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ No se pudo leer {self.models_file}: {e}")
+
+        for model_type, languages in catalog.items():
+            if not isinstance(languages, dict):
+                continue
+            for language, datasets in languages.items():
+                for dataset, entries in datasets.items():
+                    for model, details in entries.items():
+                        models.append(self._make_info(model_type, language, dataset, model, details or {}))
+
+        self.rebuilds += 1
+        self._set_models(models, fingerprint)
+
+    def _make_info(self, model_type: str, language: str, dataset: str, model: str,
+                   details: Dict[str, Any]) -> ModelInfo:
+        name = f"{model_type}/{language}/{dataset}/{model}"
+        lowered = name.lower()
+        # Coqui guarda cada modelo en <models_dir>/<nombre con / -> -->
+        local_path = os.path.join(self.models_dir, name.replace("/", "--"))
+        installed = os.path.isdir(local_path)
+        return ModelInfo(
+            name=name,
+            type=model_type,
+            language=language,
+            dataset=dataset,
+            model=model,
+            description=details.get("description") or "",
+            multi_speaker=(language == "multilingual" or dataset.lower() in MULTI_SPEAKER_DATASETS
+                           or any(keyword in lowered for keyword in CLONING_KEYWORDS)),
+            cloning=(model_type == "tts_models" and any(keyword in lowered for keyword in CLONING_KEYWORDS)),
+            local_path=local_path if installed else None,
+            size_bytes=_directory_size(local_path) if installed else None,
+        )
+
+    def _set_models(self, models: List[ModelInfo], fingerprint: Dict[str, Any]) -> None:
+        by_language: Dict[str, List[str]] = {}
+        for info in models:
+            by_language.setdefault(info.language, []).append(info.name)
+        self._models = {info.name: info for info in models}
+        self._by_language = by_language
+        self._fingerprint = fingerprint
+
+    def _save_index(self) -> None:
+        directory = os.path.dirname(self.index_path) or "."
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({'fingerprint': self._fingerprint,
+                           'models': [info.to_dict() for info in self._models.values()]}, f)
+            os.replace(temp_path, self.index_path)
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar el catálogo de modelos: {e}")
+
+    def get(self, name: str) -> Optional[ModelInfo]:
+        self._ensure_loaded()
+        return self._models.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def models(self, model_type: Optional[str] = "tts_models", language: Optional[str] = None,
+               cloning: Optional[bool] = None, installed: Optional[bool] = None) -> List[ModelInfo]:
+        """Modelos filtrados (en el orden del .models.json)"""
+        self._ensure_loaded()
+        names = self._by_language.get(language, []) if language else self._models.keys()
+        result = []
+        for name in names:
+            info = self._models[name]
+            if model_type and info.type != model_type:
+                continue
+            if cloning is not None and info.cloning != cloning:
+                continue
+            if installed is not None and (info.local_path is not None) != installed:
+                continue
+            result.append(info)
+        return result
+
+    def pick_cloning_model(self, preferred: Optional[str] = None) -> Optional[str]:
+        """Modelo de clonación: el preferido, si no uno ya descargado, si no el primero"""
+        if preferred:
+            info = self.get(preferred)
+            if info is not None and info.cloning:
+                return preferred
+        candidates = self.models(cloning=True)
+        for info in candidates:
+            if info.local_path:
+                return info.name
+        return candidates[0].name if candidates else None
+
+    def stats(self) -> Dict[str, Any]:
+        self._ensure_loaded()
+        return {
+            'models_file': self.models_file,
+            'models_dir': self.models_dir,
+            'models': len(self._models),
+            'installed': sum(1 for info in self._models.values() if info.local_path),
+            'languages': sorted(self._by_language),
+            'rebuilds': self.rebuilds,
+        }
+
+
+_catalog: Optional[ModelCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_model_catalog(models_dir: Optional[str] = None, index_path: Optional[str] = None) -> ModelCatalog:
+    """Catálogo global (COQUI_MODEL_CATALOG y TTS_HOME como valores por defecto)"""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = ModelCatalog(
+                models_dir=models_dir,
+                index_path=index_path or os.getenv("COQUI_MODEL_CATALOG") or DEFAULT_INDEX_PATH,
+            )
+        return _catalog
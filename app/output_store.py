@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Almacén de archivos de audio generados y subidos.
+
+Cada resultado se escribe primero en un archivo temporal único y se publica
+con un rename atómico bajo un nombre derivado del hash de su contenido, de
+modo que peticiones concurrentes nunca se pisan. Un hilo janitor aplica un
+presupuesto de disco y una edad máxima, sin tocar los archivos fijados
+(p. ej. referencias de trabajos que aún no han terminado).
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Optional
+
+
+class OutputStore:
+    """Archivos direccionados por contenido con escritura atómica"""
+
+    TEMP_DIR = ".tmp"
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, root: str, max_size: int = 1024 * 1024 * 1024,
+                 max_age: int = 86400, janitor_interval: int = 300,
+                 pinned: Optional[Callable[[], Iterable[str]]] = None):
+        self.root = Path(root)
+        self.max_size = max_size
+        self.max_age = max_age
+        self.janitor_interval = janitor_interval
+        # Rutas que el janitor no debe borrar aunque sean viejas
+        self.pinned = pinned
+        self.temp_dir = self.root / self.TEMP_DIR
+        self.temp_dir.mkdir(parents=True, exist_ok=True)
+        self._janitor: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self.removed_files = 0
+        self.deduplicated = 0
+
+    def temp_path(self, extension: str = "wav") -> str:
+        """Ruta temporal única para que un motor escriba su resultado"""
+        fd, path = tempfile.mkstemp(dir=str(self.temp_dir), suffix=f".{extension.lstrip('.')}")
+        os.close(fd)
+        return path
+
+    def discard(self, temp_path: str) -> None:
+        """Eliminar un temporal que no llegó a publicarse"""
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+
+    def commit(self, temp_path: str, extension: Optional[str] = None) -> str:
+        """
+        Publicar un temporal bajo su nombre de contenido y devolver ese nombre.
+        Si el mismo contenido ya existe, se reutiliza y se descarta el temporal.
+        """
+        digest = hashlib.sha256()
+        with open(temp_path, "rb") as f:
+            for block in iter(lambda: f.read(self.CHUNK_SIZE), b""):
+                digest.update(block)
+        return self._publish(temp_path, digest.hexdigest(), extension)
+
+    def commit_as(self, temp_path: str, key: str, extension: Optional[str] = None) -> str:
+        """Publicar un temporal bajo una clave propia (p. ej. hash de entrada y parámetros)"""
+        return self._publish(temp_path, key, extension)
+
+    def _publish(self, temp_path: str, content_hash: str, extension: Optional[str]) -> str:
+        extension = (extension or os.path.splitext(temp_path)[1] or ".wav").lstrip('.')
+        name = f"{content_hash}.{extension}"
+        final_path = self.root / name
+        if final_path.exists():
+            # Mismo contenido: refrescar la fecha para que el janitor lo conserve
+            os.utime(final_path)
+            self.deduplicated += 1
+            self.discard(temp_path)
+        else:
+            os.replace(temp_path, final_path)
+        return name
+
+    def put_bytes(self, data: bytes, extension: str = "wav") -> str:
+        """Guardar bytes de audio y devolver su nombre"""
+        content_hash = hashlib.sha256(data).hexdigest()
+        name = f"{content_hash}.{extension.lstrip('.')}"
+        if (self.root / name).exists():
+            # Ya publicado: no hace falta volver a escribirlo
+            os.utime(self.root / name)
+            self.deduplicated += 1
+            return name
+        temp_path = self.temp_path(extension)
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        return self._publish(temp_path, content_hash, extension)
+
+    def put_stream(self, stream: BinaryIO, extension: str, validator: Optional[Callable] = None) -> str:
+        """
+        Copiar un stream (p. ej. un archivo subido) por bloques y publicarlo.
+        validator(bloque) se llama antes de escribir cada bloque y
+        validator.finish(ruta) antes de publicar; si lanzan, el temporal se
+        descarta.
+        """
+        temp_path = self.temp_path(extension)
+        digest = hashlib.sha256()
+        try:
+            with open(temp_path, "wb") as f:
+                for block in iter(lambda: stream.read(self.CHUNK_SIZE), b""):
+                    if validator is not None:
+                        validator(block)
+                    digest.update(block)
+                    f.write(block)
+            if validator is not None:
+                validator.finish(temp_path)
+        except BaseException:
+            self.discard(temp_path)
+            raise
+        return self._publish(temp_path, digest.hexdigest(), extension)
+
+    def path(self, name: str) -> str:
+        """Ruta absoluta de un nombre publicado (sin permitir salir del root)"""
+        if os.path.basename(name) != name or name.startswith('.'):
+            raise ValueError(f"Nombre de archivo inválido: {name}")
+        return str(self.root / name)
+
+    def exists(self, name: str) -> bool:
+        try:
+            return os.path.exists(self.path(name))
+        except ValueError:
+            return False
+
+    def touch(self, name: str) -> None:
+        """Refrescar la fecha de un archivo reutilizado para que el janitor lo conserve"""
+        try:
+            os.utime(self.path(name))
+        except (OSError, ValueError):
+            pass
+
+    def cleanup(self) -> int:
+        """
+        Aplicar edad máxima y presupuesto de disco (primero los más viejos).
+        Los archivos fijados cuentan para el presupuesto pero no se borran.
+        """
+        now = time.time()
+        removed = 0
+        files = []
+        pinned_size = 0
+        pinned = {os.path.abspath(path) for path in self.pinned()} if self.pinned else set()
+
+        for entry in os.scandir(self.temp_dir):
+            try:
+                # Temporales abandonados (motores que fallaron sin limpiar)
+                if entry.is_file() and now - entry.stat().st_mtime > max(self.max_age, 3600):
+                    os.unlink(entry.path)
+                    removed += 1
+            except OSError:
+                pass
+
+        for entry in os.scandir(self.root):
+            if not entry.is_file():
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            if os.path.abspath(entry.path) in pinned:
+                pinned_size += stat.st_size
+                continue
+            if self.max_age and now - stat.st_mtime > self.max_age:
+                try:
+                    os.unlink(entry.path)
+                    removed += 1
+                except OSError:
+                    pass
+            else:
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = pinned_size + sum(size for _, size, _ in files)
+        if self.max_size and total > self.max_size:
+            for _, size, path in sorted(files):
+                try:
+                    os.unlink(path)
+                    removed += 1
+                    total -= size
+                except OSError:
+                    pass
+                if total <= self.max_size:
+                    break
+
+        self.removed_files += removed
+        return removed
+
+    def start_janitor(self) -> None:
+        """Ejecutar cleanup() periódicamente en segundo plano"""
+        if self._janitor is not None or self.janitor_interval <= 0:
+            return
+        self._janitor = threading.Thread(target=self._janitor_loop, daemon=True,
+                                         name=f"janitor-{self.root.name}")
+        self._janitor.start()
+
+    def _janitor_loop(self) -> None:
+        while not self._stop_event.wait(self.janitor_interval):
+            try:
+                self.cleanup()
+            except Exception as e:
+                # Incluye fallos de pinned(): el janitor sigue vivo
+                print(f"⚠️ Error en el janitor de {self.root}: {e}")
+
+    def stop_janitor(self) -> None:
+        self._stop_event.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Ocupación del almacén"""
+        files = [entry for entry in os.scandir(self.root) if entry.is_file()]
+        return {
+            'files': len(files),
+            'size_bytes': sum(entry.stat().st_size for entry in files),
+            'max_size_bytes': self.max_size,
+            'max_age_seconds': self.max_age,
+            'removed_files': self.removed_files,
+            'deduplicated': self.deduplicated,
+            'free_disk_bytes': shutil.disk_usage(self.root).free,
+        }
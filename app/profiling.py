@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Perfilado bajo demanda y por muestreo.
+
+- profiled(path): ejecuta un bloque bajo cProfile y guarda el volcado
+  (.prof, legible con pstats o snakeviz). Marca el contexto como
+  perfilado para que los trabajos que lance (cola de trabajos, workers de
+  Coqui) también se perfilen.
+- SamplingProfiler: hilo que cada intervalo toma las pilas de todos los
+  hilos con sys._current_frames() y las acumula en formato collapsed
+  ("hilo;función (archivo:línea);... N"), el que usan flamegraph.pl y
+  speedscope. Cada proceso vuelca periódicamente sus pilas a un archivo
+  para poder agregar las de los workers.
+
+Sólo depende de la biblioteca estándar: lo usan la web app y los workers.
+"""
+
+import atexit
+import contextvars
+import cProfile
+import glob
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+
+# Directorio de volcados del contexto actual (None = sin perfilado)
+_profile_dir: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('profile_dir', default=None)
+# Sólo un cProfile a la vez en el proceso: desde Python 3.12 enable() es
+# global (sys.monitoring) y lanza ValueError si ya hay otro activo
+_profiler_lock = threading.Lock()
+_profiler_owner: Optional[int] = None
+
+
+def profile_dir() -> Optional[str]:
+    """Directorio de volcados si la petición actual se está perfilando"""
+    return _profile_dir.get()
+
+
+def profile_path(directory: str, name: str) -> str:
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+    return os.path.join(directory, f"{safe}.prof")
+
+
+@contextmanager
+def profiled(path: str) -> Iterator[Optional[cProfile.Profile]]:
+    """
+    Perfilar el bloque con cProfile y guardar el volcado en path. Si ya se
+    está perfilando otro bloque (en este u otro hilo), el bloque se ejecuta
+    sin perfilar: los errores del perfilado nunca llegan al llamador.
+    """
+    directory = os.path.dirname(path) or "."
+    token = _profile_dir.set(directory)
+    global _profiler_owner
+    profiler: Optional[cProfile.Profile] = None
+    if _profiler_lock.acquire(blocking=False):
+        try:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            _profiler_owner = threading.get_ident()
+        except ValueError as e:
+            # Otra herramienta (depurador, cobertura) ocupa el perfilado
+            print(f"⚠️ Perfil {path} omitido: {e}", file=sys.stderr)
+            profiler = None
+            _profiler_lock.release()
+    elif _profiler_owner != threading.get_ident():
+        # En el mismo hilo (trabajo síncrono dentro de la petición) ya lo cubre el perfil exterior
+        print(f"⚠️ Perfil {path} omitido: ya hay otro perfil en curso", file=sys.stderr)
+    try:
+        yield profiler
+    finally:
+        _profile_dir.reset(token)
+        if profiler is not None:
+            profiler.disable()
+            _profiler_owner = None
+            _profiler_lock.release()
+            try:
+                os.makedirs(directory, exist_ok=True)
+                profiler.dump_stats(path)
+                print(f"🔬 Perfil guardado en {path}", file=sys.stderr)
+            except OSError as e:
+                print(f"⚠️ No se pudo guardar el perfil {path}: {e}", file=sys.stderr)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Muestreo periódico de las pilas de todos los hilos del proceso"""
+
+    def __init__(self, interval: float = 0.05, directory: Optional[str] = None,
+                 label: str = "process", dump_interval: float = 30.0, max_depth: int = 64):
+        self.interval = interval
+        # Nombre del proceso en las pilas agregadas (p. ej. web-1234, worker-5678)
+        self.label = f"{label}-{os.getpid()}"
+        self.dump_path = os.path.join(directory, f"stacks-{self.label}.txt") if directory else None
+        self.dump_interval = dump_interval
+        self.max_depth = max_depth
+        self.samples = 0
+        self._stacks: Counter = Counter()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None or self.interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True, name="sampling-profiler")
+        self._thread.start()
+        if self.dump_path:
+            atexit.register(self.dump)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        last_dump = time.monotonic()
+        while not self._stop_event.wait(self.interval):
+            self.sample(skip=own)
+            if self.dump_path and time.monotonic() - last_dump >= self.dump_interval:
+                last_dump = time.monotonic()
+                self.dump()
+
+    def sample(self, skip: Optional[int] = None) -> None:
+        """Tomar una muestra de las pilas de todos los hilos"""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        collected = []
+        for ident, frame in sys._current_frames().items():
+            if ident == skip:
+                continue
+            labels = []
+            while frame is not None and len(labels) < self.max_depth:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            labels.append(names.get(ident, f"thread-{ident}"))
+            collected.append(";".join(reversed(labels)))
+        with self._lock:
+            self._stacks.update(collected)
+            self.samples += 1
+
+    def collapsed(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stacks)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+
+    def dump(self) -> None:
+        """Guardar las pilas acumuladas en dump_path (escritura atómica)"""
+        if not self.dump_path:
+            return
+        directory = os.path.dirname(self.dump_path) or "."
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(format_collapsed(self.collapsed()))
+            os.replace(temp_path, self.dump_path)
+        except OSError as e:
+            print(f"⚠️ No se pudieron volcar las pilas muestreadas: {e}", file=sys.stderr)
+
+
+def format_collapsed(stacks: Dict[str, int], prefix: str = "") -> str:
+    """Formato collapsed: una pila por línea seguida del número de muestras"""
+    return "".join(f"{prefix}{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+
+def read_collapsed(path: str) -> Dict[str, int]:
+    stacks: Dict[str, int] = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                stack, _, count = line.rstrip("\n").rpartition(" ")
+                if stack and count.isdigit():
+                    stacks[stack] = stacks.get(stack, 0) + int(count)
+    except OSError:
+        pass
+    return stacks
+
+
+def collect_stacks(local: Optional[SamplingProfiler], directory: Optional[str]) -> str:
+    """
+    Pilas de este proceso más las volcadas por otros (stacks-*.txt en
+    directory), cada una con el proceso como primer marco
+    """
+    parts = []
+    own_path = local.dump_path if local is not None else None
+    if local is not None:
+        parts.append(format_collapsed(local.collapsed(), f"{local.label};"))
+    if directory:
+        for path in sorted(glob.glob(os.path.join(directory, "stacks-*.txt"))):
+            if own_path and os.path.abspath(path) == os.path.abspath(own_path):
+                continue
+            process = os.path.basename(path)[len("stacks-"):-len(".txt")]
+            parts.append(format_collapsed(read_collapsed(path), f"{process};"))
+    return "".join(parts)
+
+
+_sampler: Optional[SamplingProfiler] = None
+_sampler_lock = threading.Lock()
+
+
+def get_sampling_profiler(interval: Optional[float] = None, directory: Optional[str] = None,
+                          label: str = "process") -> SamplingProfiler:
+    """Muestreador global del proceso (PROFILER_SAMPLING_INTERVAL; 0 lo desactiva)"""
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            if interval is None:
+                interval = float(os.getenv("PROFILER_SAMPLING_INTERVAL", "0.05"))
+            _sampler = SamplingProfiler(interval, directory, label)
+            _sampler.start()
+        return _sampler
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Preprocesado del audio de referencia para la clonación de voz.
+
+Antes de pasar un upload a ElevenLabs o al encoder de hablante de Coqui se
+mezcla a mono, se remuestrea a la frecuencia objetivo, se recortan los
+silencios inicial y final, se normaliza el nivel de la voz y se limita la
+duración. Todo se hace por bloques con NumPy: la memoria queda acotada por
+el bloque de decodificación y la duración máxima, no por el archivo subido,
+y la decodificación se corta en cuanto hay voz suficiente.
+
+Durante el mismo recorrido se analiza su calidad (ver reference_quality).
+El resultado y el informe se publican en un OutputStore con una clave
+derivada del hash del upload y de los parámetros, así que cada referencia
+se procesa y analiza una sola vez. Los WAV PCM se leen directamente; el resto de formatos se decodifican
+con ffmpeg si está instalado.
+"""
+
+import hashlib
+import json
+import shutil
+import subprocess
+import wave
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from audio_utils import StreamResampler, encode_wav, frame_rms, iter_wav_blocks
+from output_store import OutputStore
+from reference_quality import CLIP_LEVEL, QualityReport, analyze
+from tracing import span
+
+
+# Ventana del detector de silencio y margen que se conserva a cada lado
+FRAME_SECONDS = 0.02
+PAD_SECONDS = 0.1
+# Techo de pico tras normalizar (-1 dBFS)
+PEAK_LIMIT = 10 ** (-1 / 20)
+# Cambia cuando cambia el algoritmo: invalida las referencias ya procesadas
+PIPELINE_VERSION = 2
+
+
+class ReferenceDecodeError(Exception):
+    """El audio de referencia no se puede decodificar en este entorno"""
+
+
+def _ffmpeg_blocks(path: str, sample_rate: int, block_frames: int) -> Iterator[np.ndarray]:
+    """Decodificar con ffmpeg a PCM mono por una tubería, bloque a bloque"""
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise ReferenceDecodeError("ffmpeg no está instalado")
+    process = subprocess.Popen(
+        [ffmpeg, "-nostdin", "-v", "error", "-i", path,
+         "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "-"],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+    )
+
+    def blocks() -> Iterator[np.ndarray]:
+        try:
+            while True:
+                data = process.stdout.read(block_frames * 2)
+                if not data:
+                    break
+                yield np.frombuffer(data[:len(data) - len(data) % 2], dtype='<i2').astype(np.float32) / 32768.0
+        finally:
+            # Si se deja de leer antes del final (duración máxima), se corta ffmpeg
+            process.stdout.close()
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+
+    return blocks()
+
+
+class ReferencePreprocessor:
+    """Normaliza audios de referencia por bloques y cachea el resultado"""
+
+    def __init__(self, store: OutputStore, sample_rate: int = 16000, max_duration: float = 30.0,
+                 silence_threshold_db: float = -45.0, target_level_db: float = -20.0,
+                 block_seconds: float = 5.0):
+        self.store = store
+        self.sample_rate = sample_rate
+        self.max_duration = max_duration
+        self.silence_threshold_db = silence_threshold_db
+        self.silence_threshold = 10 ** (silence_threshold_db / 20)
+        self.target_level = 10 ** (target_level_db / 20)
+        self.block_seconds = block_seconds
+        settings = json.dumps([PIPELINE_VERSION, sample_rate, max_duration,
+                               silence_threshold_db, target_level_db], separators=(",", ":"))
+        self._settings = settings.encode("utf-8")
+        self.processed = 0
+        self.reused = 0
+
+    def cache_key(self, audio_hash: str) -> str:
+        """Clave de la referencia procesada: hash del upload y parámetros"""
+        return hashlib.sha256(audio_hash.encode("ascii") + b":" + self._settings).hexdigest()
+
+    def process(self, audio_path: str, audio_hash: str) -> Tuple[Optional[str], QualityReport]:
+        """
+        (ruta de la referencia procesada, informe de calidad). La ruta es None
+        si el audio no contiene voz. Lanza ReferenceDecodeError si el formato
+        no se puede decodificar aquí.
+        """
+        key = self.cache_key(audio_hash)
+        name = f"{key}.wav"
+        report = self._cached_report(key)
+        if report is not None and (self.store.exists(name) or 'no_speech' in report.issues):
+            self.reused += 1
+            # Reutilizada: que el janitor no la borre mientras un trabajo la espera
+            self.store.touch(name)
+            self.store.touch(f"{key}.json")
+            with span('reference_preprocess', cached=True):
+                return (self.store.path(name) if self.store.exists(name) else None), report
+
+        with span('reference_preprocess', cached=False) as current:
+            samples, report = self.render(*self.decode(audio_path))
+            path = None
+            if len(samples):
+                temp_path = self.store.temp_path("wav")
+                with open(temp_path, "wb") as f:
+                    f.write(encode_wav(samples, self.sample_rate))
+                path = self.store.path(self.store.commit_as(temp_path, key, "wav"))
+            self._save_report(key, report)
+            if current is not None:
+                current.attrs.update(duration=report.duration, score=report.score)
+        self.processed += 1
+        return path, report
+
+    def analyze(self, audio_path: str, audio_hash: str) -> QualityReport:
+        """
+        Sólo el informe de calidad (con el preprocesado desactivado). Lanza
+        ReferenceDecodeError si el formato no se puede decodificar aquí.
+        """
+        key = self.cache_key(audio_hash)
+        report = self._cached_report(key)
+        if report is not None:
+            self.store.touch(f"{key}.json")
+            return report
+        with span('reference_analyze'):
+            _, report = self.render(*self.decode(audio_path))
+            self._save_report(key, report)
+        return report
+
+    def _save_report(self, key: str, report: QualityReport) -> None:
+        # El informe se guarda junto al WAV: un upload repetido no se vuelve a analizar
+        temp_path = self.store.temp_path("json")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(report.to_dict(), f)
+        self.store.commit_as(temp_path, key, "json")
+
+    def _cached_report(self, key: str) -> Optional[QualityReport]:
+        try:
+            with open(self.store.path(f"{key}.json"), encoding="utf-8") as f:
+                return QualityReport.from_dict(json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def decode(self, audio_path: str) -> Tuple[int, Iterator[np.ndarray]]:
+        """(frecuencia, bloques mono float32) del audio de entrada"""
+        try:
+            return iter_wav_blocks(audio_path, self.block_seconds)
+        except (wave.Error, EOFError):
+            # No es WAV PCM: ffmpeg entrega ya mono a la frecuencia objetivo
+            return self.sample_rate, _ffmpeg_blocks(audio_path, self.sample_rate,
+                                                    int(self.block_seconds * self.sample_rate))
+
+    def render(self, source_rate: int, blocks: Iterator[np.ndarray]) -> Tuple[np.ndarray, QualityReport]:
+        """
+        Remuestrear, recortar silencios, limitar duración y normalizar. El
+        análisis de calidad se hace antes de normalizar, y la saturación se
+        mide sobre las muestras originales.
+        """
+        resampler = StreamResampler(source_rate, self.sample_rate)
+        frame = max(1, int(FRAME_SECONDS * self.sample_rate))
+        pad = int(PAD_SECONDS * self.sample_rate)
+        max_samples = int(self.max_duration * self.sample_rate)
+
+        kept: List[np.ndarray] = []
+        total = 0
+        decoded = clipped = 0
+        # Hasta encontrar voz sólo se guarda la cola del bloque anterior (margen)
+        pending: Optional[np.ndarray] = np.zeros(0, dtype=np.float32)
+        try:
+            for block in blocks:
+                decoded += len(block)
+                clipped += int(np.count_nonzero(np.abs(block) >= CLIP_LEVEL))
+                samples = resampler.process(block)
+                if pending is not None:
+                    samples = np.concatenate((pending, samples))
+                    voiced = np.flatnonzero(frame_rms(samples, frame) >= self.silence_threshold)
+                    if len(voiced) == 0:
+                        pending = samples[max(0, len(samples) - pad - frame):]
+                        continue
+                    samples = samples[max(0, voiced[0] * frame - pad):]
+                    pending = None
+                take = min(len(samples), max_samples - total)
+                kept.append(samples[:take])
+                total += take
+                if total >= max_samples:
+                    break
+        finally:
+            close = getattr(blocks, "close", None)
+            if close is not None:
+                close()
+
+        audio = np.concatenate(kept) if kept else np.zeros(0, dtype=np.float32)
+        if len(audio):
+            audio -= audio.mean()
+
+        # Recorte final y normalización con el RMS de las ventanas con voz
+        levels = frame_rms(audio, frame)
+        voiced = np.flatnonzero(levels >= self.silence_threshold)
+        if len(voiced):
+            audio = audio[:min(len(audio), (voiced[-1] + 1) * frame + pad)]
+        report = analyze(audio, self.sample_rate, self.silence_threshold_db,
+                         clipping_rate=clipped / decoded if decoded else 0.0)
+        if len(voiced):
+            level = float(np.sqrt(np.mean(np.square(levels[voiced]))))
+            gain = self.target_level / level if level > 0 else 1.0
+            peak = float(np.max(np.abs(audio))) if len(audio) else 0.0
+            if peak * gain > PEAK_LIMIT:
+                gain = PEAK_LIMIT / peak
+            audio *= gain
+        return audio.astype(np.float32, copy=False), report
+
+    def stats(self):
+        return {'processed': self.processed, 'reused': self.reused, **self.store.stats()}
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Control de calidad del audio de referencia antes de clonar.
+
+Un análisis vectorizado de las ventanas de 20 ms da la duración, la
+proporción de voz (VAD por energía con umbral relativo al suelo de ruido),
+la tasa de muestras saturadas y una estimación de SNR (energía de las
+ventanas con voz frente a las de pausa). Con eso se calcula una
+puntuación entre 0 y 1; las referencias que no llegan al umbral se
+rechazan en milisegundos, antes de llamar a /v1/voices/add o al encoder
+de hablante de Coqui.
+"""
+
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from audio_probe import UploadRejected
+from audio_utils import frame_rms
+
+
+FRAME_SECONDS = 0.02
+# Una muestra se considera saturada a partir de este valor absoluto
+CLIP_LEVEL = 0.99
+# Margen sobre el suelo de ruido para que una ventana cuente como voz (dB)
+VAD_MARGIN_DB = 6.0
+# SNR máxima reportada (pausas en silencio digital)
+MAX_SNR_DB = 60.0
+
+# Valores a partir de los cuales cada componente puntúa 1
+GOOD_DURATION = 10.0
+GOOD_SPEECH_RATIO = 0.5
+GOOD_SNR_DB = 25.0
+MIN_SNR_DB = 5.0
+MAX_CLIPPING_RATE = 0.01
+
+# Umbrales de los problemas que se explican al usuario
+ISSUE_SPEECH_RATIO = 0.3
+ISSUE_CLIPPING_RATE = 0.001
+ISSUE_SNR_DB = 15.0
+
+ISSUE_MESSAGES = {
+    'no_speech': 'no contiene voz',
+    'too_short': 'es demasiado corto',
+    'mostly_silent': 'es casi todo silencio',
+    'clipped': 'está saturado',
+    'noisy': 'tiene demasiado ruido',
+}
+
+
+@dataclass
+class QualityReport:
+    """Resultado del análisis de una referencia"""
+    duration: float
+    speech_ratio: float
+    clipping_rate: float
+    snr_db: float
+    score: float
+    issues: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QualityReport":
+        return cls(**data)
+
+
+def _clip01(value: float) -> float:
+    return float(min(1.0, max(0.0, value)))
+
+
+def analyze(samples: np.ndarray, sample_rate: int, silence_threshold_db: float = -45.0,
+            clipping_rate: Optional[float] = None) -> QualityReport:
+    """
+    Analizar una referencia mono. clipping_rate puede venir calculado sobre
+    las muestras originales (antes de remuestrear o normalizar).
+    """
+    duration = len(samples) / sample_rate
+    frame = max(1, int(FRAME_SECONDS * sample_rate))
+    power = np.square(frame_rms(samples, frame))
+    if len(power) == 0:
+        return QualityReport(round(duration, 3), 0.0, 0.0, 0.0, 0.0, ['no_speech'])
+
+    if clipping_rate is None:
+        clipping_rate = float(np.count_nonzero(np.abs(samples) >= CLIP_LEVEL)) / len(samples)
+
+    levels_db = 10 * np.log10(np.maximum(power, 1e-12))
+    audible = levels_db > silence_threshold_db
+    noise_db = float(np.percentile(levels_db, 10))
+    voiced = audible & (levels_db > noise_db + VAD_MARGIN_DB)
+    speech_ratio = float(np.mean(voiced))
+
+    if voiced.any():
+        speech_power = float(np.mean(power[voiced]))
+        pauses = power[~voiced]
+        noise_power = float(np.mean(pauses)) if len(pauses) else float(np.percentile(power, 10))
+    else:
+        # Nada destaca sobre el suelo: la voz (si la hay) está enterrada en ruido
+        speech_power = float(np.percentile(power, 90))
+        noise_power = float(np.percentile(power, 10))
+    if noise_power < 1e-10:
+        snr_db = MAX_SNR_DB if speech_power >= 1e-10 else 0.0
+    else:
+        snr_db = float(min(MAX_SNR_DB, max(0.0, 10 * np.log10(speech_power / noise_power))))
+
+    # Media geométrica: un componente a cero anula la puntuación
+    components = (
+        _clip01(duration / GOOD_DURATION),
+        _clip01(speech_ratio / GOOD_SPEECH_RATIO),
+        _clip01(1 - clipping_rate / MAX_CLIPPING_RATE),
+        _clip01((snr_db - MIN_SNR_DB) / (GOOD_SNR_DB - MIN_SNR_DB)),
+    )
+    score = float(np.prod(components) ** (1 / len(components)))
+
+    issues = []
+    if not audible.any():
+        issues.append('no_speech')
+    elif snr_db < ISSUE_SNR_DB:
+        issues.append('noisy')
+    if voiced.any() and speech_ratio < ISSUE_SPEECH_RATIO:
+        issues.append('mostly_silent')
+    if clipping_rate > ISSUE_CLIPPING_RATE:
+        issues.append('clipped')
+
+    return QualityReport(
+        duration=round(duration, 3),
+        speech_ratio=round(speech_ratio, 3),
+        clipping_rate=round(clipping_rate, 5),
+        snr_db=round(snr_db, 1),
+        score=round(score, 3),
+        issues=issues,
+    )
+
+
+class QualityGate:
+    """Rechaza referencias por debajo de la puntuación o duración mínimas"""
+
+    def __init__(self, min_score: float = 0.5, min_duration: float = 3.0):
+        self.min_score = min_score
+        self.min_duration = min_duration
+        self.checked = 0
+        self.rejected = 0
+
+    def check_duration(self, duration: Optional[float]) -> None:
+        """
+        Comprobación mínima cuando el audio no se puede decodificar (p. ej.
+        MP3 sin ffmpeg): sólo la duración leída de la cabecera, que incluye
+        los silencios. Si tampoco se conoce, no se puede juzgar.
+        """
+        self.checked += 1
+        if duration is None or duration >= self.min_duration:
+            return
+        self.rejected += 1
+        raise UploadRejected(
+            'REFERENCE_QUALITY_TOO_LOW',
+            f"El audio de referencia es demasiado corto ({duration:.1f}s, mínimo {self.min_duration:.1f}s)",
+            422,
+            min_duration=self.min_duration,
+            duration=round(duration, 3),
+            issues=['too_short'],
+        )
+
+    def check(self, report: QualityReport) -> None:
+        """Lanza UploadRejected (REFERENCE_QUALITY_TOO_LOW) si no pasa"""
+        self.checked += 1
+        if report.score >= self.min_score and report.duration >= self.min_duration:
+            return
+        self.rejected += 1
+        issues = list(report.issues)
+        if report.duration < self.min_duration and 'no_speech' not in issues:
+            issues.insert(0, 'too_short')
+        reasons = [ISSUE_MESSAGES[issue] for issue in issues] or ['tiene una calidad insuficiente']
+        raise UploadRejected(
+            'REFERENCE_QUALITY_TOO_LOW',
+            f"El audio de referencia {', '.join(reasons)} (puntuación {report.score:.2f}, "
+            f"mínimo {self.min_score:.2f})",
+            422,
+            min_score=self.min_score,
+            min_duration=self.min_duration,
+            **{**report.to_dict(), 'issues': issues},
+        )
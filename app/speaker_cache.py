@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Cache de embeddings de hablante para la clonación de voz con Coqui.
+
+El encoder de hablante sólo se ejecuta la primera vez que se ve un audio de
+referencia; el resultado (d-vector o latentes de condicionamiento) se guarda
+como arrays NumPy comprimidos en disco y en un LRU en memoria, indexado por
+el hash del audio y el modelo que lo generó.
+"""
+
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from audio_cache import file_sha256
+
+
+class SpeakerEmbeddingCache:
+    """Embeddings de hablante en disco (.npz) con LRU en memoria"""
+
+    def __init__(self, cache_dir: str, memory_items: int = 16):
+        self.cache_dir = Path(cache_dir)
+        self.memory_items = memory_items
+        self._memory: "OrderedDict[str, Dict[str, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model_name: str, audio_hash: str) -> str:
+        """Los embeddings dependen del modelo: se incluye en la clave"""
+        model_slug = re.sub(r'[^A-Za-z0-9_.-]+', '--', model_name)
+        return f"{model_slug}__{audio_hash}"
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.npz"
+
+    def get(self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        """Obtener un embedding cacheado, o None"""
+        with self._lock:
+            embedding = self._memory.get(key)
+            if embedding is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return embedding
+
+        path = self._path(key)
+        if not path.exists():
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with np.load(path) as data:
+            embedding = {name: data[name] for name in data.files}
+        with self._lock:
+            self.hits += 1
+            self._remember(key, embedding)
+        return embedding
+
+    def put(self, key: str, embedding: Dict[str, np.ndarray]) -> None:
+        """Guardar un embedding en disco (escritura atómica) y en memoria"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=str(self.cache_dir), suffix=".npz.tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez_compressed(f, **embedding)
+        os.replace(tmp_path, self._path(key))
+        with self._lock:
+            self._remember(key, embedding)
+
+    def _remember(self, key: str, embedding: Dict[str, np.ndarray]) -> None:
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get_or_compute(self, model_name: str, audio_path: Optional[str],
+                       compute: Callable[[], Dict[str, np.ndarray]],
+                       audio_hash: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """Devolver el embedding cacheado o calcularlo con compute()"""
+        if audio_hash is None:
+            audio_hash = file_sha256(audio_path)
+        key = self.make_key(model_name, audio_hash)
+
+        embedding = self.get(key)
+        if embedding is None:
+            embedding = compute()
+            self.put(key, embedding)
+        return embedding
+
+
+_cache: Optional[SpeakerEmbeddingCache] = None
+
+
+def get_speaker_cache() -> SpeakerEmbeddingCache:
+    """
+    Cache global del proceso. Se configura por variables de entorno porque
+    se usa dentro de venv-coqui, donde no se carga config.py.
+    """
+    global _cache
+    if _cache is None:
+        _cache = SpeakerEmbeddingCache(
+            os.getenv("COQUI_SPEAKER_CACHE_DIR", "cache/speakers"),
+            int(os.getenv("COQUI_SPEAKER_CACHE_ITEMS", "16")),
+        )
+    return _cache
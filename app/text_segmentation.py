@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Segmentación de texto en español para síntesis por fragmentos.
+
+Divide el texto en oraciones (respetando abreviaturas, iniciales, números
+decimales y los signos de apertura ¿ ¡), parte las oraciones demasiado
+largas por cláusulas y agrupa el resultado en fragmentos de longitud
+máxima configurable.
+"""
+
+import re
+from typing import List
+
+
+# Abreviaturas frecuentes que terminan en punto sin cerrar la oración
+ABBREVIATIONS = {
+    "sr", "sra", "srta", "sres", "sras", "dr", "dra", "drs", "dras", "d", "dña",
+    "ud", "uds", "vd", "vds", "lic", "ing", "prof", "arq", "mtro", "mtra",
+    "etc", "pág", "págs", "núm", "nro", "no", "art", "av", "avda", "cap",
+    "ej", "p", "aprox", "tel", "dpto", "depto", "admón", "cía", "s.a", "ee.uu",
+    "ee", "uu", "vol", "fig", "ed", "min", "máx", "mín", "izq", "dcha",
+    "a.c", "d.c", "a.m", "p.m", "ref", "vs",
+}
+
+# Fin de oración: signos terminales, comillas/paréntesis de cierre y espacio
+_SENTENCE_END = re.compile(r'[.!?…]+["»”’)\]]*\s+')
+# Límites de cláusula para partir oraciones largas
+_CLAUSE_END = re.compile(r'[;:,—]\s+')
+
+
+def _is_sentence_boundary(text: str, match: re.Match) -> bool:
+    """Decidir si un signo terminal cierra realmente la oración"""
+    following = text[match.end():match.end() + 1]
+    # Continuación en minúscula: abreviatura o "¿Qué? dijo ..."
+    if following and following.islower():
+        return False
+
+    punctuation = match.group().rstrip()
+    if not punctuation.startswith('.') or punctuation.startswith('...'):
+        return True
+
+    # Palabra inmediatamente anterior al punto
+    word_match = re.search(r'([\w.]+)$', text[:match.start()])
+    if not word_match:
+        return True
+    word = word_match.group(1).lower().strip('.')
+    if word in ABBREVIATIONS:
+        return False
+    # Iniciales ("J. R. Jiménez")
+    if len(word) == 1 and word.isalpha():
+        return False
+    return True
+
+
+def split_sentences(text: str) -> List[str]:
+    """Dividir un texto en oraciones"""
+    text = " ".join(text.split())
+    sentences = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        if _is_sentence_boundary(text, match):
+            sentence = text[start:match.end()].strip()
+            if sentence:
+                sentences.append(sentence)
+            start = match.end()
+    tail = text[start:].strip()
+    if tail:
+        sentences.append(tail)
+    return sentences
+
+
+def _split_long(sentence: str, max_chars: int) -> List[str]:
+    """Partir una oración larga por cláusulas y, si hace falta, por palabras"""
+    pieces = []
+    start = 0
+    for match in _CLAUSE_END.finditer(sentence):
+        pieces.append(sentence[start:match.end()].strip())
+        start = match.end()
+    pieces.append(sentence[start:].strip())
+
+    parts = []
+    for piece in pieces:
+        if len(piece) <= max_chars:
+            parts.append(piece)
+            continue
+        current = ""
+        for word in piece.split():
+            if current and len(current) + 1 + len(word) > max_chars:
+                parts.append(current)
+                current = word
+            else:
+                current = f"{current} {word}" if current else word
+        if current:
+            parts.append(current)
+    return _pack([p for p in parts if p], max_chars)
+
+
+def _pack(parts: List[str], max_chars: int) -> List[str]:
+    """Agrupar piezas consecutivas sin superar max_chars"""
+    chunks = []
+    current = ""
+    for part in parts:
+        if current and len(current) + 1 + len(part) > max_chars:
+            chunks.append(current)
+            current = part
+        else:
+            current = f"{current} {part}" if current else part
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def segment_text(text: str, max_chars: int = 250) -> List[str]:
+    """
+    Segmentar un texto en fragmentos de como mucho max_chars caracteres,
+    cortando preferentemente en fin de oración y después en cláusulas
+    """
+    parts = []
+    for sentence in split_sentences(text):
+        if len(sentence) <= max_chars:
+            parts.append(sentence)
+        else:
+            parts.extend(_split_long(sentence, max_chars))
+    return _pack(parts, max_chars)
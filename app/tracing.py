@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Trazas por petición con identificador de correlación.
+
+Cada petición web (o trabajo de la cola) abre una traza con un request ID;
+las etapas se miden como spans anidados con reloj monotónico
+(time.perf_counter) y el contexto se propaga con contextvars. El ID viaja
+a los workers de Coqui dentro del trabajo y a ElevenLabs en la cabecera
+X-Request-ID; el worker devuelve sus propios spans, que se cuelgan del
+span que lo invocó. Al cerrar la traza se entrega a los sinks registrados
+(métricas y metrics.log, ver logger.py).
+
+Sólo depende de la biblioteca estándar: lo usan la web app y los workers.
+"""
+
+import contextvars
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# IDs aceptados desde el exterior (el resto se sustituye por uno nuevo)
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class Span:
+    """Etapa medida con reloj monotónico"""
+
+    __slots__ = ('name', 'start', 'end', 'attrs', 'children')
+
+    def __init__(self, name: str, start: Optional[float] = None, attrs: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.start = time.perf_counter() if start is None else start
+        self.end: Optional[float] = None
+        self.attrs = attrs or {}
+        self.children: List["Span"] = []
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def finish(self) -> None:
+        if self.end is None:
+            self.end = time.perf_counter()
+
+    def walk(self) -> Iterator["Span"]:
+        yield self
+        for child in list(self.children):
+            yield from child.walk()
+
+    def to_dict(self, origin: Optional[float] = None) -> Dict[str, Any]:
+        """Árbol con tiempos en ms relativos a origin (por defecto, el inicio del span)"""
+        origin = self.start if origin is None else origin
+        data = {
+            'name': self.name,
+            'start_ms': round((self.start - origin) * 1000, 3),
+            'duration_ms': round(self.duration * 1000, 3),
+        }
+        if self.attrs:
+            data['attrs'] = self.attrs
+        if self.children:
+            data['children'] = [child.to_dict(origin) for child in list(self.children)]
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], origin: float) -> "Span":
+        """Reconstruir un árbol remoto (p. ej. de un worker) anclado en origin"""
+        span = cls(data['name'], origin + data.get('start_ms', 0) / 1000, data.get('attrs'))
+        span.end = span.start + data.get('duration_ms', 0) / 1000
+        span.children = [cls.from_dict(child, origin) for child in data.get('children', [])]
+        return span
+
+
+class Trace:
+    """Árbol de spans de una petición"""
+
+    def __init__(self, name: str, request_id: Optional[str] = None):
+        self.request_id = request_id or new_request_id()
+        self.root = Span(name)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'request_id': self.request_id, **self.root.to_dict()}
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar('trace', default=None)
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar('span', default=None)
+_sinks: List[Callable[[Trace], None]] = []
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+def sanitize_request_id(value: Optional[str]) -> Optional[str]:
+    """ID recibido de un cliente, o None si no es válido"""
+    if value and _VALID_REQUEST_ID.match(value):
+        return value
+    return None
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.request_id if trace is not None else None
+
+
+def add_sink(sink: Callable[[Trace], None]) -> None:
+    """Registrar un destino para las trazas terminadas"""
+    if sink not in _sinks:
+        _sinks.append(sink)
+
+
+def start_trace(name: str, request_id: Optional[str] = None):
+    """
+    Abrir una traza y hacerla actual. Devuelve (traza, tokens); cerrar con
+    end_trace(traza, tokens) en el mismo contexto.
+    """
+    trace = Trace(name, request_id)
+    tokens = (_current_trace.set(trace), _current_span.set(trace.root))
+    return trace, tokens
+
+
+def end_trace(trace: Trace, tokens=None, emit: bool = True) -> None:
+    """Cerrar la traza, restaurar el contexto y entregarla a los sinks"""
+    trace.root.finish()
+    if tokens is not None:
+        try:
+            _current_span.reset(tokens[1])
+            _current_trace.reset(tokens[0])
+        except ValueError:
+            # Cerrada desde otro contexto (p. ej. otro hilo del servidor)
+            pass
+    if emit:
+        for sink in list(_sinks):
+            try:
+                sink(trace)
+            except Exception as e:
+                print(f"⚠️ Error emitiendo la traza {trace.request_id}: {e}")
+
+
+@contextmanager
+def trace(name: str, request_id: Optional[str] = None, emit: bool = True) -> Iterator[Span]:
+    """
+    Traza de una unidad de trabajo. Dentro de una traza ya abierta (p. ej. un
+    trabajo ejecutado en el hilo de la petición) se comporta como un span.
+    """
+    if _current_trace.get() is not None:
+        with span(name) as current:
+            yield current
+        return
+    current, tokens = start_trace(name, request_id)
+    try:
+        yield current.root
+    finally:
+        end_trace(current, tokens, emit)
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Optional[Span]]:
+    """Medir una etapa como hijo del span actual (sin traza activa no hace nada)"""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, attrs=attrs)
+    parent.children.append(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    finally:
+        child.finish()
+        _current_span.reset(token)
+
+
+def attach_remote(data: Optional[Dict[str, Any]], anchor: Optional[Span] = None) -> None:
+    """Colgar los spans devueltos por otro proceso del span indicado (o del actual)"""
+    parent = anchor or _current_span.get()
+    if parent is None or not data:
+        return
+    parent.children.append(Span.from_dict(data, parent.start))
+
+
+def bind(function: Callable) -> Callable:
+    """Ejecutar function (en otro hilo) con el contexto de traza actual"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(function, *args, **kwargs)
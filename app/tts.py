@@ -1,37 +1,86 @@
-import os
-import requests
 from dotenv import load_dotenv
+from audio_cache import get_audio_cache, make_cache_key
+from elevenlabs_client import get_client
 
 load_dotenv()
 
-API_KEY = os.getenv("ELEVENLABS_API_KEY")
 # Usamos el voice_id de "Sarah" (es compatible con español):
 VOICE_ID = "EXAVITQu4vr4xnSDxMaL"
-API_URL = f"https://api.elevenlabs.io/v1/text-to-speech/{VOICE_ID}"
+MODEL_ID = "eleven_multilingual_v2"
+OUTPUT_FORMAT = "mp3_44100_128"
+STREAM_CHUNK_SIZE = 4096
 
 
-def text_to_speech(text, output_path):
-    headers = {
-        "xi-api-key": API_KEY,
-        "Content-Type": "application/json"
-    }
-    data = {
-        "text": text,
-        "model_id": "eleven_multilingual_v2",
-        "output_format": "mp3_44100_128"
-    }
-    response = requests.post(API_URL, headers=headers, json=data)
+def synthesize_speech(text):
+    """Audio MP3 en memoria (del cache o de ElevenLabs); None si la API falla"""
+    cache = get_audio_cache()
+    cache_key = make_cache_key("elevenlabs", text, VOICE_ID, MODEL_ID, OUTPUT_FORMAT)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+    response = get_client().text_to_speech(text, VOICE_ID, MODEL_ID, OUTPUT_FORMAT)
     if response.status_code == 200:
-        with open(output_path, "wb") as f:
-            f.write(response.content)
-        print(f"Audio guardado en {output_path}")
+        cache.put(cache_key, response.content, "mp3")
+        return response.content
     else:
         print("Error:", response.text)
+        return None
+
+def text_to_speech(text, output_path):
+    audio = synthesize_speech(text)
+    if audio is None:
+        return False
+    with open(output_path, "wb") as f:
+        f.write(audio)
+    print(f"Audio guardado en {output_path}")
+    return True
+
+def stream_text_to_speech(text, chunk_size=STREAM_CHUNK_SIZE, use_cache=True):
+    """
+    Devuelve un iterador de chunks de audio (MP3) a medida que ElevenLabs
+    los genera. La petición se hace antes de devolver el iterador, de modo
+    que los errores de la API se lanzan aquí y no a mitad del stream.
+    Si use_cache, el audio completo se guarda en el cache al terminar.
+    """
+    cache = get_audio_cache()
+    cache_key = make_cache_key("elevenlabs", text, VOICE_ID, MODEL_ID, OUTPUT_FORMAT)
+    if use_cache:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return (cached[i:i + chunk_size] for i in range(0, len(cached), chunk_size))
+    response = get_client().text_to_speech(text, VOICE_ID, MODEL_ID, OUTPUT_FORMAT, stream=True)
+    if response.status_code != 200:
+        message = response.text
+        response.close()
+        raise RuntimeError(f"Error de ElevenLabs ({response.status_code}): {message}")
+    return _iter_stream(response, chunk_size, cache if use_cache else None, cache_key)
+
+def _iter_stream(response, chunk_size, cache, cache_key):
+    """Reenvía los chunks de la respuesta y los copia al cache (tee)"""
+    chunks = []
+    try:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            if chunk:
+                if cache is not None:
+                    chunks.append(chunk)
+                yield chunk
+    finally:
+        response.close()
+    # Sólo se cachea si el stream se consumió completo
+    if cache is not None and chunks:
+        cache.put(cache_key, b"".join(chunks), "mp3")
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Demo ElevenLabs TTS")
     parser.add_argument('--text', type=str, required=True, help='Texto a convertir en voz')
     parser.add_argument('--output', type=str, default="static/tts_output.mp3", help='Ruta de salida del audio')
+    parser.add_argument('--stream', action='store_true', help='Usar el endpoint de streaming')
     args = parser.parse_args()
-    text_to_speech(args.text, args.output) 
\ No newline at end of file
+    if args.stream:
+        with open(args.output, "wb") as f:
+            for chunk in stream_text_to_speech(args.text):
+                f.write(chunk)
+        print(f"Audio guardado en {args.output}")
+    else:
+        text_to_speech(args.text, args.output) 
\ No newline at end of file
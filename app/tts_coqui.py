@@ -1,106 +1,233 @@
 import sys
 import os
-import subprocess
+import tempfile
+import threading
+import time
 import argparse
 
+import espeak_backend
+from tracing import span
+
+class LocalTTSEngine:
+    """
+    Motores locales (pyttsx3, espeak) con estado caliente: el driver de
+    pyttsx3 se inicializa una sola vez, la voz en español se resuelve una
+    vez y se guarda su id, y la disponibilidad de espeak se comprueba al
+    inicializar. Pensado para procesos de larga vida (coqui_worker).
+    """
+
+    def __init__(self, rate=150, language="es"):
+        self.rate = rate
+        self.language = language
+        self.voice_id = None
+        self.voice_name = None
+        self.espeak_path = None
+        self.init_time = None
+        self._engine = None
+        self._espeak = None
+        self._pyttsx3_error = None
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    def initialize(self):
+        """Inicializar pyttsx3 y comprobar espeak (sólo la primera vez)"""
+        with self._lock:
+            if self._initialized:
+                return
+            start_time = time.monotonic()
+            self.espeak_path = espeak_backend.find_library() or espeak_backend.find_executable()
+            if self.espeak_path:
+                # Servidores persistentes con libespeak; si no, el ejecutable con concurrencia acotada
+                self._espeak = espeak_backend.get_espeak_pool(self.language, self.rate)
+            self._init_pyttsx3()
+            self._initialized = True
+            self.init_time = time.monotonic() - start_time
+            print(f"🔧 Motores locales listos en {self.init_time:.2f}s "
+                  f"(pyttsx3: {'sí' if self._engine else 'no'}, espeak: {self.espeak_path or 'no'})")
+
+    def _init_pyttsx3(self):
+        try:
+            import pyttsx3
+            engine = pyttsx3.init()
+        except Exception as e:
+            self._engine = None
+            self._pyttsx3_error = str(e)
+            print(f"❌ Error con pyttsx3: {e}")
+            return
+
+        if self.voice_id is None:
+            # Configurar voz en español si está disponible (se resuelve una vez)
+            voices = engine.getProperty('voices')
+            print(f"🎤 Voces disponibles: {len(voices)}")
+            for voice in voices:
+                if 'spanish' in voice.name.lower() or self.language in voice.id.lower():
+                    self.voice_id = voice.id
+                    self.voice_name = voice.name
+                    print(f"🎤 Voz en español seleccionada: {voice.name}")
+                    break
+        if self.voice_id:
+            engine.setProperty('voice', self.voice_id)
+        engine.setProperty('rate', self.rate)  # Velocidad moderada
+        self._engine = engine
+        self._pyttsx3_error = None
+
+    def render_pyttsx3(self, text):
+        """WAV con pyttsx3 (su driver sólo sabe escribir a archivo: temporal y lectura)"""
+        if self._engine is None:
+            return None
+        fd, temp_path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            with self._lock:
+                try:
+                    self._engine.save_to_file(text, temp_path)
+                    self._engine.runAndWait()
+                except Exception as e:
+                    print(f"❌ Error con pyttsx3: {e}")
+                    # El driver quedó en mal estado: reinicializar en la próxima llamada
+                    self._init_pyttsx3()
+                    return None
+            with open(temp_path, "rb") as f:
+                data = f.read()
+        finally:
+            os.unlink(temp_path)
+
+        if data:
+            print(f"✅ Audio generado con pyttsx3 ({len(data)} bytes)")
+            return data
+        print("❌ pyttsx3 no generó audio")
+        return None
+
+    def render_espeak(self, text):
+        """WAV con espeak, en memoria"""
+        if self._espeak is None:
+            return None
+        try:
+            pcm, sample_rate = self._espeak.synthesize(text)
+        except (espeak_backend.EspeakError, OSError) as e:
+            print(f"❌ Error ejecutando espeak: {e}")
+            return None
+
+        data = espeak_backend.encode_wav(pcm, sample_rate)
+        print(f"✅ Audio generado con espeak ({len(data)} bytes)")
+        return data
+
+    def render_placeholder(self):
+        """Último recurso: un segundo de silencio"""
+        sample_rate = 22050
+        data = espeak_backend.encode_wav(b"\0\0" * sample_rate, sample_rate)
+        print(f"⚠️ Audio placeholder generado ({len(data)} bytes) - TTS no disponible")
+        return data
+
+    def render_with_backend(self, text):
+        """
+        (WAV en memoria, motor que lo generó) con el primer motor disponible.
+        El motor es 'placeholder' si sólo se pudo generar silencio: ese audio
+        no debe cachearse.
+        """
+        self.initialize()
+        with span('synthesis', engine='local') as current:
+            for backend, render in (('pyttsx3', self.render_pyttsx3), ('espeak', self.render_espeak)):
+                data = render(text)
+                if data:
+                    break
+            else:
+                backend, data = 'placeholder', self.render_placeholder()
+            if current is not None:
+                current.attrs['backend'] = backend
+            return data, backend
+
+    def render(self, text):
+        """WAV en memoria con el primer motor disponible"""
+        return self.render_with_backend(text)[0]
+
+    @staticmethod
+    def _save(data, output_path):
+        if not data:
+            return False
+        with open(output_path, "wb") as f:
+            f.write(data)
+        return True
+
+    def synthesize_pyttsx3(self, text, output_path):
+        return self._save(self.render_pyttsx3(text), output_path)
+
+    def synthesize_espeak(self, text, output_path):
+        return self._save(self.render_espeak(text), output_path)
+
+    def synthesize_placeholder(self, output_path):
+        return self._save(self.render_placeholder(), output_path)
+
+    def synthesize(self, text, output_path):
+        """Sintetizar con el primer motor disponible y guardar en output_path"""
+        return self._save(self.render(text), output_path)
+
+    def info(self):
+        """Estado de los motores locales"""
+        return {
+            'initialized': self._initialized,
+            'pyttsx3': self._engine is not None,
+            'pyttsx3_error': self._pyttsx3_error,
+            'voice_id': self.voice_id,
+            'voice_name': self.voice_name,
+            'espeak': self.espeak_path,
+            'espeak_servers': self._espeak is not None and self._espeak.use_library,
+            'init_time': self.init_time,
+        }
+
+
+_local_engine = None
+_local_engine_lock = threading.Lock()
+
+
+def get_local_engine():
+    """Motor local compartido por todo el proceso"""
+    global _local_engine
+    with _local_engine_lock:
+        if _local_engine is None:
+            _local_engine = LocalTTSEngine()
+        return _local_engine
+
+
+def tts_coqui_render(text, model_name="fallback"):
+    """
+    Convierte texto a voz (WAV en memoria) usando alternativas compatibles
+    con Python 3.12. Devuelve (audio o None, motor usado).
+    :param text: Texto a convertir
+    :param model_name: Modelo (no usado en fallbacks)
+    """
+    print(f"🔊 Iniciando TTS alternativo para: '{text}'")
+    data, backend = get_local_engine().render_with_backend(text)
+    if not data:
+        print("❌ Todos los métodos fallaron")
+    return data, backend
+
+
+def tts_coqui_audio(text, model_name="fallback"):
+    """Como tts_coqui_render, pero sólo el audio (None si todos los métodos fallan)"""
+    return tts_coqui_render(text, model_name)[0]
+
+
 def tts_coqui(text, output_path, model_name="fallback"):
     """
-    Convierte texto a voz usando alternativas compatibles con Python 3.12.
+    Convierte texto a voz y lo guarda en output_path (WAV).
     :param text: Texto a convertir
     :param output_path: Ruta de salida WAV
     :param model_name: Modelo (no usado en fallbacks)
     """
-    print(f"🔊 Iniciando TTS alternativo para: '{text}'")
-    print(f"📁 Archivo de salida: {output_path}")
+    data = tts_coqui_audio(text, model_name)
+    if not data:
+        return False
     
     # Crear directorio de salida si no existe
     output_dir = os.path.dirname(output_path)
     if output_dir and not os.path.exists(output_dir):
         os.makedirs(output_dir, exist_ok=True)
         print(f"📁 Directorio creado: {output_dir}")
-    
-    try:
-        # Intentar usar pyttsx3 primero
-        print("🔧 Intentando pyttsx3...")
-        import pyttsx3
-        engine = pyttsx3.init()
-        
-        # Configurar velocidad y voz en español si está disponible
-        voices = engine.getProperty('voices')
-        print(f"🎤 Voces disponibles: {len(voices)}")
-        
-        for voice in voices:
-            if 'spanish' in voice.name.lower() or 'es' in voice.id.lower():
-                engine.setProperty('voice', voice.id)
-                print(f"🎤 Voz en español seleccionada: {voice.name}")
-                break
-        
-        engine.setProperty('rate', 150)  # Velocidad moderada
-        engine.save_to_file(text, output_path)
-        engine.runAndWait()
-        
-        # Verificar si el archivo se creó
-        if os.path.exists(output_path):
-            file_size = os.path.getsize(output_path)
-            print(f"✅ Audio generado con pyttsx3 en {output_path} ({file_size} bytes)")
-            return True
-        else:
-            print("❌ pyttsx3 no creó el archivo")
-            
-    except Exception as e:
-        print(f"❌ Error con pyttsx3: {e}")
-    
-    # Fallback a espeak
-    try:
-        print("🔧 Intentando espeak...")
-        # Verificar si espeak está disponible
-        subprocess.run(['which', 'espeak'], check=True, capture_output=True)
-        
-        # Usar espeak como alternativa
-        cmd = [
-            'espeak', 
-            '-v', 'es',  # Voz en español
-            '-s', '150', # Velocidad
-            '-w', output_path,  # Guardar en archivo WAV
-            text
-        ]
-        print(f"🔧 Ejecutando: {' '.join(cmd)}")
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-        
-        if os.path.exists(output_path):
-            file_size = os.path.getsize(output_path)
-            print(f"✅ Audio generado con espeak en {output_path} ({file_size} bytes)")
-            return True
-        else:
-            print("❌ espeak no creó el archivo")
-            
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Error ejecutando espeak: {e}")
-    except Exception as e:
-        print(f"❌ Error con espeak: {e}")
-    
-    # Último fallback: crear un archivo de audio silencioso como placeholder
-    try:
-        print("🔧 Creando archivo placeholder...")
-        import numpy as np
-        import soundfile as sf
-        
-        # Crear un segundo de silencio como placeholder
-        sample_rate = 22050
-        duration = 1.0
-        silence = np.zeros(int(sample_rate * duration))
-        sf.write(output_path, silence, sample_rate)
-        
-        if os.path.exists(output_path):
-            file_size = os.path.getsize(output_path)
-            print(f"⚠️ Archivo placeholder creado en {output_path} ({file_size} bytes) - TTS no disponible")
-            return True
-        
-    except Exception as e:
-        print(f"❌ Error creando placeholder: {e}")
-    
-    print("❌ Todos los métodos fallaron")
-    return False
+    with open(output_path, "wb") as f:
+        f.write(data)
+    print(f"📁 Archivo de salida: {output_path}")
+    return True
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Demo TTS con alternativas compatibles Python 3.12")
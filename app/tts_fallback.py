@@ -2,17 +2,17 @@
 """
 Script TTS alternativo para cuando Coqui no está disponible
 """
-import subprocess
 import sys
-import os
+
+import espeak_backend
 
 def tts_with_espeak(text, output_path):
-    """TTS usando espeak"""
+    """TTS usando espeak (pool compartido de servidores libespeak si está disponible)"""
     try:
-        cmd = ['espeak', '-s', '150', '-p', '50', '-w', output_path, text]
-        subprocess.run(cmd, check=True)
+        pcm, sample_rate = espeak_backend.synthesize(text, voice='default', rate=150, pitch=50)
+        espeak_backend.write_wav(output_path, pcm, sample_rate)
         return True
-    except (subprocess.CalledProcessError, FileNotFoundError):
+    except (espeak_backend.EspeakError, OSError):
         return False
 
 def tts_with_pyttsx3(text, output_path):
@@ -1,15 +1,10 @@
-import os
-import requests
 from dotenv import load_dotenv
+from audio_cache import file_sha256
+from elevenlabs_client import get_client
+from voice_registry import get_voice_registry
 
 load_dotenv()
 
-API_KEY = os.getenv("ELEVENLABS_API_KEY")
-# Endpoint para crear una voz clonada (IVC)
-VOICE_CLONE_URL = "https://api.elevenlabs.io/v1/voices/add"
-# Endpoint para TTS con voz clonada
-TTS_CLONE_URL = "https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
-
 
 def mostrar_mensaje_error(respuesta):
     try:
@@ -30,45 +25,65 @@ def mostrar_mensaje_error(respuesta):
         print("[ERROR] No se pudo interpretar la respuesta de error de la API.")
         print(respuesta.text)
 
-def clone_voice_and_tts(audio_path, text, output_path):
-    headers = {
-        "xi-api-key": API_KEY
-    }
-    files = {
-        "files": open(audio_path, "rb")
-    }
-    data = {
-        "name": "VozClonadaDemo"
-    }
-    # Paso 1: Crear la voz clonada
-    response = requests.post(VOICE_CLONE_URL, headers=headers, files=files, data=data)
+def create_cloned_voice(audio_path, name):
+    # Crear la voz clonada (IVC)
+    response = get_client().add_voice(name, audio_path)
     if response.status_code == 200:
         voice_id = response.json().get("voice_id")
         print(f"Voz clonada creada con voice_id: {voice_id}")
-    else:
-        mostrar_mensaje_error(response)
-        return
+        return voice_id
+    mostrar_mensaje_error(response)
+    return None
+
+def delete_cloned_voice(voice_id):
+    response = get_client().delete_voice(voice_id)
+    if response.status_code in (200, 404):
+        print(f"Voz clonada eliminada: {voice_id}")
+        return True
+    mostrar_mensaje_error(response)
+    return False
+
+def clone_voice_and_tts(audio_path, text, audio_hash=None, _retry=True):
+    """Audio MP3 en memoria con la voz de audio_path; None si falla"""
+    registry = get_voice_registry()
+    audio_hash = audio_hash or file_sha256(audio_path)
+    # Paso 1: Reutilizar la voz si ya se clonó este audio, o crearla
+    with registry.locked(audio_hash):
+        voice_id = registry.lookup(audio_hash)
+        reused = voice_id is not None
+        if reused:
+            print(f"Reutilizando voz clonada con voice_id: {voice_id}")
+        else:
+            name = f"VozClonadaDemo-{audio_hash[:8]}"
+            voice_id = create_cloned_voice(audio_path, name)
+            if not voice_id:
+                return None
+            # Sólo se desaloja cuando la voz nueva ya existe
+            for evicted_voice_id in registry.register(audio_hash, voice_id, name):
+                delete_cloned_voice(evicted_voice_id)
     # Paso 2: Usar la voz clonada para TTS
-    tts_url = TTS_CLONE_URL.format(voice_id=voice_id)
-    headers_tts = {
-        "xi-api-key": API_KEY,
-        "Content-Type": "application/json"
-    }
-    data_tts = {
-        "text": text,
-        "model_id": "eleven_multilingual_v2",
-        "output_format": "mp3_44100_128"
-    }
-    response_tts = requests.post(tts_url, headers=headers_tts, json=data_tts)
+    response_tts = get_client().text_to_speech(text, voice_id, "eleven_multilingual_v2", "mp3_44100_128")
     if response_tts.status_code == 200:
-        with open(output_path, "wb") as f:
-            f.write(response_tts.content)
-        print(f"Audio clonado guardado en {output_path}")
+        return response_tts.content
+    elif response_tts.status_code == 404 and reused and _retry:
+        # La voz ya no existe en ElevenLabs: olvidarla y clonar de nuevo
+        registry.forget(audio_hash)
+        return clone_voice_and_tts(audio_path, text, audio_hash, _retry=False)
     else:
         mostrar_mensaje_error(response_tts)
+        return None
+
+def clone_voice_audio(audio_path, text, audio_hash=None):
+    return clone_voice_and_tts(audio_path, text, audio_hash)
 
 def clone_voice(audio_path, text, output_path):
-    return clone_voice_and_tts(audio_path, text, output_path)
+    audio = clone_voice_and_tts(audio_path, text)
+    if audio is None:
+        return False
+    with open(output_path, "wb") as f:
+        f.write(audio)
+    print(f"Audio clonado guardado en {output_path}")
+    return True
 
 if __name__ == "__main__":
     import argparse
@@ -1,9 +1,155 @@
 import argparse
 import os
-import sys
-import tempfile
-import subprocess
-from pathlib import Path
+
+from model_catalog import get_model_catalog
+from tracing import span
+
+# Modelos ya cargados en este proceso (los workers persistentes los reutilizan)
+_loaded_models = {}
+
+def load_tts_model(model_name):
+    """
+    Carga un modelo de Coqui TTS una sola vez por proceso
+    """
+    if model_name not in _loaded_models:
+        from TTS.api import TTS
+        
+        print(f"📦 Cargando modelo: {model_name}")
+        _loaded_models[model_name] = TTS(model_name)
+    return _loaded_models[model_name]
+
+def warmup_tts_model(tts, text, language="es"):
+    """
+    Síntesis de calentamiento: fuerza las reservas de memoria y rutas
+    perezosas del modelo antes de la primera petición real
+    """
+    kwargs = {}
+    if getattr(tts, "is_multi_lingual", False) and tts.languages:
+        kwargs["language"] = language if language in tts.languages else tts.languages[0]
+    if getattr(tts, "is_multi_speaker", False) and tts.speakers:
+        kwargs["speaker"] = tts.speakers[0]
+    tts.tts(text=text, **kwargs)
+
+def compute_speaker_embedding(tts, audio_path):
+    """
+    Calcula el embedding de hablante de un audio de referencia
+    (d-vector para YourTTS, latentes de condicionamiento para XTTS)
+    """
+    import numpy as np
+    
+    model = tts.synthesizer.tts_model
+    if hasattr(model, "get_conditioning_latents"):
+        gpt_cond_latent, speaker_embedding = model.get_conditioning_latents(audio_path=[audio_path])
+        return {
+            "gpt_cond_latent": gpt_cond_latent.cpu().numpy(),
+            "speaker_embedding": speaker_embedding.cpu().numpy(),
+        }
+    embedding = model.speaker_manager.compute_embedding_from_clip(audio_path)
+    return {"d_vector": np.asarray(embedding, dtype=np.float32)}
+
+def synthesize_with_embedding(tts, text, embedding, language="es"):
+    """
+    Sintetiza usando un embedding ya calculado, sin volver a pasar el audio
+    de referencia por el encoder de hablante. Devuelve las muestras.
+    """
+    import numpy as np
+    import torch
+    
+    synthesizer = tts.synthesizer
+    model = synthesizer.tts_model
+    if "gpt_cond_latent" in embedding:
+        outputs = model.inference(
+            text,
+            language,
+            torch.from_numpy(embedding["gpt_cond_latent"]),
+            torch.from_numpy(embedding["speaker_embedding"]),
+        )
+        wav = outputs["wav"]
+    else:
+        from TTS.tts.utils.synthesis import synthesis
+        
+        language_id = None
+        if getattr(model, "language_manager", None) is not None:
+            language_id = model.language_manager.name_to_id[language]
+        wavs = []
+        for sentence in synthesizer.split_into_sentences(text):
+            outputs = synthesis(
+                model=model,
+                text=sentence,
+                CONFIG=synthesizer.tts_config,
+                use_cuda=synthesizer.use_cuda,
+                d_vector=embedding["d_vector"],
+                language_id=language_id,
+            )
+            wavs.append(np.asarray(outputs["wav"]).squeeze())
+        wav = np.concatenate(wavs)
+    return wav
+
+def encode_output(tts, wav):
+    """Muestras del modelo -> WAV en memoria a la frecuencia de salida del modelo"""
+    import numpy as np
+    from audio_utils import encode_wav
+    
+    return encode_wav(np.asarray(wav, dtype=np.float32).squeeze(), tts.synthesizer.output_sample_rate)
+
+def clone_with_cached_embedding(tts, model_name, audio_path, text, speaker_id=None):
+    """
+    Clona reutilizando el embedding cacheado del hablante (por hash del
+    audio o por speaker_id) y devuelve el WAV en memoria. Si el modelo no
+    admite embeddings directos, recurre a speaker_wav.
+    """
+    from speaker_cache import get_speaker_cache
+    
+    try:
+        embedding = get_speaker_cache().get_or_compute(
+            model_name,
+            audio_path,
+            lambda: compute_speaker_embedding(tts, audio_path),
+            audio_hash=speaker_id,
+        )
+        return encode_output(tts, synthesize_with_embedding(tts, text, embedding))
+    except Exception as e:
+        if audio_path is None:
+            raise
+        print(f"⚠️  No se pudo usar el embedding cacheado ({e}), usando speaker_wav")
+    
+    wav = tts.tts(
+        text=text,
+        speaker_wav=audio_path,
+        language="es"  # Español
+    )
+    return encode_output(tts, wav)
+
+def save_audio(data, output_path):
+    with open(output_path, "wb") as f:
+        f.write(data)
+
+def cloning_model():
+    """Modelo de clonación (COQUI_VOICE_CLONING_MODEL o el que elija el catálogo)"""
+    return get_model_catalog().pick_cloning_model(os.getenv("COQUI_VOICE_CLONING_MODEL"))
+
+def register_speaker(audio_path, model_name=None):
+    """
+    Calcula y cachea el embedding de un hablante; devuelve su speaker_id
+    (hash del audio) para sintetizar después sin el audio de referencia.
+    Sin model_name se usa el mismo modelo que la clonación, para que el
+    embedding quede bajo la clave que ésta consulta.
+    """
+    from audio_cache import file_sha256
+    from speaker_cache import get_speaker_cache
+    
+    model_name = model_name or cloning_model()
+    if not model_name:
+        raise ValueError("No hay ningún modelo de clonación de voz disponible")
+    tts = load_tts_model(model_name)
+    speaker_id = file_sha256(audio_path)
+    get_speaker_cache().get_or_compute(
+        model_name,
+        audio_path,
+        lambda: compute_speaker_embedding(tts, audio_path),
+        audio_hash=speaker_id,
+    )
+    return speaker_id
 
 def check_coqui_environment():
     """Verifica que el entorno de Coqui esté disponible"""
@@ -19,57 +165,55 @@ def check_coqui_environment():
         print("   source venv-coqui/bin/activate")
         return False
 
-def voice_cloning_coqui(audio_path, text, output_path):
+def voice_cloning_coqui(audio_path, text, output_path, speaker_id=None):
     """
-    Clona voz usando Coqui TTS con YourTTS o modelo similar
+    Clona voz usando Coqui TTS y guarda el resultado en output_path
     """
-    if not check_coqui_environment():
+    data = voice_cloning_coqui_audio(audio_path, text, speaker_id)
+    if data is None:
         return False
+    save_audio(data, output_path)
+    print(f"💾 Archivo de salida: {output_path}")
+    return True
+
+def voice_cloning_coqui_audio(audio_path, text, speaker_id=None):
+    """
+    Clona voz usando Coqui TTS con YourTTS o modelo similar y devuelve el
+    WAV en memoria (None si falla).
+    Con speaker_id (hash de un audio ya registrado) no hace falta audio_path.
+    """
+    if not check_coqui_environment():
+        return None
     
     try:
-        from TTS.api import TTS
-        
         print("🎤 Iniciando clonación de voz con Coqui TTS...")
         print(f"📁 Audio de referencia: {audio_path}")
         print(f"📝 Texto a sintetizar: {text}")
-        print(f"💾 Archivo de salida: {output_path}")
         
-        # Listar modelos disponibles
-        print("\n📋 Modelos disponibles:")
-        models = TTS.list_models()
-        tts_models = [m for m in models if "tts_models" in m]
+        # Elegir el modelo de clonación desde el catálogo indexado
+        catalog = get_model_catalog()
+        model_name = cloning_model()
         
-        # Buscar modelos que soporten clonación de voz
-        voice_cloning_models = [
-            m for m in tts_models 
-            if any(keyword in m.lower() for keyword in ["yourtts", "voice_cloning", "multilingual"])
-        ]
-        
-        if not voice_cloning_models:
+        if not model_name:
             print("⚠️  No se encontraron modelos de clonación de voz")
             print("📦 Modelos TTS disponibles:")
-            for i, model in enumerate(tts_models[:5]):  # Mostrar solo los primeros 5
-                print(f"   {i+1}. {model}")
-            return False
+            for i, info in enumerate(catalog.models()[:5]):  # Mostrar solo los primeros 5
+                print(f"   {i+1}. {info.name}")
+            return None
         
-        # Usar el primer modelo de clonación disponible
-        model_name = voice_cloning_models[0]
         print(f"🎯 Usando modelo: {model_name}")
         
-        # Inicializar TTS
-        tts = TTS(model_name)
+        # Inicializar TTS (reutiliza el modelo si ya está cargado)
+        with span('model_load', model=model_name):
+            tts = load_tts_model(model_name)
         
-        # Generar audio clonado
+        # Generar audio clonado (el embedding del hablante se cachea)
         print("🔄 Generando audio clonado...")
-        tts.tts_to_file(
-            text=text,
-            speaker_wav=audio_path,
-            file_path=output_path,
-            language="es"  # Español
-        )
+        with span('synthesis', engine='coqui_clone'):
+            data = clone_with_cached_embedding(tts, model_name, audio_path, text, speaker_id)
         
-        print(f"✅ Audio clonado generado: {output_path}")
-        return True
+        print(f"✅ Audio clonado generado ({len(data)} bytes)")
+        return data
         
     except Exception as e:
         print(f"❌ Error durante la clonación: {e}")
@@ -77,7 +221,7 @@ def voice_cloning_coqui(audio_path, text, output_path):
         print("1. Verifica que el audio de referencia sea válido (WAV/MP3)")
         print("2. Asegúrate de tener suficiente espacio en disco")
         print("3. El audio de referencia debe ser de buena calidad (16kHz+ recomendado)")
-        return False
+        return None
 
 def voice_cloning_coqui_simple(audio_path, text, output_path):
     """
@@ -92,15 +236,11 @@ def voice_cloning_coqui_simple(audio_path, text, output_path):
         print("🎤 Clonación de voz con YourTTS...")
         
         # Usar YourTTS específicamente
-        tts = TTS("tts_models/multilingual/multi-dataset/your_tts")
+        model_name = "tts_models/multilingual/multi-dataset/your_tts"
+        tts = load_tts_model(model_name)
         
         # Generar audio
-        tts.tts_to_file(
-            text=text,
-            speaker_wav=audio_path,
-            file_path=output_path,
-            language="es"
-        )
+        save_audio(clone_with_cached_embedding(tts, model_name, audio_path, text), output_path)
         
         print(f"✅ Audio generado: {output_path}")
         return True
@@ -153,6 +293,10 @@ if __name__ == "__main__":
                        help='Grabar audio de referencia')
     parser.add_argument('--duration', type=int, default=5, 
                        help='Duración de la grabación en segundos')
+    parser.add_argument('--speaker-id', type=str, 
+                       help='Hash de un hablante ya registrado (en lugar de --audio)')
+    parser.add_argument('--register', action='store_true', 
+                       help='Registrar el hablante de --audio y mostrar su speaker_id')
     
     args = parser.parse_args()
     
@@ -161,8 +305,12 @@ if __name__ == "__main__":
         if audio_path:
             print(f"\n🎯 Audio de referencia grabado: {audio_path}")
             print("💡 Ahora puedes usar este archivo con --audio")
-    elif args.audio and args.text:
-        success = voice_cloning_coqui(args.audio, args.text, args.output)
+    elif args.register and args.audio:
+        speaker_id = register_speaker(args.audio)
+        print(f"\n🎯 Hablante registrado: {speaker_id}")
+        print("💡 Ahora puedes usar --speaker-id en lugar de --audio")
+    elif (args.audio or args.speaker_id) and args.text:
+        success = voice_cloning_coqui(args.audio, args.text, args.output, args.speaker_id)
         if success:
             print(f"\n🎉 ¡Clonación completada! Archivo: {args.output}")
         else:
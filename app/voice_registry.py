@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Registro local de voces clonadas en ElevenLabs.
+
+Asocia el hash del audio de referencia con el voice_id creado, de modo que
+clonar dos veces al mismo hablante reutilice la voz existente. Cuando se
+supera el límite de voces, se desaloja la menos usada (LRU).
+
+Varios procesos (workers de gunicorn) comparten el archivo: cada cambio se
+hace bajo un flock del registro, releyendo el archivo antes de escribirlo
+de forma atómica, y la clonación de un mismo audio se serializa con un
+flock por hash. Los usos se acumulan en memoria y se escriben como mucho
+cada FLUSH_INTERVAL segundos (y al salir) salvo que cambien las voces.
+"""
+
+import atexit
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+@contextmanager
+def _file_lock(path: Path) -> Iterator[None]:
+    """Lock exclusivo entre procesos (y entre hilos: cada uno abre su descriptor)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class VoiceRegistry:
+    """Mapa persistente hash de audio -> voice_id con desalojo LRU"""
+
+    FLUSH_INTERVAL = 30.0
+
+    def __init__(self, path: str, max_voices: int = 10):
+        self.path = Path(path)
+        self.max_voices = max_voices
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self.hash_lock_dir = self.path.with_name(self.path.name + ".locks")
+        self._lock = threading.Lock()
+        self._voices: Dict[str, Dict[str, Any]] = {}
+        # Versión del archivo que hay en memoria (mtime, tamaño)
+        self._stamp: Optional[Tuple[int, int]] = None
+        # Usos pendientes de escribir: hash -> (último uso, nº de usos)
+        self._usage: Dict[str, Tuple[float, int]] = {}
+        self._saved_at = time.monotonic()
+        with self._lock:
+            self._refresh()
+
+    def _file_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _refresh(self) -> None:
+        """Releer el archivo si otro proceso lo ha cambiado"""
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return
+        self._stamp = stamp
+        if stamp is None:
+            self._voices = {}
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self._voices = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Registro de voces ilegible, se reinicia: {e}")
+            self._voices = {}
+
+    def _merge_usage(self) -> None:
+        """Aplicar los usos pendientes sobre el registro recién leído"""
+        for audio_hash, (last_used, uses) in self._usage.items():
+            entry = self._voices.get(audio_hash)
+            if entry is not None:
+                entry['last_used'] = max(entry.get('last_used', 0), last_used)
+                entry['uses'] = entry.get('uses', 0) + uses
+        self._usage.clear()
+
+    def _save(self) -> None:
+        """Guardar el registro de forma atómica (con el flock del registro tomado)"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=str(self.path.parent), suffix=".tmp")
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self._voices, f, indent=2)
+        os.replace(tmp_path, self.path)
+        self._stamp = self._file_stamp()
+        self._saved_at = time.monotonic()
+
+    @contextmanager
+    def _update(self) -> Iterator[Dict[str, Dict[str, Any]]]:
+        """Modificar el registro: flock, releer, cambiar y guardar"""
+        with self._lock, _file_lock(self.lock_path):
+            self._refresh()
+            self._merge_usage()
+            yield self._voices
+            self._save()
+
+    def flush(self) -> None:
+        """Guardar los usos pendientes"""
+        if self._usage:
+            with self._update():
+                pass
+
+    @contextmanager
+    def locked(self, audio_hash: str) -> Iterator[None]:
+        """
+        Serializar la clonación de un mismo audio, también entre procesos:
+        dos peticiones simultáneas con la misma referencia crean una sola voz
+        """
+        with _file_lock(self.hash_lock_dir / f"{audio_hash}.lock"):
+            yield
+
+    def lookup(self, audio_hash: str) -> Optional[str]:
+        """Obtener el voice_id asociado a un audio y marcarlo como usado"""
+        with self._lock:
+            self._refresh()
+            entry = self._voices.get(audio_hash)
+            if entry is None:
+                return None
+            _, uses = self._usage.get(audio_hash, (0.0, 0))
+            self._usage[audio_hash] = (time.time(), uses + 1)
+            flush = time.monotonic() - self._saved_at >= self.FLUSH_INTERVAL
+            voice_id = entry['voice_id']
+        if flush:
+            self.flush()
+        return voice_id
+
+    def register(self, audio_hash: str, voice_id: str, name: str = "") -> List[str]:
+        """
+        Registrar una voz recién creada y desalojar las LRU que sobren.
+        Devuelve los voice_id desalojados, que el llamador debe eliminar
+        en ElevenLabs.
+        """
+        now = time.time()
+        with self._update() as voices:
+            voices[audio_hash] = {
+                'voice_id': voice_id,
+                'name': name,
+                'created_at': now,
+                'last_used': now,
+                'uses': 1,
+            }
+            evicted = []
+            while self.max_voices > 0 and len(voices) > self.max_voices:
+                oldest = min(voices, key=lambda h: voices[h]['last_used'])
+                evicted.append(voices.pop(oldest)['voice_id'])
+        return evicted
+
+    def forget(self, audio_hash: str) -> None:
+        """Eliminar una entrada (p. ej. si la voz ya no existe remotamente)"""
+        with self._update() as voices:
+            voices.pop(audio_hash, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._voices)
+
+
+_registry: Optional[VoiceRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_voice_registry() -> VoiceRegistry:
+    """Obtener el registro global configurado desde ElevenLabsConfig"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            from config import get_config
+
+            elevenlabs = get_config().elevenlabs
+            _registry = VoiceRegistry(elevenlabs.voice_registry_path, elevenlabs.max_cloned_voices)
+            atexit.register(_registry.flush)
+        return _registry
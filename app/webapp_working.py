@@ -1,11 +1,35 @@
 #!/usr/bin/env python3
+import hmac
 import os
 import sys
-import subprocess
-from flask import Flask, render_template, request, send_from_directory, flash
+import time
+from contextlib import ExitStack
+from flask import Flask, render_template, request, send_file, send_from_directory, flash, jsonify, Response, stream_with_context, url_for, g
 from werkzeug.utils import secure_filename
+from coqui_pool import get_coqui_pool, CoquiWorkerError
+from audio_cache import get_audio_cache, make_cache_key
+from audio_probe import UploadRejected, UploadValidator, probe_file
+from chunked_synthesis import ChunkedSynthesizer, coqui_chunk_synthesizer, elevenlabs_chunk_synthesizer
+from config import get_config
+from jobs import JobQueue, create_job_store
+from logger import LoggingMiddleware, log_tts_request, log_voice_cloning_request
+from metrics import get_metrics
+from model_catalog import get_model_catalog
+from output_store import OutputStore
+from profiling import collect_stacks, get_sampling_profiler, profile_path, profiled
+from reference_audio import ReferencePreprocessor
+from reference_quality import QualityGate
+from tracing import span
 
-def create_app():
+AUDIO_CONTENT_TYPES = {'wav': 'audio/wav', 'mp3': 'audio/mpeg'}
+
+def create_app(start_workers=True):
+    """
+    Crear la app. Con start_workers=False no se arranca nada en segundo
+    plano (pool de Coqui, janitors, cola de trabajos, muestreador, volcado
+    de métricas): es el proceso vigilante del reloader, que nunca sirve
+    peticiones.
+    """
     # Configurar Flask para encontrar las plantillas
     template_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'templates'))
     static_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'static'))
@@ -26,159 +50,720 @@ def create_app():
                template_folder=template_dir,
                static_folder=static_dir)
     app.secret_key = 'demo_secret_key'
+    config = get_config()
+    # Werkzeug rechaza los cuerpos más grandes antes de leerlos (413)
+    app.config['MAX_CONTENT_LENGTH'] = config.web.max_content_length
+    # Con X-Sendfile, send_file sólo emite la cabecera y el proxy envía el archivo
+    app.config['USE_X_SENDFILE'] = config.web.sendfile_header == 'X-Sendfile'
+    
+    # Métricas: cada proceso vuelca su instantánea y /metrics agrega las de todos
+    metrics_dir = config.logging.metrics_dir if config.logging.enable_metrics else None
+    metrics = get_metrics(metrics_dir, config.logging.metrics_flush_interval, start=start_workers)
+    app.wsgi_app = LoggingMiddleware(app.wsgi_app)
+    
+    # Perfilado: muestreo de pilas siempre activo y cProfile bajo demanda
+    profile_dir = config.performance.profile_dir
+    sampler = get_sampling_profiler(config.performance.sampling_interval, profile_dir, 'web') if start_workers else None
+    
+    def is_admin():
+        """Token de administración en X-Admin-Token o en ?admin_token="""
+        token = request.headers.get('X-Admin-Token') or request.args.get('admin_token', '')
+        return bool(config.security.admin_token) and hmac.compare_digest(
+            token.encode(), config.security.admin_token.encode())
+    
+    def wants_profile():
+        if config.performance.profile_requests:
+            return True
+        flag = request.headers.get('X-Profile') or request.args.get('profile', '')
+        return flag.lower() in ('1', 'true') and is_admin()
+    
+    @app.before_request
+    def start_profile():
+        # Los trabajos y workers que lance la petición se perfilan también
+        if wants_profile():
+            request_id = request.environ.get('voice_synthesis.request_id') or str(time.time_ns())
+            g.profile = ExitStack()
+            g.profile.enter_context(profiled(profile_path(profile_dir, f"{request_id}.web")))
+    
+    @app.teardown_request
+    def stop_profile(exc):
+        stack = g.pop('profile', None)
+        if stack is not None:
+            stack.close()
     
     def safe_import():
         """Importa módulos de forma segura"""
         try:
-            from tts import text_to_speech
-            from voice_cloning import clone_voice
-            return text_to_speech, clone_voice
+            from tts import synthesize_speech
+            from voice_cloning import clone_voice_audio
+            return synthesize_speech, clone_voice_audio
         except ImportError as e:
             print(f"⚠️  Error importando módulos: {e}")
             return None, None
     
-    def run_coqui_tts(text, output_path):
-        """Ejecuta TTS con Coqui"""
+    def safe_import_stream():
+        """Importa el TTS en streaming de forma segura"""
         try:
-            venv_python = os.path.join(os.path.dirname(__file__), '..', 'venv-coqui', 'bin', 'python')
-            script_path = os.path.join(os.path.dirname(__file__), 'tts_coqui.py')
-            
-            if not os.path.exists(venv_python):
-                return False, "Entorno virtual de Coqui no encontrado"
-            
-            if not os.path.exists(script_path):
-                return False, "Script tts_coqui.py no encontrado"
+            from tts import stream_text_to_speech
+            return stream_text_to_speech
+        except ImportError as e:
+            print(f"⚠️  Error importando módulos: {e}")
+            return None
+    
+    # Pool de workers persistentes de Coqui (se arranca junto con la app)
+    coqui_pool = get_coqui_pool() if start_workers else None
+    audio_cache = get_audio_cache()
+    # Catálogo de modelos de Coqui (se lee sin arrancar el intérprete de Coqui)
+    model_catalog = get_model_catalog(
+        models_dir=os.path.join(config.coqui.cache_dir, 'tts'),
+        index_path=config.coqui.model_catalog_path,
+    )
+    
+    def run_coqui_tts(text):
+        """Ejecuta TTS con Coqui; devuelve (éxito, mensaje, audio WAV en memoria)"""
+        try:
+            cache_key = make_cache_key('coqui', text, model_id='fallback', output_format='wav')
+            audio = audio_cache.get(cache_key)
+            if audio is not None:
+                print("✅ TTS Coqui servido desde cache")
+                return True, "TTS servido desde cache", audio
             
-            # Asegurar que el directorio de salida existe
-            output_dir = os.path.dirname(output_path)
-            if not os.path.exists(output_dir):
-                os.makedirs(output_dir, exist_ok=True)
+            if coqui_pool is None:
+                return False, "Entorno virtual de Coqui no encontrado", None
             
-            print(f"🔊 Ejecutando TTS Coqui: {text} -> {output_path}")
-            cmd = [venv_python, script_path, '--text', text, '--output', output_path]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            print(f"🔊 Ejecutando TTS Coqui: {text}")
+            response = coqui_pool.submit('tts', text=text)
+            if not response['ok']:
+                return False, response['message'], None
             
-            # Verificar que el archivo se creó
-            if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-                print(f"✅ TTS Coqui exitoso: {output_path}")
-                return True, result.stdout
+            audio = response.get('audio')
+            if audio:
+                print(f"✅ TTS Coqui exitoso: {len(audio)} bytes ({response['duration']:.2f}s)")
+                # El silencio de reserva (sin pyttsx3 ni espeak) no se cachea
+                if response.get('backend') != 'placeholder':
+                    audio_cache.put(cache_key, audio, 'wav')
+                return True, response['message'], audio
             else:
-                return False, "No se pudo generar el archivo de audio"
+                return False, "No se pudo generar el audio", None
                 
-        except subprocess.CalledProcessError as e:
-            error_msg = f"Error ejecutando script: {e.stderr if e.stderr else str(e)}"
+        except CoquiWorkerError as e:
+            error_msg = f"Error en worker Coqui: {str(e)}"
             print(f"❌ {error_msg}")
-            return False, error_msg
+            return False, error_msg, None
         except Exception as e:
             error_msg = f"Error inesperado: {str(e)}"
             print(f"❌ {error_msg}")
-            return False, error_msg
+            return False, error_msg, None
     
-    def run_coqui_voice_cloning(audio_path, text, output_path):
+    def run_coqui_voice_cloning(audio_path, text):
         """Ejecuta clonación de voz con Coqui"""
         try:
-            venv_python = os.path.join(os.path.dirname(__file__), '..', 'venv-coqui', 'bin', 'python')
-            script_path = os.path.join(os.path.dirname(__file__), 'voice_cloning_coqui.py')
-            if not os.path.exists(venv_python):
-                return False, "Entorno virtual de Coqui no encontrado"
-            cmd = [venv_python, script_path, '--audio', audio_path, '--text', text, '--output', output_path]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            return True, result.stdout
+            if coqui_pool is None:
+                return False, "Entorno virtual de Coqui no encontrado", None
+            # El hash del upload identifica al hablante: el worker no vuelve a leer el audio para hashearlo
+            response = coqui_pool.submit('clone', audio_path=audio_path, text=text,
+                                         speaker_id=upload_hash(audio_path))
+            return response['ok'], response['message'], response.get('audio')
+        except Exception as e:
+            return False, str(e), None
+    
+    def audio_extension(engine, text=''):
+        """ElevenLabs devuelve MP3; los motores de Coqui y la síntesis por fragmentos, WAV"""
+        return 'wav' if engine == 'coqui' or use_chunked(text) else 'mp3'
+    
+    def use_chunked(text):
+        """Los textos largos se sintetizan por fragmentos en paralelo"""
+        return len(text) > config.performance.chunk_max_chars
+    
+    def chunked_synthesizer(engine):
+        """Sintetizador por fragmentos para el motor indicado"""
+        if engine == 'coqui':
+            if coqui_pool is None:
+                raise RuntimeError("Entorno virtual de Coqui no encontrado")
+            synthesize_chunk = coqui_chunk_synthesizer(coqui_pool)
+            workers = coqui_pool.size
+        else:
+            synthesize_chunk = elevenlabs_chunk_synthesizer(config.coqui.sample_rate)
+            workers = config.performance.max_concurrent_requests
+        return ChunkedSynthesizer(synthesize_chunk, max_workers=workers,
+                                  sample_rate=config.coqui.sample_rate,
+                                  crossfade_ms=config.performance.chunk_crossfade_ms,
+                                  max_chars=config.performance.chunk_max_chars)
+    
+    def run_chunked_tts(text, engine):
+        """Ejecuta TTS por fragmentos y une el resultado en un WAV en memoria"""
+        try:
+            audio, chunks = chunked_synthesizer(engine).synthesize(text)
+            print(f"✅ TTS por fragmentos exitoso: {len(audio)} bytes ({chunks} fragmentos)")
+            return True, f"TTS generado en {chunks} fragmentos", audio
+        except Exception as e:
+            error_msg = f"Error en TTS por fragmentos: {str(e)}"
+            print(f"❌ {error_msg}")
+            return False, error_msg, None
+    
+    def synthesize_tts(text, engine):
+        """Sintetiza texto con el motor indicado; devuelve (éxito, mensaje, audio)"""
+        started = time.perf_counter()
+        success, message, audio = dispatch_tts(text, engine)
+        log_tts_request(engine, len(text), success, time.perf_counter() - started, chunked=use_chunked(text))
+        return success, message, audio
+    
+    def dispatch_tts(text, engine):
+        """Elige la ruta de síntesis: por fragmentos, Coqui o ElevenLabs"""
+        if use_chunked(text):
+            return run_chunked_tts(text, engine)
+        if engine == 'coqui':
+            return run_coqui_tts(text)
+        synthesize_speech, _ = safe_import()
+        if not synthesize_speech:
+            return False, 'ElevenLabs no disponible. Verifica la API key.', None
+        try:
+            audio = synthesize_speech(text)
+            if audio:
+                return True, 'TTS generado con ElevenLabs', audio
+            return False, 'ElevenLabs no pudo generar el audio', None
         except Exception as e:
-            return False, str(e)
+            return False, str(e), None
+    
+    def synthesize_clone(audio_path, text, engine):
+        """Clona la voz de audio_path con el motor indicado; devuelve (éxito, mensaje, audio)"""
+        started = time.perf_counter()
+        success, message, audio = dispatch_clone(audio_path, text, engine)
+        log_voice_cloning_request(engine, os.path.getsize(audio_path), len(text), success,
+                                  time.perf_counter() - started)
+        return success, message, audio
+    
+    def dispatch_clone(audio_path, text, engine):
+        """Elige el motor de clonación"""
+        if engine == 'coqui':
+            return run_coqui_voice_cloning(audio_path, text)
+        _, clone_voice_audio = safe_import()
+        if not clone_voice_audio:
+            return False, 'ElevenLabs no disponible. Verifica la API key.', None
+        try:
+            audio = clone_voice_audio(audio_path, text, upload_hash(audio_path))
+            if audio:
+                return True, 'Voz clonada con ElevenLabs', audio
+            return False, 'ElevenLabs no pudo clonar la voz', None
+        except Exception as e:
+            return False, str(e), None
+    
+    # Almacenes de audio: cada resultado tiene un nombre único por contenido
+    output_store = OutputStore(os.path.join(static_dir, 'audio'), config.web.output_max_size,
+                               config.web.output_max_age, config.web.janitor_interval)
+    upload_store = OutputStore(os.path.join(static_dir, 'uploads'), config.web.output_max_size,
+                               config.web.output_max_age, config.web.janitor_interval)
+    if start_workers:
+        output_store.start_janitor()
+        upload_store.start_janitor()
+    
+    # Referencias de clonación preprocesadas, cacheadas por hash del upload
+    audio_config = config.audio
+    reference_store = OutputStore(audio_config.reference_dir,
+                                  audio_config.reference_max_size, config.web.output_max_age,
+                                  config.web.janitor_interval)
+    if start_workers:
+        reference_store.start_janitor()
+    reference_preprocessor = ReferencePreprocessor(
+        reference_store,
+        sample_rate=audio_config.sample_rate or config.coqui.sample_rate,
+        max_duration=audio_config.max_duration,
+        silence_threshold_db=audio_config.silence_threshold_db,
+        target_level_db=audio_config.target_level_db,
+        block_seconds=audio_config.block_seconds,
+    )
+    quality_gate = QualityGate(audio_config.min_quality_score, audio_config.min_duration)
+    
+    def send_audio(name):
+        """
+        Entrega de un audio publicado: el nombre es el hash de su contenido,
+        así que sirve de ETag fuerte y la respuesta es inmutable. Los rangos
+        (seek) y el envío con sendfile los resuelve send_file, o el proxy con
+        X-Accel-Redirect / X-Sendfile.
+        """
+        if not output_store.exists(name):
+            return api_error('AUDIO_NOT_FOUND', 'El audio no existe o ya expiró', 404)
+        content_hash, extension = os.path.splitext(name)
+        mimetype = AUDIO_CONTENT_TYPES.get(extension.lstrip('.'), 'application/octet-stream')
+        if config.web.sendfile_header == 'X-Accel-Redirect':
+            response = Response(mimetype=mimetype)
+            response.headers['X-Accel-Redirect'] = config.web.sendfile_prefix.rstrip('/') + '/' + name
+            response.set_etag(content_hash)
+            response.make_conditional(request)
+        else:
+            response = send_file(output_store.path(name), mimetype=mimetype, conditional=True,
+                                 etag=content_hash, max_age=config.web.audio_max_age)
+        response.cache_control.public = True
+        response.cache_control.max_age = config.web.audio_max_age
+        response.cache_control.immutable = True
+        return response
+    
+    def store_output(synthesize, engine, *args, extension=None):
+        """
+        Ejecuta synthesize(*args) y publica el audio en el almacén (para la
+        página y los trabajos, que lo sirven después por URL). Devuelve
+        (éxito, mensaje, nombre publicado).
+        """
+        success, message, audio = synthesize(*args)
+        if not success or not audio:
+            return False, message if not success else "No se pudo generar el archivo de audio", None
+        with span('file_write'):
+            return True, message, output_store.put_bytes(audio, extension or audio_extension(engine))
+    
+    def save_upload(audio_file):
+        """
+        Guarda un audio subido en el almacén de uploads y devuelve su ruta.
+        Se copia por bloques calculando el hash; la cabecera del primer bloque
+        valida formato y duración, y lo que no cumple los límites se rechaza
+        (UploadRejected) sin copiar el resto. Un audio ya subido se reutiliza.
+        """
+        filename = secure_filename(audio_file.filename)
+        validator = UploadValidator(config.web.allowed_extensions, config.web.max_content_length,
+                                    config.security.max_audio_duration)
+        validator.check_extension(filename)
+        extension = os.path.splitext(filename)[1] or '.wav'
+        with span('upload_save') as current:
+            name = upload_store.put_stream(audio_file.stream, extension, validator)
+            if current is not None:
+                current.attrs.update(format=validator.info.format, bytes=validator.size)
+        return upload_store.path(name)
+    
+    def prepare_reference(audio_path):
+        """
+        Referencia que reciben los motores de clonación: el upload en mono,
+        remuestreado, sin silencios y normalizado. Si el preprocesado está
+        desactivado o el formato no se puede decodificar, el original.
+        Las referencias que no pasan el control de calidad se rechazan
+        (UploadRejected) antes de gastar CPU o créditos en clonarlas; si no
+        se pueden decodificar, al menos se comprueba la duración de la cabecera.
+        """
+        audio_hash = upload_hash(audio_path)
+        reference_path, report = audio_path, None
+        try:
+            if audio_config.enabled:
+                processed_path, report = reference_preprocessor.process(audio_path, audio_hash)
+                reference_path = processed_path or audio_path
+            elif audio_config.quality_gate:
+                report = reference_preprocessor.analyze(audio_path, audio_hash)
+        except Exception as e:
+            print(f"⚠️ Referencia sin preprocesar ni analizar ({e}): {audio_path}")
+        if audio_config.quality_gate:
+            with span('reference_quality', score=report.score if report is not None else None):
+                try:
+                    if report is not None:
+                        quality_gate.check(report)
+                    else:
+                        info = probe_file(audio_path)
+                        quality_gate.check_duration(info.duration if info is not None else None)
+                except UploadRejected:
+                    reference_rejections.inc()
+                    raise
+        return reference_path
+    
+    def upload_hash(audio_path):
+        """
+        Los uploads se nombran por el SHA-256 de su contenido y las referencias
+        procesadas por su clave de cache: en ambos casos identifica al hablante
+        """
+        return os.path.splitext(os.path.basename(audio_path))[0]
+    
+    def run_tts_job(job):
+        """Handler de trabajos 'tts' de la API asíncrona"""
+        params = job.params
+        success, message, name = store_output(synthesize_tts, params['engine'],
+                                              params['text'], params['engine'],
+                                              extension=audio_extension(params['engine'], params['text']))
+        if not success:
+            raise RuntimeError(message)
+        return name
+    
+    def run_clone_job(job):
+        """Handler de trabajos 'clone' de la API asíncrona"""
+        params = job.params
+        success, message, name = store_output(synthesize_clone, params['engine'],
+                                              params['audio_path'], params['text'], params['engine'])
+        if not success:
+            raise RuntimeError(message)
+        return name
+    
+    # Cola de trabajos de la API (concurrencia acotada por configuración)
+    performance = config.performance
+    job_queue = JobQueue(
+        create_job_store(performance.job_store, performance.job_db_path),
+        {'tts': run_tts_job, 'clone': run_clone_job},
+        workers=performance.max_concurrent_requests,
+        async_processing=performance.async_processing,
+        retention=performance.job_retention,
+    )
+    if start_workers:
+        job_queue.start()
+    
+    def job_files():
+        """Referencias de trabajos sin terminar: el janitor no las borra"""
+        return [job.params['audio_path'] for job in job_queue.store.pending()
+                if job.params.get('audio_path')]
+    
+    upload_store.pinned = job_files
+    reference_store.pinned = job_files
+    
+    # Saturación: profundidad de cola, workers ocupados y aciertos de cache
+    queue_depth = metrics.gauge('job_queue_depth', 'Trabajos en cola')
+    jobs_running = metrics.gauge('job_queue_running', 'Trabajos en ejecución')
+    job_workers = metrics.gauge('job_queue_workers', 'Hilos de la cola de trabajos')
+    coqui_workers = metrics.gauge('coqui_workers', 'Workers de Coqui por estado')
+    coqui_respawns = metrics.counter('coqui_worker_respawns_total', 'Workers de Coqui reiniciados')
+    coqui_failed = metrics.counter('coqui_failed_jobs_total', 'Trabajos fallidos en workers de Coqui')
+    cache_events = metrics.counter('audio_cache_events_total', 'Eventos del cache de audio (hits, misses...)')
+    reference_rejections = metrics.counter('reference_rejections_total',
+                                           'Referencias de clonación rechazadas por calidad')
+    
+    def collect_metrics():
+        jobs = job_queue.stats()
+        queue_depth.set(jobs['queued'])
+        jobs_running.set(jobs['running'])
+        job_workers.set(jobs['workers'])
+        if coqui_pool is not None:
+            pool = coqui_pool.stats()
+            for state in ('size', 'alive', 'busy', 'idle'):
+                coqui_workers.set(pool[state], state=state)
+            coqui_respawns.set_total(pool['respawns'])
+            coqui_failed.set_total(pool['failed_jobs'])
+        for event, value in audio_cache.stats().items():
+            if event in ('hits', 'hot_hits', 'misses', 'writes', 'evictions', 'expirations'):
+                cache_events.set_total(value, event=event)
+    
+    metrics.add_collector(collect_metrics)
+    
+    def api_success(data, status=200):
+        return jsonify({'success': True, 'data': data}), status
+    
+    def api_error(code, message, status=400, **details):
+        return jsonify({
+            'success': False,
+            'error': {'code': code, 'message': message, 'details': details}
+        }), status
+    
+    def job_response(job):
+        """Representación pública de un trabajo"""
+        data = {
+            'job_id': job.id,
+            'kind': job.kind,
+            'status': job.status,
+            'engine': job.params.get('engine'),
+            'request_id': job.params.get('request_id'),
+            'created_at': job.created_at,
+            'started_at': job.started_at,
+            'finished_at': job.finished_at,
+            'status_url': url_for('api_job_status', job_id=job.id),
+        }
+        if job.status == 'done':
+            data['audio_url'] = url_for('api_job_audio', job_id=job.id)
+        if job.error:
+            data['error'] = job.error
+        return data
+    
+    def request_payload():
+        """Cuerpo JSON o formulario; None si el JSON no es un objeto"""
+        payload = request.get_json(silent=True)
+        if payload is None:
+            payload = request.form
+        return payload if isinstance(payload, dict) else None
+    
+    def validate_engine_and_text(engine, text):
+        """Devuelve una respuesta de error, o None si los parámetros son válidos"""
+        if not isinstance(engine, str) or engine not in ('elevenlabs', 'coqui'):
+            return api_error('INVALID_ENGINE', f"Motor no soportado: {engine}")
+        if not isinstance(text, str):
+            return api_error('INVALID_TEXT', 'El texto debe ser una cadena')
+        if not text.strip():
+            return api_error('INVALID_TEXT', 'Texto requerido')
+        if len(text) > config.security.max_text_length:
+            return api_error('INVALID_TEXT',
+                             f"Texto demasiado largo (máximo {config.security.max_text_length} caracteres)",
+                             text_length=len(text), max_length=config.security.max_text_length)
+        return None
+    
+    @app.errorhandler(413)
+    def request_too_large(error):
+        message = f"Archivo demasiado grande (máximo {config.web.max_content_length} bytes)"
+        if request.path.startswith('/api/'):
+            return api_error('FILE_TOO_LARGE', message, 413, max_size=config.web.max_content_length)
+        flash(message, 'error')
+        return render_template('index.html', error_message=message), 413
     
     @app.route('/', methods=['GET', 'POST'])
     def index():
         tts_audio = None
+        tts_stream_url = None
         clone_audio = None
         error_message = None
         
-        # Importar módulos de forma segura
-        text_to_speech, clone_voice = safe_import()
-        
         if request.method == 'POST':
             # TTS
             if 'tts_text' in request.form:
                 text = request.form['tts_text']
                 engine = request.form.get('engine', 'elevenlabs')
+                engine_name = 'Coqui' if engine == 'coqui' else 'ElevenLabs'
                 
                 if text.strip():
-                    if engine == 'coqui':
-                        output_path = os.path.join(static_dir, 'coqui_tts_output.wav')
-                        success, message = run_coqui_tts(text, output_path)
+                    if request.form.get('stream') and (engine == 'coqui' or use_chunked(text)):
+                        # Por fragmentos: suena en cuanto está lista la primera oración
+                        tts_stream_url = url_for('tts_chunked', text=text, engine=engine)
+                    elif request.form.get('stream'):
+                        # El navegador reproduce el audio mientras se genera
+                        tts_stream_url = url_for('tts_stream', text=text)
+                    else:
+                        success, message, name = store_output(synthesize_tts, engine, text, engine,
+                                                              extension=audio_extension(engine, text))
                         if success:
-                            tts_audio = 'coqui_tts_output.wav'
-                            flash('TTS generado exitosamente con Coqui', 'success')
+                            tts_audio = url_for('audio_file', filename=name)
+                            flash(f'TTS generado exitosamente con {engine_name}', 'success')
                         else:
-                            error_message = f"Error en TTS Coqui: {message}"
+                            error_message = f"Error en TTS {engine_name}: {message}"
                             flash(error_message, 'error')
-                    else:
-                        if text_to_speech:
-                            try:
-                                output_path = os.path.join(static_dir, 'tts_output.wav')
-                                text_to_speech(text, output_path)
-                                tts_audio = 'tts_output.wav'
-                                flash('TTS generado exitosamente con ElevenLabs', 'success')
-                            except Exception as e:
-                                error_message = f"Error en TTS ElevenLabs: {str(e)}"
-                                flash(error_message, 'error')
-                        else:
-                            flash('ElevenLabs no disponible. Verifica la API key.', 'error')
             
             # Clonación de voz
             elif 'clone_text' in request.form and 'clone_audio' in request.files:
                 text = request.form['clone_text']
                 audio_file = request.files['clone_audio']
                 engine = request.form.get('engine', 'elevenlabs')
+                engine_name = 'Coqui' if engine == 'coqui' else 'ElevenLabs'
                 
                 if audio_file and audio_file.filename and text.strip():
-                    filename = secure_filename(audio_file.filename)
-                    audio_path = os.path.join(static_dir, filename)
-                    audio_file.save(audio_path)
-                    
-                    if engine == 'coqui':
-                        output_path = os.path.join(static_dir, 'coqui_clone_output.wav')
-                        success, message = run_coqui_voice_cloning(audio_path, text, output_path)
-                        if success:
-                            clone_audio = 'coqui_clone_output.wav'
-                            flash('Voz clonada exitosamente con Coqui', 'success')
-                        else:
-                            error_message = f"Error en clonación Coqui: {message}"
-                            flash(error_message, 'error')
+                    try:
+                        audio_path = prepare_reference(save_upload(audio_file))
+                        success, message, name = store_output(synthesize_clone, engine, audio_path, text, engine)
+                    except UploadRejected as e:
+                        success, message = False, e.message
+                    if success:
+                        clone_audio = url_for('audio_file', filename=name)
+                        flash(f'Voz clonada exitosamente con {engine_name}', 'success')
                     else:
-                        if clone_voice:
-                            try:
-                                output_path = os.path.join(static_dir, 'clone_output.wav')
-                                clone_voice(audio_path, text, output_path)
-                                clone_audio = 'clone_output.wav'
-                                flash('Voz clonada exitosamente con ElevenLabs', 'success')
-                            except Exception as e:
-                                error_message = f"Error en clonación ElevenLabs: {str(e)}"
-                                flash(error_message, 'error')
-                        else:
-                            flash('ElevenLabs no disponible. Verifica la API key.', 'error')
+                        error_message = f"Error en clonación {engine_name}: {message}"
+                        flash(error_message, 'error')
                 else:
                     flash('Por favor, sube un archivo de audio válido y proporciona texto', 'error')
         
         return render_template('index.html', 
                              tts_audio=tts_audio, 
+                             tts_stream_url=tts_stream_url,
                              clone_audio=clone_audio,
                              error_message=error_message)
     
-    @app.route('/static/<filename>')
+    @app.route('/api/tts', methods=['POST'])
+    def api_tts():
+        """Encola un trabajo de TTS"""
+        payload = request_payload()
+        if payload is None:
+            return api_error('INVALID_PAYLOAD', 'El cuerpo JSON debe ser un objeto')
+        text = payload.get('text', '')
+        engine = payload.get('engine', 'elevenlabs')
+        
+        error = validate_engine_and_text(engine, text)
+        if error:
+            return error
+        
+        job = job_queue.submit('tts', {'text': text, 'engine': engine})
+        return api_success(job_response(job), 202 if not job.is_finished() else 200)
+    
+    @app.route('/api/tts/audio', methods=['POST'])
+    def api_tts_audio():
+        """TTS síncrono: el audio va en el cuerpo de la respuesta, sin pasar por disco"""
+        payload = request_payload()
+        if payload is None:
+            return api_error('INVALID_PAYLOAD', 'El cuerpo JSON debe ser un objeto')
+        text = payload.get('text', '')
+        engine = payload.get('engine', 'elevenlabs')
+        
+        error = validate_engine_and_text(engine, text)
+        if error:
+            return error
+        
+        success, message, audio = synthesize_tts(text, engine)
+        if not success:
+            return api_error('SYNTHESIS_FAILED', message, 502, engine=engine)
+        extension = audio_extension(engine, text)
+        return Response(audio, content_type=AUDIO_CONTENT_TYPES[extension])
+    
+    @app.route('/api/clone', methods=['POST'])
+    def api_clone():
+        """Encola un trabajo de clonación de voz"""
+        audio_file = request.files.get('audio_file')
+        text = request.form.get('text', '')
+        engine = request.form.get('engine', 'elevenlabs')
+        
+        if not audio_file or not audio_file.filename:
+            return api_error('INVALID_AUDIO', 'Archivo de audio requerido')
+        error = validate_engine_and_text(engine, text)
+        if error:
+            return error
+        
+        try:
+            audio_path = prepare_reference(save_upload(audio_file))
+        except UploadRejected as e:
+            return api_error(e.code, e.message, e.status, **e.details)
+        
+        job = job_queue.submit('clone', {'audio_path': audio_path, 'text': text, 'engine': engine})
+        return api_success(job_response(job), 202 if not job.is_finished() else 200)
+    
+    @app.route('/api/jobs/<job_id>')
+    def api_job_status(job_id):
+        job = job_queue.get(job_id)
+        if job is None:
+            return api_error('JOB_NOT_FOUND', 'Trabajo no encontrado', 404)
+        return api_success(job_response(job))
+    
+    @app.route('/api/jobs/<job_id>/audio')
+    def api_job_audio(job_id):
+        job = job_queue.get(job_id)
+        if job is None:
+            return api_error('JOB_NOT_FOUND', 'Trabajo no encontrado', 404)
+        if job.status != 'done':
+            return api_error('JOB_NOT_READY', 'El audio aún no está disponible', 409, job_status=job.status)
+        if not output_store.exists(job.result):
+            return api_error('AUDIO_EXPIRED', 'El audio ya no está disponible', 410)
+        return send_audio(job.result)
+    
+    @app.route('/api/jobs/stats')
+    def api_job_stats():
+        return api_success(job_queue.stats())
+    
+    @app.route('/api/tts/stream', methods=['GET', 'POST'])
+    def tts_stream():
+        """TTS de ElevenLabs en streaming (respuesta chunked)"""
+        text = request.values.get('text', '')
+        if not text.strip():
+            return jsonify({'error': 'Texto requerido'}), 400
+        
+        stream_text_to_speech = safe_import_stream()
+        if stream_text_to_speech is None:
+            return jsonify({'error': 'ElevenLabs no disponible. Verifica la API key.'}), 503
+        
+        try:
+            chunks = stream_text_to_speech(text)
+        except Exception as e:
+            return jsonify({'error': f"Error en TTS ElevenLabs: {str(e)}"}), 502
+        
+        return Response(stream_with_context(chunks), mimetype='audio/mpeg',
+                        headers={'Cache-Control': 'no-store'})
+    
+    @app.route('/api/tts/chunked', methods=['GET', 'POST'])
+    def tts_chunked():
+        """TTS por fragmentos en streaming (WAV PCM; el primer fragmento sale en cuanto está listo)"""
+        text = request.values.get('text', '')
+        engine = request.values.get('engine', 'elevenlabs')
+        
+        error = validate_engine_and_text(engine, text)
+        if error:
+            return error
+        
+        try:
+            synthesizer = chunked_synthesizer(engine)
+        except Exception as e:
+            return api_error('ENGINE_UNAVAILABLE', str(e), 503)
+        
+        return Response(stream_with_context(synthesizer.iter_wav_stream(text)), mimetype='audio/wav',
+                        headers={'Cache-Control': 'no-store'})
+    
+    @app.route('/api/models')
+    def api_models():
+        """Motores y modelos disponibles (filtros: language, cloning, installed)"""
+        def flag(name):
+            value = request.args.get(name)
+            return None if value is None else value.lower() == 'true'
+        
+        models = model_catalog.models(language=request.args.get('language') or None,
+                                      cloning=flag('cloning'), installed=flag('installed'))
+        return api_success({
+            'engines': [
+                {'id': 'elevenlabs', 'name': 'ElevenLabs', 'available': bool(config.elevenlabs.api_key)},
+                {'id': 'coqui', 'name': 'Coqui', 'available': coqui_pool is not None},
+            ],
+            'defaults': {'tts': config.coqui.default_model, 'cloning': config.coqui.voice_cloning_model},
+            'models': [info.to_dict() for info in models],
+            'catalog': model_catalog.stats(),
+        })
+    
+    @app.route('/audio/<filename>')
+    def audio_file(filename):
+        return send_audio(filename)
+    
+    @app.route('/static/<path:filename>')
     def static_files(filename):
         return send_from_directory(static_dir, filename)
     
     @app.route('/health')
     def health():
+        # Con precarga, no se acepta tráfico hasta que los workers estén calientes
+        if coqui_pool is not None and coqui_pool.preload and not coqui_pool.is_ready():
+            return 'Warming up', 503
         return 'OK'
     
+    @app.route('/health/workers')
+    def health_workers():
+        if coqui_pool is None:
+            return jsonify({'available': False}), 503
+        return jsonify({'available': True, **coqui_pool.stats()})
+    
+    @app.route('/metrics')
+    def metrics_endpoint():
+        """Métricas en formato de texto de Prometheus (agregadas de todos los procesos)"""
+        if not config.logging.enable_metrics:
+            return 'Métricas deshabilitadas', 404
+        return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    
+    @app.route('/admin/profile/stacks')
+    def admin_profile_stacks():
+        """Pilas muestreadas (formato collapsed) de la web app y los workers"""
+        if not is_admin():
+            return 'Not Found', 404
+        body = collect_stacks(sampler, profile_dir)
+        if request.args.get('reset') in ('1', 'true') and sampler is not None:
+            sampler.reset()
+        return Response(body, content_type='text/plain; charset=utf-8')
+    
+    @app.route('/admin/profile/requests')
+    def admin_profile_requests():
+        """Perfiles cProfile guardados (uno por petición, trabajo o worker)"""
+        if not is_admin():
+            return 'Not Found', 404
+        entries = []
+        if os.path.isdir(profile_dir):
+            for name in sorted(os.listdir(profile_dir)):
+                if name.endswith('.prof'):
+                    stat = os.stat(os.path.join(profile_dir, name))
+                    entries.append({'name': name, 'size': stat.st_size, 'modified': stat.st_mtime,
+                                    'url': url_for('admin_profile_download', filename=name)})
+        return api_success({'profiles': entries})
+    
+    @app.route('/admin/profile/requests/<path:filename>')
+    def admin_profile_download(filename):
+        if not is_admin() or not filename.endswith('.prof'):
+            return 'Not Found', 404
+        return send_from_directory(profile_dir, filename, as_attachment=True)
+    
+    @app.route('/api/cache/stats')
+    def cache_stats():
+        return jsonify(audio_cache.stats())
+    
+    @app.route('/api/storage/stats')
+    def storage_stats():
+        return jsonify({'outputs': output_store.stats(), 'uploads': upload_store.stats(),
+                        'references': {**reference_preprocessor.stats(),
+                                       'quality_checked': quality_gate.checked,
+                                       'quality_rejected': quality_gate.rejected}})
+    
     return app
 
 if __name__ == '__main__':
     print("🌐 Iniciando aplicación web...")
     
-    app = create_app()
+    debug = True
+    # Con el reloader, este proceso sólo vigila los archivos y relanza un hijo
+    # (WERKZEUG_RUN_MAIN=true) que es el que sirve: sólo el hijo arranca los
+    # workers de Coqui, o habría dos pools completos
+    reloader_parent = debug and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'
+    app = create_app(start_workers=not reloader_parent)
     if app is None:
         print("❌ No se pudo crear la aplicación")
         sys.exit(1)
@@ -188,7 +773,7 @@ if __name__ == '__main__':
     print("💡 Para probar, visita: http://localhost:5000/health")
     
     try:
-        app.run(debug=True, host='0.0.0.0', port=5000)
+        app.run(debug=debug, host='0.0.0.0', port=5000)
     except Exception as e:
         print(f"❌ Error iniciando Flask: {e}")
         import traceback
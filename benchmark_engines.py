@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Benchmark de los motores de síntesis de voz.
+
+Ejecuta cada ruta de síntesis (pyttsx3, espeak, placeholder, Coqui TTS,
+clonación Coqui y ElevenLabs contra un servidor simulado local) sobre un
+corpus de textos cortos, medianos y largos en español con la concurrencia
+indicada, y guarda en un informe JSON: arranque en frío, latencias
+p50/p95/p99, factor de tiempo real (RTF), throughput y pico de memoria.
+
+Cada motor se mide en un proceso hijo propio para que el arranque en frío
+y el pico de RSS no se contaminen entre motores.
+
+Uso:
+    python benchmark_engines.py
+    python benchmark_engines.py --engines espeak coqui_tts --concurrency 4 --iterations 20
+    python benchmark_engines.py --output nuevo.json --compare anterior.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(SCRIPT_DIR, 'app')
+COQUI_PYTHON = os.path.join(SCRIPT_DIR, 'venv-coqui', 'bin', 'python')
+sys.path.insert(0, APP_DIR)
+
+ENGINES = ("pyttsx3", "espeak", "placeholder", "coqui_tts", "coqui_clone", "elevenlabs")
+# Motores que se ejecutan en proceso con el intérprete de venv-coqui
+LOCAL_ENGINES = ("pyttsx3", "espeak", "placeholder")
+
+DEFAULT_CORPUS = {
+    "short": [
+        "Hola, ¿cómo estás?",
+        "Bienvenido al sistema de síntesis de voz.",
+        "El pedido llegará mañana por la tarde.",
+    ],
+    "medium": [
+        "La síntesis de voz convierte texto escrito en audio hablado. Los motores "
+        "modernos generan una entonación natural y permiten elegir entre varias voces.",
+        "Para reservar una cita, indique su nombre completo, su número de documento "
+        "y el horario que prefiera. Le enviaremos una confirmación por correo.",
+    ],
+    "long": [
+        "Durante la presentación de resultados, la directora explicó que el proyecto "
+        "había superado todas las metas previstas para el trimestre. Las ventas "
+        "crecieron un doce por ciento respecto al año anterior, impulsadas sobre todo "
+        "por los nuevos servicios digitales. Sin embargo, advirtió que el aumento de "
+        "los costos logísticos obligará a revisar los precios en los próximos meses. "
+        "También anunció la apertura de dos oficinas regionales y un programa de "
+        "formación para los equipos de atención al cliente, que comenzará en enero y "
+        "se extenderá durante todo el año. Finalmente, agradeció el esfuerzo de los "
+        "empleados y recordó que la próxima reunión general será en marzo.",
+    ],
+}
+
+# Bytes por segundo del MP3 que devuelve ElevenLabs (mp3_44100_128)
+MP3_BYTES_PER_SECOND = 128000 // 8
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """Percentil con interpolación lineal"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def audio_duration(path: str) -> Optional[float]:
+    """Duración en segundos de un WAV, o estimada por bitrate para MP3"""
+    try:
+        if path.endswith('.wav'):
+            with wave.open(path, 'rb') as wf:
+                return wf.getnframes() / float(wf.getframerate())
+        return os.path.getsize(path) / MP3_BYTES_PER_SECOND
+    except (OSError, wave.Error, EOFError):
+        return None
+
+
+def peak_rss_mb() -> Dict[str, float]:
+    """Pico de memoria residente del proceso y de sus hijos (workers)"""
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {
+        'self': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor, 1),
+        'children': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / divisor, 1),
+    }
+
+
+def make_engine(name: str, args) -> Tuple[Callable[[str, str], None], str, Callable[[], None]]:
+    """
+    Preparar un motor: devuelve (synthesize(text, output_path), extensión,
+    cleanup). synthesize lanza una excepción si la síntesis falla.
+    """
+    if name in LOCAL_ENGINES:
+        from tts_coqui import LocalTTSEngine
+
+        engine = LocalTTSEngine()
+        engine.initialize()
+        if name == 'pyttsx3':
+            synthesize = engine.synthesize_pyttsx3
+        elif name == 'espeak':
+            synthesize = engine.synthesize_espeak
+        else:
+            synthesize = lambda text, output_path: engine.synthesize_placeholder(output_path)
+
+        def run(text, output_path):
+            if not synthesize(text, output_path):
+                raise RuntimeError(f"{name} no generó audio")
+        return run, 'wav', lambda: None
+
+    if name in ('coqui_tts', 'coqui_clone'):
+        from coqui_pool import create_coqui_pool
+
+        if name == 'coqui_clone' and not args.reference:
+            raise RuntimeError("Se requiere --reference para la clonación")
+        if not os.path.exists(args.coqui_python):
+            raise RuntimeError(f"Intérprete de Coqui no encontrado: {args.coqui_python}")
+        pool = create_coqui_pool(size=args.concurrency, python=args.coqui_python)
+        try:
+            pool.start()
+        except BaseException:
+            # Los workers que llegaron a arrancar no deben quedar huérfanos
+            pool.shutdown()
+            raise
+
+        def run(text, output_path):
+            if name == 'coqui_tts':
+                response = pool.submit('tts', text=text, output_path=output_path)
+            else:
+                response = pool.submit('clone', audio_path=os.path.abspath(args.reference),
+                                       text=text, output_path=output_path)
+            if not response['ok']:
+                raise RuntimeError(response['message'])
+        return run, 'wav', pool.shutdown
+
+    if name == 'elevenlabs':
+        from elevenlabs_client import ElevenLabsClient
+        from elevenlabs_mock import MockConfig, MockElevenLabsServer
+
+        server = MockElevenLabsServer(MockConfig(latency=f"fixed:{args.mock_latency:g}", latency_per_char_ms=0))
+        base_url = server.start()
+        client = ElevenLabsClient(api_key='benchmark', base_url=base_url, pool_size=args.concurrency)
+
+        def run(text, output_path):
+            response = client.text_to_speech(text)
+            if response.status_code != 200:
+                raise RuntimeError(f"HTTP {response.status_code}")
+            with open(output_path, 'wb') as f:
+                f.write(response.content)
+
+        def cleanup():
+            client.close()
+            server.stop()
+        return run, 'mp3', cleanup
+
+    raise ValueError(f"Motor desconocido: {name}")
+
+
+def benchmark_engine(name: str, corpus: Dict[str, List[str]], args) -> Dict[str, Any]:
+    """Medir un motor en este proceso"""
+    result: Dict[str, Any] = {'engine': name, 'available': True, 'classes': {}}
+    work_dir = tempfile.mkdtemp(prefix=f"bench-{name}-")
+    counter = iter(range(10 ** 9))
+
+    def output_path(extension):
+        return os.path.join(work_dir, f"{next(counter)}.{extension}")
+
+    # El motor (procesos de Coqui, servidor simulado) y work_dir se liberan
+    # aunque falle la primera síntesis o la medición
+    cleanup: Optional[Callable[[], None]] = None
+    try:
+        # Arranque en frío: preparar el motor y primera síntesis
+        cold_start = time.perf_counter()
+        try:
+            synthesize, extension, cleanup = make_engine(name, args)
+            synthesize(corpus['short'][0] if corpus.get('short') else "Hola", output_path(extension))
+        except Exception as e:
+            return {'engine': name, 'available': False, 'error': str(e), 'peak_rss_mb': peak_rss_mb()}
+        result['cold_start'] = round(time.perf_counter() - cold_start, 4)
+
+        def measure(text):
+            path = output_path(extension)
+            start = time.perf_counter()
+            try:
+                synthesize(text, path)
+            except Exception as e:
+                return None, None, str(e)
+            latency = time.perf_counter() - start
+            duration = audio_duration(path)
+            os.unlink(path)
+            return latency, duration, None
+
+        for class_name, texts in corpus.items():
+            if not texts:
+                continue
+            jobs = [texts[i % len(texts)] for i in range(args.iterations)]
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                samples = list(executor.map(measure, jobs))
+            elapsed = time.perf_counter() - started
+
+            latencies = [latency for latency, _, error in samples if error is None]
+            rtfs = [latency / duration for latency, duration, error in samples
+                    if error is None and duration]
+            audio_seconds = sum(duration or 0 for _, duration, error in samples if error is None)
+            errors = [error for _, _, error in samples if error is not None]
+            result['classes'][class_name] = {
+                'requests': len(jobs),
+                'errors': len(errors),
+                'first_error': errors[0] if errors else None,
+                'chars_mean': round(sum(len(text) for text in jobs) / len(jobs), 1),
+                'p50': _round(percentile(latencies, 0.50)),
+                'p95': _round(percentile(latencies, 0.95)),
+                'p99': _round(percentile(latencies, 0.99)),
+                'mean': _round(sum(latencies) / len(latencies) if latencies else None),
+                'rtf': _round(sum(rtfs) / len(rtfs) if rtfs else None),
+                'throughput_rps': _round(len(latencies) / elapsed if elapsed else None),
+                'audio_seconds_per_second': _round(audio_seconds / elapsed if elapsed else None),
+            }
+            print(f"   {name}/{class_name}: p50={result['classes'][class_name]['p50']}s "
+                  f"p95={result['classes'][class_name]['p95']}s errores={len(errors)}", file=sys.stderr)
+    finally:
+        if cleanup is not None:
+            cleanup()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 4) if value is not None else None
+
+
+def run_isolated(name: str, args) -> Dict[str, Any]:
+    """Ejecutar un motor en un proceso hijo y leer su resultado"""
+    python = sys.executable
+    if name in LOCAL_ENGINES and os.path.exists(args.coqui_python):
+        python = args.coqui_python
+    command = [python, os.path.abspath(__file__), '--single', name,
+               '--iterations', str(args.iterations), '--concurrency', str(args.concurrency),
+               '--mock-latency', str(args.mock_latency), '--coqui-python', args.coqui_python]
+    if args.corpus:
+        command += ['--corpus', args.corpus]
+    if args.reference:
+        command += ['--reference', args.reference]
+
+    completed = subprocess.run(command, stdout=subprocess.PIPE, cwd=SCRIPT_DIR, text=True)
+    try:
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        return {'engine': name, 'available': False,
+                'error': f"El proceso de benchmark terminó con código {completed.returncode}"}
+
+
+def compare_reports(current: Dict[str, Any], previous: Dict[str, Any]) -> None:
+    """Mostrar la variación de p50/p95 respecto a un informe anterior"""
+    print("\n📊 Comparación con el informe anterior:")
+    for name, result in current['engines'].items():
+        old = previous.get('engines', {}).get(name, {})
+        for class_name, stats in result.get('classes', {}).items():
+            old_stats = old.get('classes', {}).get(class_name)
+            if not old_stats:
+                continue
+            for metric in ('p50', 'p95'):
+                new_value, old_value = stats.get(metric), old_stats.get(metric)
+                if new_value is None or not old_value:
+                    continue
+                change = (new_value - old_value) / old_value * 100
+                icon = "🔺" if change > 10 else "🔻" if change < -10 else "  "
+                print(f"   {icon} {name}/{class_name} {metric}: {old_value:.4f}s -> {new_value:.4f}s ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de motores de síntesis de voz")
+    parser.add_argument('--engines', nargs='+', choices=ENGINES, default=list(ENGINES),
+                        help='Motores a medir')
+    parser.add_argument('--iterations', type=int, default=10, help='Peticiones por tipo de texto')
+    parser.add_argument('--concurrency', type=int, default=1, help='Peticiones simultáneas')
+    parser.add_argument('--corpus', help='JSON con listas de textos "short", "medium" y "long"')
+    parser.add_argument('--reference', help='Audio de referencia para coqui_clone')
+    parser.add_argument('--mock-latency', type=float, default=200, help='Latencia del ElevenLabs simulado (ms)')
+    parser.add_argument('--coqui-python', default=COQUI_PYTHON, help='Intérprete de venv-coqui')
+    parser.add_argument('--output', default='benchmark_report.json', help='Informe JSON de salida')
+    parser.add_argument('--compare', help='Informe anterior con el que comparar')
+    parser.add_argument('--single', choices=ENGINES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    corpus = DEFAULT_CORPUS
+    if args.corpus:
+        with open(args.corpus, encoding='utf-8') as f:
+            corpus = json.load(f)
+
+    if args.single:
+        # Proceso hijo: el resultado va en la última línea de stdout
+        sys.stdout.flush()
+        protocol = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+        os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+        result = benchmark_engine(args.single, corpus, args)
+        protocol.write(json.dumps(result) + "\n")
+        protocol.close()
+        return 0
+
+    print("⏱️ Benchmark de motores de síntesis")
+    print("=" * 60)
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'host': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'config': {
+            'iterations': args.iterations,
+            'concurrency': args.concurrency,
+            'mock_latency_ms': args.mock_latency,
+            'corpus': {name: len(texts) for name, texts in corpus.items()},
+        },
+        'engines': {},
+    }
+
+    for name in args.engines:
+        print(f"\n🔧 {name}...")
+        result = run_isolated(name, args)
+        report['engines'][name] = result
+        if not result.get('available'):
+            print(f"   ⚠️ No disponible: {result.get('error')}")
+            continue
+        print(f"   ✅ Arranque en frío {result['cold_start']:.3f}s, "
+              f"pico RSS {result['peak_rss_mb']['self']} MB (+{result['peak_rss_mb']['children']} MB hijos)")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, sort_keys=True, ensure_ascii=False)
+    print(f"\n📄 Informe guardado en {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare_reports(report, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark del logger de la aplicación.
+
+Mide el coste por llamada en el hilo que registra (lo que paga cada
+petición) con los handlers síncronos de antes y con la cola + listener
+actual, para mensajes informativos, métricas de TTS y mensajes de debug
+filtrados por nivel. Los archivos de log se escriben en un directorio
+temporal y la consola se descarta.
+
+Uso:
+    python benchmark_logging.py
+    python benchmark_logging.py --calls 50000 --threads 8
+"""
+
+import argparse
+import io
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app')
+sys.path.insert(0, APP_DIR)
+
+from logger import VoiceSynthesisLogger  # noqa: E402
+
+
+def per_call_us(operation: Callable[[int], None], calls: int, threads: int) -> float:
+    """Microsegundos por llamada (medidos en los hilos que registran)"""
+    per_thread = calls // threads
+    barrier = threading.Barrier(threads)
+
+    def worker(_):
+        barrier.wait()
+        started = time.perf_counter()
+        for i in range(per_thread):
+            operation(i)
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(threads) as executor:
+        elapsed = list(executor.map(worker, range(threads)))
+    return sum(elapsed) / (per_thread * threads) * 1e6
+
+
+def make_logger(queued: bool, level: str, log_dir: str) -> VoiceSynthesisLogger:
+    name = f"bench_{'queued' if queued else 'sync'}_{level.lower()}"
+    logger = VoiceSynthesisLogger(name, log_dir=log_dir, level=level, queued=queued)
+    # La consola no interesa aquí: se redirige a un buffer en memoria
+    for handler in logger.logger.handlers + [h for l in logger._listeners for h in l.handlers]:
+        if type(handler) is logging.StreamHandler:
+            handler.setStream(io.StringIO())
+    return logger
+
+
+def run(calls: int, threads: int) -> Dict[str, Dict[str, float]]:
+    results: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory(prefix="bench-logging-") as log_dir:
+        for queued in (False, True):
+            mode = 'cola' if queued else 'síncrono'
+            logger = make_logger(queued, 'DEBUG', log_dir)
+            filtered = make_logger(queued, 'INFO', log_dir)
+            operations = {
+                'info': lambda i: logger.info("Request completed: GET /api/tts", status_code=200,
+                                              duration_seconds=0.0123, remote_addr="127.0.0.1"),
+                'tts_request': lambda i: logger.tts_request("coqui", 120, success=True, duration=1.5,
+                                                            chunked=False),
+                # Antes: el mensaje se formateaba aunque el nivel estuviera filtrado
+                'debug filtrado (formato previo)': lambda i: filtered.logger.debug(
+                    filtered._format_message("Cache lookup", key=i, hit=False)),
+                'debug filtrado': lambda i: filtered.debug("Cache lookup", key=i, hit=False),
+            }
+            results[mode] = {name: per_call_us(op, calls, threads) for name, op in operations.items()}
+            started = time.perf_counter()
+            logger.close()
+            filtered.close()
+            results[mode]['vaciado (ms)'] = (time.perf_counter() - started) * 1000
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark del logger")
+    parser.add_argument('--calls', type=int, default=20000, help='Llamadas por operación')
+    parser.add_argument('--threads', type=int, default=4, help='Hilos que registran en paralelo')
+    args = parser.parse_args()
+
+    print(f"⏱️ {args.calls} llamadas por operación en {args.threads} hilos (µs por llamada)")
+    results = run(args.calls, args.threads)
+    operations = list(results['síncrono'])
+    print(f"{'operación':34} {'síncrono':>10} {'cola':>10}")
+    for name in operations:
+        print(f"{name:34} {results['síncrono'][name]:10.2f} {results['cola'][name]:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
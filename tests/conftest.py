@@ -0,0 +1,11 @@
+"""
+Configuración común de los tests: los módulos de app/ se importan planos
+(igual que hace la web app), así que se añade app/ al path.
+"""
+
+import os
+import sys
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app')
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
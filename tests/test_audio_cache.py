@@ -0,0 +1,120 @@
+"""Tests del cache de audio: claves, TTL y desalojo LRU"""
+
+import pytest
+
+import audio_cache
+from audio_cache import AudioCache, make_cache_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Reloj controlable para el módulo audio_cache"""
+    now = [1_000_000.0]
+    monkeypatch.setattr(audio_cache.time, 'time', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    cache = AudioCache(str(tmp_path / 'cache'), ttl=60, max_size=0, memory_items=0)
+    yield cache
+    cache.close()
+
+
+def test_cache_key_ignores_whitespace_differences():
+    assert make_cache_key('coqui', 'Hola  mundo\n') == make_cache_key('coqui', ' Hola mundo')
+    assert make_cache_key('coqui', 'Hola') != make_cache_key('elevenlabs', 'Hola')
+    assert make_cache_key('elevenlabs', 'Hola', voice_id='a') != make_cache_key('elevenlabs', 'Hola', voice_id='b')
+
+
+def test_put_then_get_returns_audio(cache):
+    cache.put('k', b'RIFFdata')
+    assert cache.get('k') == b'RIFFdata'
+    assert cache.get('otra') is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+
+
+def test_entry_expires_after_ttl(cache, clock):
+    path = cache.put('k', b'audio')
+    clock[0] += 59
+    assert cache.get('k') == b'audio'
+
+    clock[0] += 2
+    assert cache.get('k') is None
+    assert cache.stats()['expirations'] == 1
+    assert cache.stats()['entries'] == 0
+    assert not audio_cache.Path(path).exists()
+
+
+def test_expired_hot_entry_is_not_served(tmp_path, clock):
+    cache = AudioCache(str(tmp_path / 'cache'), ttl=60, max_size=0, memory_items=4)
+    cache.put('k', b'audio')
+    for _ in range(AudioCache.HOT_MIN_HITS):
+        cache.get('k')
+    assert cache.stats()['memory_entries'] == 1
+
+    clock[0] += 61
+    assert cache.get('k') is None
+    cache.close()
+
+
+def test_purge_expired_removes_only_old_entries(cache, clock):
+    cache.put('vieja', b'a')
+    clock[0] += 30
+    cache.put('nueva', b'b')
+    clock[0] += 31
+
+    assert cache.purge_expired() == 1
+    assert cache.get('vieja') is None
+    assert cache.get('nueva') == b'b'
+
+
+def test_lru_eviction_keeps_recently_used_entries(tmp_path, clock):
+    cache = AudioCache(str(tmp_path / 'cache'), ttl=0, max_size=30, memory_items=0)
+    cache.put('a', b'x' * 10)
+    clock[0] += 1
+    cache.put('b', b'x' * 10)
+    clock[0] += 1
+    cache.put('c', b'x' * 10)
+    clock[0] += 1
+    # 'a' es la más reciente en usarse: el acceso se vuelca al índice en el siguiente put
+    assert cache.get('a') is not None
+    clock[0] += 1
+    cache.put('d', b'x' * 10)
+
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.get('c') is not None
+    assert cache.get('d') is not None
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['size_bytes'] == 30
+    cache.close()
+
+
+def test_hot_layer_is_bounded(tmp_path, clock):
+    cache = AudioCache(str(tmp_path / 'cache'), ttl=0, max_size=0, memory_items=2)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, key.encode())
+        for _ in range(AudioCache.HOT_MIN_HITS):
+            cache.get(key)
+    assert cache.stats()['memory_entries'] == 2
+    assert list(cache._hot) == ['b', 'c']
+    cache.close()
+
+
+def test_index_survives_reopen(tmp_path, clock):
+    cache = AudioCache(str(tmp_path / 'cache'), ttl=60)
+    cache.put('k', b'audio')
+    cache.close()
+
+    reopened = AudioCache(str(tmp_path / 'cache'), ttl=60)
+    assert reopened.get('k') == b'audio'
+    reopened.close()
+
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    cache = AudioCache(str(tmp_path / 'cache'), enabled=False)
+    assert cache.put('k', b'audio') is None
+    assert cache.get('k') is None
+    assert not (tmp_path / 'cache').exists()
@@ -0,0 +1,162 @@
+"""Tests de la identificación de audio por cabecera y del validador de subidas"""
+
+import io
+import struct
+import wave
+
+import pytest
+
+from audio_probe import UploadRejected, UploadValidator, probe, probe_file
+
+
+def make_wav(seconds=1.0, sample_rate=16000, channels=1):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(b'\x00\x00' * channels * int(sample_rate * seconds))
+    return buffer.getvalue()
+
+
+# Trama MPEG-1 Layer III, 128 kbps, 44100 Hz, estéreo: 417 bytes y 1152 muestras
+MP3_HEADER = b'\xff\xfb\x90\x00'
+MP3_FRAME_SIZE = 417
+
+
+def make_mp3(frames=10, xing_frames=None, id3=b''):
+    first = bytearray(MP3_HEADER + bytes(MP3_FRAME_SIZE - 4))
+    if xing_frames is not None:
+        # Cabecera Xing tras la side info (32 bytes en MPEG-1 estéreo)
+        first[36:48] = b'Xing' + struct.pack('>II', 1, xing_frames)
+    frame = MP3_HEADER + bytes(MP3_FRAME_SIZE - 4)
+    return id3 + bytes(first) + frame * (frames - 1)
+
+
+def make_id3(size):
+    syncsafe = bytes([(size >> 21) & 0x7f, (size >> 14) & 0x7f, (size >> 7) & 0x7f, size & 0x7f])
+    return b'ID3\x04\x00\x00' + syncsafe + bytes(size)
+
+
+def make_flac(sample_rate=22050, channels=1, total_samples=44100):
+    fields = sample_rate << 44 | (channels - 1) << 41 | 15 << 36 | total_samples
+    streaminfo = struct.pack('>HH', 4096, 4096) + bytes(6) + fields.to_bytes(8, 'big') + bytes(16)
+    return b'fLaC' + b'\x80' + len(streaminfo).to_bytes(3, 'big') + streaminfo
+
+
+def box(box_type, content):
+    return struct.pack('>I4s', 8 + len(content), box_type) + content
+
+
+def make_m4a(seconds=3, moov_at_end=False, padding=0):
+    ftyp = box(b'ftyp', b'M4A \x00\x00\x00\x00')
+    mvhd = box(b'mvhd', b'\x00\x00\x00\x00' + struct.pack('>IIII', 0, 0, 1000, seconds * 1000) + bytes(80))
+    moov = box(b'moov', mvhd)
+    mdat = box(b'mdat', bytes(padding))
+    return ftyp + mdat + moov if moov_at_end else ftyp + moov + mdat
+
+
+def test_probe_wav_reads_format_and_duration():
+    info = probe(make_wav(seconds=1.5, sample_rate=16000, channels=2))
+    assert info.format == 'wav'
+    assert (info.sample_rate, info.channels) == (16000, 2)
+    assert info.duration == pytest.approx(1.5)
+
+
+def test_probe_mp3_cbr_estimates_duration_from_size():
+    data = make_mp3(frames=10)
+    info = probe(data)
+    assert (info.format, info.sample_rate, info.channels) == ('mp3', 44100, 2)
+    assert info.duration is None
+    assert info.estimate_duration(len(data)) == pytest.approx(len(data) / 16000)
+
+
+def test_probe_mp3_reads_xing_frame_count():
+    info = probe(make_mp3(frames=10, xing_frames=100))
+    assert info.duration == pytest.approx(100 * 1152 / 44100)
+
+
+def test_probe_mp3_skips_id3_tag():
+    info = probe(make_mp3(frames=5, id3=make_id3(1000)))
+    assert info is not None and info.format == 'mp3'
+
+
+def test_probe_flac_reads_streaminfo():
+    info = probe(make_flac(sample_rate=22050, channels=2, total_samples=44100))
+    assert (info.format, info.sample_rate, info.channels) == ('flac', 22050, 2)
+    assert info.duration == pytest.approx(2.0)
+
+
+def test_probe_m4a_reads_mvhd_duration():
+    info = probe(make_m4a(seconds=3))
+    assert (info.format, info.duration) == ('m4a', 3.0)
+
+
+def test_probe_file_finds_moov_after_the_header(tmp_path):
+    path = tmp_path / 'tarde.m4a'
+    path.write_bytes(make_m4a(seconds=7, moov_at_end=True, padding=200 * 1024))
+    assert probe(path.read_bytes()[:1024]).duration is None
+    assert probe_file(str(path)).duration == 7.0
+
+
+@pytest.mark.parametrize('data', [
+    b'',
+    b'hola mundo',
+    b'RIFF\x00\x00\x00\x00AVI ',
+    bytes(4096),
+    # Sincronía MPEG aislada: la trama siguiente no es válida
+    MP3_HEADER + bytes(1000),
+], ids=['vacio', 'texto', 'avi', 'ceros', 'falsa-trama'])
+def test_probe_rejects_non_audio(data):
+    assert probe(data) is None
+
+
+def feed(validator, data, block_size=4096):
+    for start in range(0, len(data), block_size):
+        validator(data[start:start + block_size])
+
+
+def test_validator_accepts_allowed_audio(tmp_path):
+    data = make_wav(seconds=1.0)
+    path = tmp_path / 'ref.wav'
+    path.write_bytes(data)
+    validator = UploadValidator(['wav', 'mp3'], max_size=len(data), max_duration=2)
+    feed(validator, data)
+    assert validator.finish(str(path)).format == 'wav'
+
+
+def test_validator_rejects_on_the_first_block():
+    validator = UploadValidator(['wav'])
+    with pytest.raises(UploadRejected) as excinfo:
+        validator(make_flac())
+    assert (excinfo.value.code, excinfo.value.status) == ('UNSUPPORTED_FORMAT', 415)
+
+    with pytest.raises(UploadRejected):
+        UploadValidator(['wav'])(b'texto disfrazado de audio')
+
+
+def test_validator_rejects_by_extension():
+    validator = UploadValidator(['wav', 'mp3'])
+    validator.check_extension('voz.MP3')
+    with pytest.raises(UploadRejected) as excinfo:
+        validator.check_extension('voz.exe')
+    assert excinfo.value.details['allowed'] == ['mp3', 'wav']
+
+
+def test_validator_enforces_size_and_duration():
+    data = make_wav(seconds=2.0)
+    with pytest.raises(UploadRejected) as excinfo:
+        feed(UploadValidator(['wav'], max_size=1000), data)
+    assert (excinfo.value.code, excinfo.value.status) == ('FILE_TOO_LARGE', 413)
+
+    with pytest.raises(UploadRejected) as excinfo:
+        feed(UploadValidator(['wav'], max_duration=1), data)
+    assert (excinfo.value.code, excinfo.value.status) == ('AUDIO_TOO_LONG', 422)
+
+
+def test_validator_rejects_empty_upload(tmp_path):
+    path = tmp_path / 'vacio.wav'
+    path.write_bytes(b'')
+    with pytest.raises(UploadRejected) as excinfo:
+        UploadValidator(['wav']).finish(str(path))
+    assert excinfo.value.code == 'INVALID_AUDIO'
@@ -0,0 +1,104 @@
+"""Tests de la entrega de audio publicado: ETag, peticiones condicionales y Range"""
+
+import os
+import uuid
+
+import pytest
+
+import audio_cache
+import config
+import metrics
+from output_store import OutputStore
+
+STATIC_AUDIO_DIR = os.path.join(config.PROJECT_ROOT, 'static', 'audio')
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """Cliente de pruebas con los datos de ejecución en un directorio temporal"""
+    for name in ('CACHE_DIR', 'METRICS_DIR', 'JOB_DB_PATH', 'LOG_DIR', 'PROFILE_DIR', 'REFERENCE_DIR',
+                 'ELEVENLABS_VOICE_REGISTRY', 'COQUI_SPEAKER_CACHE_DIR', 'COQUI_MODEL_CATALOG'):
+        monkeypatch.setenv(name, str(tmp_path / name.lower()))
+    monkeypatch.setenv('AUDIO_SENDFILE_HEADER', '')
+    monkeypatch.setattr(audio_cache, '_cache', None)
+    monkeypatch.setattr(metrics, '_registry', None)
+    config.reload_config()
+
+    from webapp_working import create_app
+    app = create_app(start_workers=False)
+    yield app.test_client()
+    config.reload_config()
+
+
+@pytest.fixture
+def published():
+    """Un audio publicado en el almacén que sirve /audio/<nombre>"""
+    data = b'RIFF' + uuid.uuid4().bytes * 64
+    name = OutputStore(STATIC_AUDIO_DIR, janitor_interval=0).put_bytes(data)
+    yield name, data
+    os.unlink(os.path.join(STATIC_AUDIO_DIR, name))
+
+
+def test_full_response_carries_strong_etag_and_immutable_caching(client, published):
+    name, data = published
+    response = client.get(f'/audio/{name}')
+    assert response.status_code == 200
+    assert response.data == data
+    assert response.mimetype == 'audio/wav'
+    assert response.headers['ETag'] == f'"{name[:-4]}"'
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert 'immutable' in response.headers['Cache-Control']
+
+
+def test_if_none_match_returns_not_modified(client, published):
+    name, _ = published
+    etag = client.get(f'/audio/{name}').headers['ETag']
+    response = client.get(f'/audio/{name}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+
+def test_range_returns_partial_content(client, published):
+    name, data = published
+    response = client.get(f'/audio/{name}', headers={'Range': 'bytes=10-19'})
+    assert response.status_code == 206
+    assert response.data == data[10:20]
+    assert response.headers['Content-Range'] == f'bytes 10-19/{len(data)}'
+
+    response = client.get(f'/audio/{name}', headers={'Range': 'bytes=-4'})
+    assert response.status_code == 206
+    assert response.data == data[-4:]
+
+
+def test_unsatisfiable_range_is_rejected(client, published):
+    name, data = published
+    response = client.get(f'/audio/{name}', headers={'Range': f'bytes={len(data) + 10}-'})
+    assert response.status_code == 416
+
+
+def test_if_range_with_stale_etag_returns_whole_file(client, published):
+    name, data = published
+    response = client.get(f'/audio/{name}', headers={'Range': 'bytes=0-3', 'If-Range': '"otro"'})
+    assert response.status_code == 200
+    assert response.data == data
+
+
+def test_x_accel_redirect_delegates_body_to_the_proxy(client, published, monkeypatch):
+    name, _ = published
+    monkeypatch.setenv('AUDIO_SENDFILE_HEADER', 'X-Accel-Redirect')
+    config.reload_config()
+    from webapp_working import create_app
+    proxied = create_app(start_workers=False).test_client()
+
+    response = proxied.get(f'/audio/{name}')
+    assert response.headers['X-Accel-Redirect'] == f'/protected-audio/{name}'
+    assert response.data == b''
+    etag = response.headers['ETag']
+    assert proxied.get(f'/audio/{name}', headers={'If-None-Match': etag}).status_code == 304
+
+
+@pytest.mark.parametrize('name', ['no-existe.wav', '.tmp'])
+def test_missing_or_invalid_audio_returns_404(client, name):
+    response = client.get(f'/audio/{name}')
+    assert response.status_code == 404
+    assert response.get_json()['error']['code'] == 'AUDIO_NOT_FOUND'
@@ -0,0 +1,146 @@
+"""Tests del lote de síntesis: manifiestos, checkpoint y reanudación"""
+
+import json
+import os
+
+import pytest
+
+import batch_tts
+from batch_tts import BatchItem, ResultsLog, load_manifest, output_path_for, run_batch
+
+
+def write(path, text):
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def test_load_jsonl_manifest(tmp_path):
+    path = write(tmp_path / 'lote.jsonl',
+                 '{"id": 0, "text": " Hola "}\n'
+                 '\n'
+                 '{"id": "b", "text": "Adiós", "engine": "Coqui", "voice": "ref.wav"}\n')
+    assert load_manifest(path) == [
+        BatchItem('0', 'Hola', 'elevenlabs', None),
+        BatchItem('b', 'Adiós', 'coqui', 'ref.wav'),
+    ]
+
+
+def test_load_csv_manifest(tmp_path):
+    path = write(tmp_path / 'lote.csv', 'id,text,engine,voice\na,Hola,,\nb,"Uno, dos",coqui,ref.wav\n')
+    assert load_manifest(path) == [
+        BatchItem('a', 'Hola', 'elevenlabs', None),
+        BatchItem('b', 'Uno, dos', 'coqui', 'ref.wav'),
+    ]
+
+
+@pytest.mark.parametrize('lines, message', [
+    (['{"id": "a"}'], "obligatorios"),
+    (['{"id": "a", "text": "x"}', '{"id": "a", "text": "y"}'], "duplicado"),
+    (['{"id": "a", "text": "x", "engine": "festival"}'], "motor no soportado"),
+    (['["a", "x"]'], "objeto JSON"),
+    (['{"id": "a", "text": 5}'], "cadena"),
+])
+def test_invalid_manifest_reports_the_line(tmp_path, lines, message):
+    path = write(tmp_path / 'lote.jsonl', '\n'.join(lines) + '\n')
+    with pytest.raises(ValueError, match=message) as excinfo:
+        load_manifest(path)
+    assert f"lote.jsonl:{len(lines)}:" in str(excinfo.value)
+
+
+def test_output_path_is_stable_and_safe(tmp_path):
+    assert output_path_for('out', BatchItem('../a b', 'x')) == os.path.join('out', '_a_b.mp3')
+    assert output_path_for('out', BatchItem('..', 'x', 'coqui')) == os.path.join('out', 'item.wav')
+
+
+def test_completed_ids_skips_failures_placeholders_and_truncated_lines(tmp_path):
+    path = tmp_path / 'results.jsonl'
+    log = ResultsLog(str(path))
+    assert log.completed_ids() == set()
+    log.write({'id': 'ok', 'status': 'ok'})
+    log.write({'id': 'error', 'status': 'error'})
+    log.write({'id': 'silencio', 'status': 'ok', 'backend': 'placeholder'})
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"id": "cortado", "sta')
+    assert log.completed_ids() == {'ok'}
+
+
+@pytest.fixture
+def fake_elevenlabs(monkeypatch):
+    """Sustituir la llamada a ElevenLabs; falla los ids de failing"""
+    calls = []
+    failing = set()
+
+    def synthesize(item, output_path):
+        calls.append(item.id)
+        if item.id in failing:
+            raise RuntimeError('cuota agotada')
+        with open(output_path, 'wb') as f:
+            f.write(item.text.encode())
+        return {'cached': False}
+
+    monkeypatch.setattr(batch_tts, 'synthesize_elevenlabs', synthesize)
+    return calls, failing
+
+
+def test_run_batch_resumes_only_unfinished_items(tmp_path, fake_elevenlabs):
+    calls, failing = fake_elevenlabs
+    items = [BatchItem(item_id, f'texto {item_id}') for item_id in ('a', 'b', 'c')]
+    results = str(tmp_path / 'results.jsonl')
+    output_dir = str(tmp_path / 'renders')
+
+    failing.add('b')
+    summary = run_batch(items, output_dir, results, threads=2)
+    assert (summary['ok'], summary['failed'], summary['skipped']) == (2, 1, 0)
+
+    failing.clear()
+    calls.clear()
+    summary = run_batch(items, output_dir, results, threads=2)
+    assert calls == ['b']
+    assert (summary['ok'], summary['failed'], summary['skipped']) == (1, 0, 2)
+
+    with open(results, encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert [record['status'] for record in records if record['id'] == 'b'] == ['error', 'ok']
+    assert records[-1]['bytes'] == len('texto b')
+
+    calls.clear()
+    assert run_batch(items, output_dir, results, resume=False)['ok'] == 3
+    assert sorted(calls) == ['a', 'b', 'c']
+
+
+class FakePool:
+    """Pool de Coqui de pega: escribe output_path y responde con backend"""
+
+    def __init__(self, backend='xtts'):
+        self.backend = backend
+        self.jobs = []
+
+    def submit(self, job_type, **payload):
+        self.jobs.append((job_type, payload))
+        with open(payload['output_path'], 'wb') as f:
+            f.write(b'RIFF')
+        return {'ok': True, 'backend': self.backend, 'pid': 1, 'duration': 0.1}
+
+
+def test_coqui_output_is_published_only_when_good(tmp_path):
+    output_path = str(tmp_path / 'a.wav')
+    pool = FakePool()
+    result = batch_tts.synthesize_coqui(pool, BatchItem('a', 'Hola', 'coqui'), output_path)
+    assert result['backend'] == 'xtts'
+    assert pool.jobs[0][1]['output_path'] == output_path + '.part'
+    assert os.path.exists(output_path) and not os.path.exists(output_path + '.part')
+
+
+def test_coqui_placeholder_fails_and_leaves_no_output(tmp_path):
+    output_path = str(tmp_path / 'a.wav')
+    with pytest.raises(RuntimeError, match='silencio'):
+        batch_tts.synthesize_coqui(FakePool('placeholder'), BatchItem('a', 'Hola', 'coqui'), output_path)
+    assert os.listdir(tmp_path) == []
+
+
+def test_coqui_clone_passes_reference_audio(tmp_path):
+    pool = FakePool()
+    batch_tts.synthesize_coqui(pool, BatchItem('a', 'Hola', 'coqui', 'ref.wav'), str(tmp_path / 'a.wav'))
+    job_type, payload = pool.jobs[0]
+    assert job_type == 'clone'
+    assert payload['audio_path'] == os.path.abspath('ref.wav')
@@ -0,0 +1,134 @@
+"""Tests de la cola de trabajos: almacenes en memoria y SQLite, leases y JobQueue"""
+
+import sqlite3
+import time
+
+import pytest
+
+from jobs import (JOB_DONE, JOB_FAILED, JOB_QUEUED, JOB_RUNNING, Job, JobQueue,
+                  MemoryJobStore, SQLiteJobStore, create_job_store)
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    return create_job_store(request.param, str(tmp_path / 'jobs.db'))
+
+
+def test_save_and_get_roundtrip(store):
+    store.save(Job(id='j1', kind='tts', params={'text': 'hola', 'n': 2}))
+    job = store.get('j1')
+    assert job.kind == 'tts'
+    assert job.params == {'text': 'hola', 'n': 2}
+    assert job.status == JOB_QUEUED
+    assert store.get('nope') is None
+
+
+def test_pending_excludes_finished_jobs(store):
+    store.save(Job(id='q', kind='tts', params={}))
+    store.save(Job(id='r', kind='tts', params={}, status=JOB_RUNNING))
+    store.save(Job(id='d', kind='tts', params={}, status=JOB_DONE, finished_at=time.time()))
+    assert sorted(job.id for job in store.pending()) == ['q', 'r']
+
+
+def test_claim_is_exclusive(store):
+    store.save(Job(id='j1', kind='tts', params={}))
+    job = store.claim('j1', 'a', time.time() + 60)
+    assert job is not None
+    assert (job.status, job.owner) == (JOB_RUNNING, 'a')
+    assert job.started_at is not None
+
+    assert store.claim('j1', 'b', time.time() + 60) is None
+    assert store.claim('nope', 'b', time.time() + 60) is None
+
+
+def test_requeue_expired_only_touches_expired_leases(store):
+    now = time.time()
+    for job_id in ('vivo', 'muerto'):
+        store.save(Job(id=job_id, kind='tts', params={}))
+    store.claim('vivo', 'a', now + 60)
+    store.claim('muerto', 'b', now - 1)
+
+    assert store.requeue_expired(now) == ['muerto']
+    requeued = store.get('muerto')
+    assert (requeued.status, requeued.owner, requeued.lease_until) == (JOB_QUEUED, None, None)
+    assert store.get('vivo').status == JOB_RUNNING
+    # Vuelve a poder reclamarse
+    assert store.claim('muerto', 'c', now + 60) is not None
+
+
+def test_renew_extends_only_the_owners_leases(store):
+    now = time.time()
+    for job_id in ('mio', 'ajeno'):
+        store.save(Job(id=job_id, kind='tts', params={}))
+    store.claim('mio', 'a', now + 1)
+    store.claim('ajeno', 'b', now + 1)
+
+    store.renew('a', now + 120)
+    assert store.requeue_expired(now + 10) == ['ajeno']
+    assert store.get('mio').lease_until == now + 120
+
+
+def test_purge_removes_old_finished_jobs(store):
+    now = time.time()
+    store.save(Job(id='viejo', kind='tts', params={}, status=JOB_DONE, finished_at=now - 100))
+    store.save(Job(id='fallido', kind='tts', params={}, status=JOB_FAILED, finished_at=now - 100))
+    store.save(Job(id='reciente', kind='tts', params={}, status=JOB_DONE, finished_at=now))
+    store.save(Job(id='pendiente', kind='tts', params={}))
+
+    assert store.purge(now - 10) == 2
+    assert store.get('viejo') is None
+    assert store.get('reciente') is not None
+    assert store.get('pendiente') is not None
+
+
+def test_sqlite_store_survives_reopen(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    SQLiteJobStore(path).save(Job(id='j1', kind='clone', params={'audio': 'a.wav'}))
+    assert [job.id for job in SQLiteJobStore(path).pending()] == ['j1']
+
+
+def test_sqlite_store_migrates_tables_without_leases(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    db = sqlite3.connect(path)
+    db.execute(
+        "CREATE TABLE jobs (id TEXT PRIMARY KEY, kind TEXT NOT NULL, params TEXT NOT NULL,"
+        " status TEXT NOT NULL, result TEXT, error TEXT, created_at REAL NOT NULL,"
+        " started_at REAL, finished_at REAL)"
+    )
+    db.execute("INSERT INTO jobs (id, kind, params, status, created_at) VALUES ('j1', 'tts', '{}', 'queued', 0)")
+    db.commit()
+    db.close()
+
+    store = SQLiteJobStore(path)
+    assert store.claim('j1', 'a', time.time() + 60).owner == 'a'
+
+
+def test_unknown_backend_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        create_job_store('redis', str(tmp_path / 'jobs.db'))
+
+
+def test_sync_queue_runs_handlers_and_records_failures():
+    def fail(job):
+        raise RuntimeError('sin motor')
+
+    jobs = JobQueue(MemoryJobStore(), {'ok': lambda job: 'out.wav', 'fail': fail},
+                    async_processing=False)
+    done = jobs.submit('ok', {})
+    assert (done.status, done.result, done.lease_until) == (JOB_DONE, 'out.wav', None)
+
+    failed = jobs.submit('fail', {})
+    assert (failed.status, failed.error) == (JOB_FAILED, 'sin motor')
+
+    with pytest.raises(ValueError):
+        jobs.submit('otro', {})
+
+
+def test_async_queue_processes_submitted_jobs():
+    jobs = JobQueue(MemoryJobStore(), {'tts': lambda job: job.params['text'].upper()}, workers=2)
+    submitted = [jobs.submit('tts', {'text': f'hola {i}'}) for i in range(5)]
+
+    deadline = time.time() + 5
+    while time.time() < deadline and not all(jobs.get(job.id).is_finished() for job in submitted):
+        time.sleep(0.01)
+    assert [jobs.get(job.id).result for job in submitted] == [f'HOLA {i}' for i in range(5)]
@@ -0,0 +1,136 @@
+"""Tests del almacén de salidas: publicación atómica, pinning y janitor"""
+
+import io
+import os
+import time
+
+import pytest
+
+from output_store import OutputStore
+
+
+def age(store, name, seconds):
+    """Retrasar la fecha de modificación de un archivo publicado"""
+    past = time.time() - seconds
+    os.utime(store.path(name), (past, past))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return OutputStore(str(tmp_path / 'outputs'), max_size=0, max_age=3600, janitor_interval=0)
+
+
+def test_same_content_is_published_once(store):
+    first = store.put_bytes(b'RIFFaudio')
+    second = store.put_bytes(b'RIFFaudio')
+    temp = store.temp_path()
+    with open(temp, 'wb') as f:
+        f.write(b'RIFFaudio')
+
+    assert store.commit(temp) == first == second
+    assert not os.path.exists(temp)
+    assert store.deduplicated == 2
+    assert store.stats()['files'] == 1
+
+
+def test_commit_as_uses_the_given_key(store):
+    temp = store.temp_path('mp3')
+    with open(temp, 'wb') as f:
+        f.write(b'ID3')
+    assert store.commit_as(temp, 'clave') == 'clave.mp3'
+    assert store.exists('clave.mp3')
+
+
+def test_put_stream_discards_temp_when_validator_rejects(store):
+    class Reject:
+        def __call__(self, block):
+            pass
+
+        def finish(self, path):
+            raise ValueError('no es audio')
+
+    with pytest.raises(ValueError):
+        store.put_stream(io.BytesIO(b'x' * 10), 'wav', Reject())
+    assert os.listdir(store.temp_dir) == []
+    assert store.stats()['files'] == 0
+
+
+def test_path_rejects_names_outside_the_root(store):
+    for name in ('../secreto', 'a/b.wav', '.tmp'):
+        with pytest.raises(ValueError):
+            store.path(name)
+    assert not store.exists('../secreto')
+
+
+def test_cleanup_removes_files_older_than_max_age(store):
+    old = store.put_bytes(b'viejo')
+    new = store.put_bytes(b'nuevo')
+    age(store, old, 7200)
+
+    assert store.cleanup() == 1
+    assert not store.exists(old)
+    assert store.exists(new)
+
+
+def test_cleanup_keeps_pinned_files(tmp_path):
+    pins = []
+    store = OutputStore(str(tmp_path / 'outputs'), max_size=0, max_age=3600,
+                        janitor_interval=0, pinned=lambda: pins)
+    name = store.put_bytes(b'referencia de un trabajo pendiente')
+    age(store, name, 7200)
+    pins.append(store.path(name))
+
+    assert store.cleanup() == 0
+    assert store.exists(name)
+
+    pins.clear()
+    assert store.cleanup() == 1
+
+
+def test_cleanup_enforces_size_budget_oldest_first(tmp_path):
+    pins = []
+    store = OutputStore(str(tmp_path / 'outputs'), max_size=25, max_age=0,
+                        janitor_interval=0, pinned=lambda: pins)
+    names = [store.put_bytes(bytes([i]) * 10) for i in range(3)]
+    for seconds, name in zip((300, 200, 100), names):
+        age(store, name, seconds)
+    # El fijado cuenta para el presupuesto aunque no se borre
+    pins.append(store.path(names[0]))
+
+    assert store.cleanup() == 1
+    assert [store.exists(name) for name in names] == [True, False, True]
+
+
+def test_cleanup_removes_abandoned_temp_files(store):
+    temp = store.temp_path()
+    past = time.time() - 7200
+    os.utime(temp, (past, past))
+    fresh = store.temp_path()
+
+    assert store.cleanup() == 1
+    assert not os.path.exists(temp)
+    assert os.path.exists(fresh)
+
+
+def test_janitor_runs_periodically_and_survives_errors(tmp_path):
+    calls = []
+
+    def pinned():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError('almacén de trabajos caído')
+        return []
+
+    store = OutputStore(str(tmp_path / 'outputs'), max_size=0, max_age=3600,
+                        janitor_interval=0.01, pinned=pinned)
+    name = store.put_bytes(b'viejo')
+    age(store, name, 7200)
+    store.start_janitor()
+    try:
+        deadline = time.time() + 5
+        while time.time() < deadline and store.exists(name):
+            time.sleep(0.01)
+    finally:
+        store.stop_janitor()
+    assert not store.exists(name)
+    assert len(calls) >= 2
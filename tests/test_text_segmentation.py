@@ -0,0 +1,52 @@
+"""Tests de la segmentación de texto en oraciones y fragmentos"""
+
+import pytest
+
+from text_segmentation import segment_text, split_sentences
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('Hola. Adiós.', ['Hola.', 'Adiós.']),
+    ('¿Vienes? ¡Claro! Vamos.', ['¿Vienes?', '¡Claro!', 'Vamos.']),
+    ('Habló el Sr. García. Luego nada.', ['Habló el Sr. García.', 'Luego nada.']),
+    ('Lo escribió J. R. Jiménez. Fin.', ['Lo escribió J. R. Jiménez.', 'Fin.']),
+    ('Costó 3.50 euros. Barato.', ['Costó 3.50 euros.', 'Barato.']),
+    ('¿Qué? dijo ella. Nada.', ['¿Qué? dijo ella.', 'Nada.']),
+    ('Dijo: «Ya voy.» Y se fue.', ['Dijo: «Ya voy.»', 'Y se fue.']),
+    ('Esperó... Nadie vino.', ['Esperó...', 'Nadie vino.']),
+    ('Sin punto final', ['Sin punto final']),
+])
+def test_split_sentences(text, expected):
+    assert split_sentences(text) == expected
+
+
+def test_split_sentences_normalizes_whitespace():
+    assert split_sentences('  Hola.\n\n  Adiós.  ') == ['Hola.', 'Adiós.']
+    assert split_sentences('   ') == []
+
+
+def test_short_sentences_are_packed_together():
+    assert segment_text('Uno. Dos. Tres.', max_chars=10) == ['Uno. Dos.', 'Tres.']
+    assert segment_text('Uno. Dos. Tres.', max_chars=250) == ['Uno. Dos. Tres.']
+
+
+def test_long_sentence_is_split_by_clauses():
+    text = 'Primero fuimos al mercado, después al puerto; al final volvimos a casa.'
+    chunks = segment_text(text, max_chars=30)
+    assert chunks == ['Primero fuimos al mercado,', 'después al puerto;', 'al final volvimos a casa.']
+
+
+def test_clause_longer_than_limit_is_split_by_words():
+    text = ' '.join(['palabra'] * 20) + '.'
+    chunks = segment_text(text, max_chars=30)
+    assert all(len(chunk) <= 30 for chunk in chunks)
+    assert ' '.join(chunks) == text
+
+
+@pytest.mark.parametrize('max_chars', [20, 50, 250])
+def test_segments_respect_limit_and_keep_every_word(max_chars):
+    text = ('La síntesis por fragmentos divide el texto. ¿Funciona con preguntas? '
+            'Sí, y también con enumeraciones: uno, dos, tres. El Dr. Pérez lo revisó ayer.')
+    chunks = segment_text(text, max_chars=max_chars)
+    assert all(len(chunk) <= max_chars for chunk in chunks)
+    assert ' '.join(chunks).split() == text.split()
@@ -312,6 +312,7 @@ class SystemValidator:
             load_dotenv()
             
             api_key = os.getenv('ELEVENLABS_API_KEY')
+            base_url = os.getenv('ELEVENLABS_BASE_URL', 'https://api.elevenlabs.io').rstrip('/')
             
             if not api_key:
                 return {
@@ -324,7 +325,7 @@ class SystemValidator:
             try:
                 import requests
                 response = requests.get(
-                    "https://api.elevenlabs.io/v1/voices",
+                    f"{base_url}/v1/voices",
                     headers={"xi-api-key": api_key},
                     timeout=10
                 )